@@ -4,24 +4,25 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.http import condition, require_http_methods
 from django.utils.decorators import method_decorator
 from django.views import View
 from django_otp.decorators import otp_required
 from django_otp.plugins.otp_totp.models import TOTPDevice
 from django_otp.util import random_hex
-import qrcode
-from io import BytesIO
-import base64
 import json
 from datetime import timedelta
 from .models import CustomUser
 from .forms import UserRegistrationForm, UserLoginForm, Enable2FAForm, UserAdminForm, UserFilterForm
 from audit_logging.models import UserActionLog
+from wireguard_manager.metrics import instrument_view
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Секунд життя QR коду налаштування 2FA в кеші артефактів
+TOTP_QR_TTL = 600
+
 
 class LoginView(View):
     """Вхід користувача з підтримкою 2FA"""
@@ -165,20 +166,54 @@ def vpn_overview(request):
     return render(request, 'accounts/vpn_overview.html', context)
 
 
+def _connected_users_etag(request):
+    from locations.live_stats import online_etag, safe_read
+    return safe_read(online_etag)
+
+
+def _connected_users_from_snapshot(taken_at, devices):
+    """Список підключених зі живих snapshot'ів локацій у Redis (без запитів у БД)"""
+    import datetime
+    from locations.live_stats import format_duration
+    
+    users_data = []
+    for device in sorted(devices, key=lambda item: item['last_handshake'] or 0, reverse=True):
+        users_data.append({
+            'id': device['id'],
+            'username': device['user']['username'],
+            'full_name': device['user']['full_name'],
+            'device_name': device['name'],
+            'ip_address': device['ip_address'],
+            'location_name': device['location_name'],
+            # Станом на snapshot (ETag не залежить від часу); живий таймер клієнт рахує від last_handshake
+            'connection_time': format_duration(taken_at - device['last_handshake']),
+            'bytes_sent': device['bytes_sent'] or 0,
+            'bytes_received': device['bytes_received'] or 0,
+            'last_handshake': datetime.datetime.fromtimestamp(device['last_handshake'], tz=datetime.timezone.utc).isoformat(),
+            'avatar_initials': device['user']['avatar_initials'],
+        })
+    return users_data
+
+
 @login_required
+@instrument_view('connected_users_api')
+@condition(etag_func=_connected_users_etag)
 def connected_users_api(request):
     """API для отримання списку підключених користувачів"""
     from locations.models import Device
+    from locations.live_stats import read_online, safe_read
     from django.http import JsonResponse
     from django.utils import timezone
     
-    # Отримуємо тільки дійсно онлайн користувачів
-    all_devices = Device.objects.filter(
-        status='active'
-    ).select_related('user', 'location').order_by('-last_handshake')
+    # Опитування дашборду обслуговуються зі snapshot'ів інжестора, поки вони живі
+    snapshot = safe_read(read_online)
+    if snapshot is not None:
+        return JsonResponse({'users': _connected_users_from_snapshot(*snapshot)})
     
-    # Фільтруємо тільки активні пристрої (з handshake менше 5 хвилин тому)
-    connected_devices = [device for device in all_devices if device.is_online]
+    # Отримуємо тільки дійсно онлайн пристрої (вікно handshake перевіряється в SQL)
+    connected_devices = Device.objects.online().select_related(
+        'user', 'location'
+    ).order_by('-last_handshake')
     
     users_data = []
     for device in connected_devices:
@@ -253,16 +288,11 @@ def setup_2fa(request):
             confirmed=False
         )
     
-    # Генеруємо QR код
+    # QR код з кешу артефактів: перезавантаження сторінки не рендерить його знову.
+    # URL містить секрет, тож тримаємо його в кеші недовго
+    from locations.artifacts import qr_base64
     qr_url = device.config_url
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(qr_url)
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="black", back_color="white")
-    buffer = BytesIO()
-    img.save(buffer, format='PNG')
-    qr_image = base64.b64encode(buffer.getvalue()).decode()
+    qr_image = qr_base64(qr_url, timeout=TOTP_QR_TTL)
     
     context = {
         'qr_image': qr_image,
@@ -701,11 +731,9 @@ def user_detail(request, pk):
 @login_required
 def device_config_modal(request, device_id):
     """API для отримання конфігурації пристрою та QR-коду"""
+    from locations.artifacts import qr_data_uri
     from locations.models import Device
     from django.http import JsonResponse
-    import qrcode
-    import io
-    import base64
     
     device = get_object_or_404(Device, pk=device_id)
     
@@ -717,22 +745,11 @@ def device_config_modal(request, device_id):
         # Генеруємо конфігурацію
         config_content = device.get_config()
         
-        # Створюємо QR-код
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(config_content)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Конвертуємо в base64
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
-        img_str = base64.b64encode(buffer.getvalue()).decode()
-        
         return JsonResponse({
             'device_name': device.name,
             'config': config_content,
-            'qr_code': f"data:image/png;base64,{img_str}",
+            # QR береться з кешу артефактів за хешем конфігурації
+            'qr_code': qr_data_uri(config_content),
             'device_ip': device.ip_address,
             'server_endpoint': f"{device.location.server_ip}:{device.location.server_port}",
             'connection_time': device.get_connection_time_formatted() if hasattr(device, 'get_connection_time_formatted') else '00:00',
@@ -0,0 +1,223 @@
+"""
+Синтетичний флот для бенчмарків: N локацій x M пристроїв.
+
+Усі об'єкти мають префікс bench- (локації, користувачі, групи), інтерфейси
+wg900+ та підмережі 100.64.0.0/10, тож флот не перетинається з реальними
+локаціями і видаляється clear_fleet(). Рядки вставляються bulk_create без
+Device.save - жодного застосування конфігурації чи docker під час seed'у.
+Dump'и `wg show all dump` будуються з ключів засіяних пристроїв, тож інжест
+статистики зіставляє кожен peer.
+"""
+import ipaddress
+import logging
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from locations.ipam import FIRST_OFFSET
+from locations.models import (
+    AccessControlList, ACLRule, Device, DeviceGroup, IPPool, Location, Network,
+)
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'bench-'
+ADMIN_USERNAME = f'{PREFIX}admin'
+# Розміри флоту: назва -> (локацій, пристроїв на локацію)
+PRESETS = {
+    '1k': (4, 250),
+    '10k': (10, 1000),
+    '100k': (20, 5000),
+}
+INTERFACE_BASE = 900
+MAX_LOCATIONS = 64
+# Запас у /16 для бенчмарку видачі адрес
+MAX_DEVICES = 60000
+BATCH_SIZE = 1000
+# Інтервал між "тіками" синтетичних dump'ів, секунди
+TICK_SECONDS = 5
+
+
+def location_subnet(index):
+    return f'100.{64 + index}.0.0/16'
+
+
+def fleet_locations():
+    """Локації синтетичного флоту за номером"""
+    return Location.objects.filter(name__startswith=PREFIX).order_by('interface_name')
+
+
+def clear_fleet():
+    """Видаляє синтетичний флот (локації, пристрої, пули IPAM, користувачі, групи); повертає кількість локацій"""
+    with transaction.atomic():
+        location_ids = list(fleet_locations().values_list('pk', flat=True))
+        IPPool.objects.filter(scope__in=[f'location:{pk}' for pk in location_ids]).delete()
+        Device.objects.filter(location_id__in=location_ids).delete()
+        Location.objects.filter(pk__in=location_ids).delete()
+        get_user_model().objects.filter(username__startswith=PREFIX).delete()
+        DeviceGroup.objects.filter(name__startswith=PREFIX).delete()
+    return len(location_ids)
+
+
+def _users(count):
+    """Користувачі флоту та staff користувач для запитів до view"""
+    User = get_user_model()
+    # Непридатний пароль - без хешування на кожного користувача
+    password = make_password(None)
+    User.objects.bulk_create([
+        User(username=f'{PREFIX}u{n}', email=f'{PREFIX}u{n}@bench.invalid', password=password)
+        for n in range(count)
+    ], batch_size=BATCH_SIZE)
+    User.objects.create(
+        username=ADMIN_USERNAME, email=f'{ADMIN_USERNAME}@bench.invalid', password=password,
+        is_staff=True, is_superuser=True,
+    )
+    return list(User.objects.filter(username__startswith=f'{PREFIX}u').order_by('pk').values_list('pk', flat=True))
+
+
+def _locations(count, keys):
+    Location.objects.bulk_create([
+        Location(
+            name=f'{PREFIX}{n}', description='Синтетичний флот для бенчмарків',
+            server_ip=f'192.0.2.{n + 1}', server_port=51820 + n, subnet=location_subnet(n),
+            interface_name=f'wg{INTERFACE_BASE + n}', private_key=private_key, public_key=public_key,
+        )
+        for n, (private_key, public_key) in zip(range(count), keys)
+    ])
+    # bulk_create повертає pk не на всіх бекендах - перечитуємо
+    locations = list(fleet_locations())
+    Network.objects.bulk_create([
+        Network(
+            name=f'{location.name} - Default Network', location=location, subnet=location.subnet,
+            interface=location.interface_name, server_port=location.server_port,
+            listen_port=location.server_port, server_public_key=location.public_key,
+            server_ip=location.server_ip, allowed_ips=location.allowed_ips or '0.0.0.0/0',
+            dns_servers=location.dns_servers, is_active=True,
+        )
+        for location in locations
+    ])
+    return locations
+
+
+def _rules(locations, groups, acl_rules):
+    """ACL правила за групами (на локацію) та AccessControlList на мережу"""
+    ACLRule.objects.bulk_create([
+        ACLRule(
+            name=f'{location.name}-rule-{k}', location=location, source_group_id=groups[k % len(groups)],
+            destination_ip=f'10.255.{k % 256}.0/24', protocol='tcp' if k % 2 else 'udp',
+            destination_port=str(1000 + k), action='deny' if k % 4 == 3 else 'allow', priority=100 + k,
+        )
+        for location in locations
+        for k in range(acl_rules)
+    ], batch_size=BATCH_SIZE)
+
+    networks = Network.objects.filter(location__in=locations).order_by('pk')
+    AccessControlList.objects.bulk_create([
+        AccessControlList(name=f'{network.name} ACL', network=network, protocol='tcp', port_ranges='80,443,8000-9000')
+        for network in networks
+    ])
+    acls = list(AccessControlList.objects.filter(network__in=networks).order_by('pk'))
+    for n, acl in enumerate(acls):
+        acl.source_groups.set([groups[n % len(groups)], groups[(n + 1) % len(groups)]])
+        acl.destination_groups.set([groups[(n + 2) % len(groups)]])
+    return len(locations) * acl_rules, len(acls)
+
+
+def seed_fleet(locations, devices, users=None, groups=8, acl_rules=4):
+    """
+    Створює флот locations x devices (попередній синтетичний флот видаляється).
+    Кожен 20-й пристрій неактивний; пристрої розкладені по групах для ACL.
+    """
+    from locations.wgkeys import generate_keypair
+
+    if not 1 <= locations <= MAX_LOCATIONS:
+        raise ValueError(f'Кількість локацій має бути від 1 до {MAX_LOCATIONS}')
+    if not 1 <= devices <= MAX_DEVICES:
+        raise ValueError(f'Кількість пристроїв на локацію має бути від 1 до {MAX_DEVICES}')
+    users = users or max(locations * devices // 4, 1)
+    groups = max(groups, 1)
+
+    started = time.perf_counter()
+    clear_fleet()
+    with transaction.atomic():
+        user_ids = _users(users)
+        DeviceGroup.objects.bulk_create([DeviceGroup(name=f'{PREFIX}g{n}') for n in range(groups)])
+        group_ids = list(DeviceGroup.objects.filter(name__startswith=PREFIX).order_by('pk').values_list('pk', flat=True))
+
+        fleet = _locations(locations, [generate_keypair() for _ in range(locations)])
+        for n, location in enumerate(fleet):
+            network = location.networks.first()
+            base = ipaddress.ip_network(location.subnet).network_address
+            Device.objects.bulk_create([
+                Device(
+                    name=f'{location.name}-{i}', user_id=user_ids[(n * devices + i) % len(user_ids)],
+                    location=location, network=network, group_id=group_ids[i % len(group_ids)],
+                    ip_address=str(base + FIRST_OFFSET + i), private_key=private_key, public_key=public_key,
+                    status='inactive' if i % 20 == 19 else 'active',
+                )
+                for i, (private_key, public_key) in enumerate(generate_keypair() for _ in range(devices))
+            ], batch_size=BATCH_SIZE)
+
+        # Пули IPAM одразу з вказівником за засіяними адресами - без seed'у під час бенчмарку
+        IPPool.objects.bulk_create([
+            IPPool(scope=f'location:{location.pk}', subnet=location.subnet, next_offset=FIRST_OFFSET + devices)
+            for location in fleet
+        ])
+        rules, acls = _rules(fleet, group_ids, acl_rules)
+
+    summary = {
+        'locations': locations, 'devices_per_location': devices, 'devices': locations * devices,
+        'users': users, 'groups': groups, 'acl_rules': rules, 'access_lists': acls,
+        'seconds': round(time.perf_counter() - started, 2),
+    }
+    logger.info(f"Синтетичний флот створено: {summary}")
+    return summary
+
+
+def fleet_summary():
+    """Розмір засіяного флоту (для метаданих результатів)"""
+    locations = fleet_locations()
+    return {
+        'locations': locations.count(),
+        'devices': Device.objects.filter(location__in=locations).count(),
+        'users': get_user_model().objects.filter(username__startswith=f'{PREFIX}u').count(),
+    }
+
+
+def iter_dump(tick=0, now=None):
+    """
+    Рядки `wg show all dump` для засіяного флоту на заданий тік. Між тіками
+    лічильники приблизно третини peer'ів ростуть, 60% мають свіжий handshake.
+    """
+    now = int(now or time.time()) + tick * TICK_SECONDS
+    for location in fleet_locations():
+        yield f'{location.interface_name}\t{location.private_key}\t{location.public_key}\t{location.server_port}\toff'
+        devices = location.devices.order_by('pk').values_list('public_key', 'ip_address')
+        for i, (public_key, ip_address) in enumerate(devices.iterator(chunk_size=BATCH_SIZE)):
+            if i % 5 < 3:
+                handshake = now - i % 25
+            elif i % 5 == 3:
+                handshake = now - 3600
+            else:
+                handshake = 0
+            step = (tick + i % 3) // 3
+            yield (
+                f'{location.interface_name}\t{public_key}\t(none)\t198.51.{i // 256 % 256}.{i % 256}:{40000 + i % 20000}\t'
+                f'{ip_address}/32\t{handshake}\t{i * 1337 + step * 4096}\t{i * 7331 + step * 1024}\toff'
+            )
+
+
+def build_dump(tick=0, now=None):
+    return '\n'.join(iter_dump(tick, now)) + '\n'
+
+
+def write_dump(path, tick=0, now=None):
+    """Записує фікстуру dump'у у файл; повертає кількість рядків"""
+    lines = 0
+    with open(path, 'w') as f:
+        for line in iter_dump(tick, now):
+            f.write(line + '\n')
+            lines += 1
+    return lines
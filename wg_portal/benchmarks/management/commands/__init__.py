@@ -0,0 +1 @@
+# Порожній файл для створення Python пакету
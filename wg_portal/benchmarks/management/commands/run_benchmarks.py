@@ -0,0 +1,59 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.suite import CASES, compare, run
+
+
+class Command(BaseCommand):
+    help = 'Заміряє гарячі шляхи на синтетичному флоті (seed_fleet) і пише результати в JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cases', nargs='+', choices=list(CASES), help='Кейси (за замовчуванням - усі)')
+        parser.add_argument('--repeat', type=int, default=5, help='Кількість замірів кейсу (5)')
+        parser.add_argument('--warmup', type=int, default=1, help='Прогрівальних запусків (1)')
+        parser.add_argument('--output', type=str, default='benchmark-results.json', help='Файл результатів')
+        parser.add_argument('--baseline', type=str, help='JSON попереднього запуску для порівняння')
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Допустиме зростання медіани відносно baseline (0.2 = 20%%)',
+        )
+
+    def handle(self, *args, **options):
+        """Виконує кейси, пише JSON та (з --baseline) завершується з помилкою при регресії"""
+        if options['repeat'] < 1:
+            raise CommandError('--repeat має бути не менше 1')
+
+        def progress(name, result):
+            self.stdout.write(
+                f"{name}: медіана {result['median_ms']:.1f} мс (min {result['min_ms']:.1f}, "
+                f"p95 {result['p95_ms']:.1f}), запитів {result['queries']}"
+            )
+
+        try:
+            report = run(options['cases'], options['repeat'], options['warmup'], progress)
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        regressions = []
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Не вдалося прочитати {options['baseline']}: {str(e)}")
+            report['comparison'] = compare(report, baseline, options['threshold'])
+            for name, item in report['comparison'].items():
+                line = f"{name}: {item['baseline_ms']:.1f} -> {item['current_ms']:.1f} мс (x{item['ratio']:.2f})"
+                if item['regression']:
+                    regressions.append(name)
+                    self.stdout.write(self.style.ERROR(line))
+                else:
+                    self.stdout.write(line)
+
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Результати записано в {options['output']}"))
+
+        if regressions:
+            raise CommandError(f"Регресія продуктивності: {', '.join(regressions)}")
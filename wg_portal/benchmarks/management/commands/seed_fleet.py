@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.fleet import PRESETS, clear_fleet, seed_fleet, write_dump
+
+
+class Command(BaseCommand):
+    help = 'Створює синтетичний флот для бенчмарків (N локацій x M пристроїв) та фікстуру wg show dump'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=sorted(PRESETS), default='1k', help='Розмір флоту (1k)')
+        parser.add_argument('--locations', type=int, help='Кількість локацій (замість --size)')
+        parser.add_argument('--devices', type=int, help='Пристроїв на локацію (замість --size)')
+        parser.add_argument('--users', type=int, help='Кількість користувачів (за замовчуванням - пристрої / 4)')
+        parser.add_argument('--groups', type=int, default=8, help='Кількість груп пристроїв для ACL (8)')
+        parser.add_argument('--acl-rules', type=int, default=4, help='ACL правил на локацію (4)')
+        parser.add_argument('--dump', type=str, help='Записати фікстуру `wg show all dump` флоту у файл')
+        parser.add_argument('--clear', action='store_true', help='Лише видалити синтетичний флот')
+
+    def handle(self, *args, **options):
+        """Перестворює флот bench-* (не запускати на production БД)"""
+        if options['clear']:
+            deleted = clear_fleet()
+            self.stdout.write(self.style.SUCCESS(f'Синтетичний флот видалено ({deleted} локацій)'))
+            return
+
+        locations, devices = PRESETS[options['size']]
+        locations = options['locations'] or locations
+        devices = options['devices'] or devices
+        self.stdout.write(f'Створення флоту: {locations} локацій x {devices} пристроїв...')
+        try:
+            summary = seed_fleet(
+                locations, devices, users=options['users'],
+                groups=options['groups'], acl_rules=options['acl_rules'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Створено {summary['devices']} пристроїв у {summary['locations']} локаціях, "
+            f"{summary['users']} користувачів, {summary['acl_rules']} ACL правил за {summary['seconds']} с"
+        ))
+
+        if options['dump']:
+            lines = write_dump(options['dump'])
+            self.stdout.write(f"Фікстуру dump записано в {options['dump']} ({lines} рядків)")
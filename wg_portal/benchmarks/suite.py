@@ -0,0 +1,245 @@
+"""
+Заміри гарячих шляхів на синтетичному флоті (benchmarks.fleet).
+
+Кожен кейс - функція, що готує вхідні дані та повертає (callable, items);
+measure() виконує callable warmup + repeat разів і рахує час та запити до
+БД. Результати - словник, придатний для JSON; compare() порівнює медіани з
+попереднім запуском.
+"""
+import platform
+import statistics
+import time
+from contextlib import contextmanager
+
+import django
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .fleet import ADMIN_USERNAME, build_dump, fleet_locations, fleet_summary
+
+# Видач адрес за один замір (поодинці та пачкою)
+ALLOCATIONS = 100
+BATCH_ALLOCATIONS = 1000
+
+
+@contextmanager
+def count_queries():
+    """Лічильник запитів до БД блоку (без збереження SQL, на відміну від CaptureQueriesContext)"""
+    queries = [0]
+
+    def wrapper(execute, sql, params, many, context):
+        queries[0] += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        yield queries
+
+
+def measure(func, repeat=5, warmup=1):
+    """Час (мс) та кількість запитів func() за repeat запусків після warmup"""
+    for _ in range(warmup):
+        func()
+    timings = []
+    queries = []
+    for _ in range(repeat):
+        with count_queries() as counter:
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(counter[0])
+    timings.sort()
+    return {
+        'repeat': repeat,
+        'min_ms': round(timings[0], 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'max_ms': round(timings[-1], 3),
+        'queries': max(queries),
+    }
+
+
+class Context:
+    """Спільні дані кейсів: локації флоту, найбільша локація, клієнт staff користувача"""
+
+    def __init__(self):
+        from django.contrib.auth import get_user_model
+        from django.db.models import Count
+        from django.test import Client
+
+        self.locations = list(fleet_locations().annotate(devices_count=Count('devices')))
+        if not self.locations:
+            raise RuntimeError('Синтетичний флот не засіяно - спершу виконайте seed_fleet')
+        self.interfaces = [location.interface_name for location in self.locations]
+        self.largest = max(self.locations, key=lambda location: location.devices_count)
+        self.devices = sum(location.devices_count for location in self.locations)
+
+        self.client = Client(HTTP_HOST=(settings.ALLOWED_HOSTS or ['localhost'])[0])
+        self.client.force_login(get_user_model().objects.get(username=ADMIN_USERNAME))
+
+
+def case_stats_sync(ctx, repeat, warmup):
+    """Інжест повного dump'у флоту; кожен запуск - наступний тік з новими лічильниками"""
+    from locations.stats_sync import StatsIngestor
+
+    now = int(time.time())
+    dumps = iter([build_dump(tick, now) for tick in range(1, repeat + warmup + 1)])
+
+    def run():
+        StatsIngestor(interfaces=ctx.interfaces).run(dump=next(dumps))
+    return run, ctx.devices
+
+
+def _render_all(ctx):
+    from locations.config_renderer import render_server_config
+    for location in ctx.locations:
+        render_server_config(location, location.networks.first())
+
+
+def case_config_render(ctx, repeat, warmup):
+    """Рендер серверних конфігурацій усіх локацій з порожнім кешем фрагментів"""
+    from locations import config_renderer
+
+    def run():
+        config_renderer._fragment_cache.clear()
+        _render_all(ctx)
+    return run, ctx.devices
+
+
+def case_config_render_cached(ctx, repeat, warmup):
+    """Повторний рендер тих самих конфігурацій (фрагменти з кешу)"""
+    return lambda: _render_all(ctx), ctx.devices
+
+
+def _rolled_back(func):
+    def run():
+        with transaction.atomic():
+            func()
+            transaction.set_rollback(True)
+    return run
+
+
+def case_ip_allocation(ctx, repeat, warmup):
+    """ALLOCATIONS послідовних видач адрес з пулу найбільшої локації (відкочується)"""
+    from locations.ipam import location_allocator
+
+    def allocate():
+        allocator = location_allocator(ctx.largest)
+        addresses = [allocator.allocate() for _ in range(ALLOCATIONS)]
+        assert None not in addresses, 'Пул вичерпано'
+    return _rolled_back(allocate), ALLOCATIONS
+
+
+def case_ip_allocation_batch(ctx, repeat, warmup):
+    """BATCH_ALLOCATIONS адрес одним allocate_many (відкочується)"""
+    from locations.ipam import location_allocator
+
+    def allocate():
+        addresses = location_allocator(ctx.largest).allocate_many(BATCH_ALLOCATIONS)
+        assert len(addresses) == BATCH_ALLOCATIONS, 'Пул вичерпано'
+    return _rolled_back(allocate), BATCH_ALLOCATIONS
+
+
+def case_firewall_compile(ctx, repeat, warmup):
+    """Компіляція ruleset'у FORWARD з ipset'ами груп"""
+    from wireguard_management.firewall import FirewallCompiler
+    return lambda: FirewallCompiler().compile(), None
+
+
+def case_firewall_compile_expanded(ctx, repeat, warmup):
+    """Компіляція ruleset'у з адресою кожного пристрою групи (без ipset)"""
+    from wireguard_management.firewall import FirewallCompiler
+    return lambda: FirewallCompiler(use_sets=False).compile(), None
+
+
+def _get(ctx, url):
+    def run():
+        response = ctx.client.get(url)
+        assert response.status_code == 200, f'{url}: HTTP {response.status_code}'
+    return run
+
+
+def case_locations_list(ctx, repeat, warmup):
+    from django.urls import reverse
+    return _get(ctx, reverse('locations:actual_list')), len(ctx.locations)
+
+
+def case_api_location_stats(ctx, repeat, warmup):
+    from django.urls import reverse
+    return _get(ctx, reverse('locations:api_location_stats', args=[ctx.largest.pk])), ctx.largest.devices_count
+
+
+def case_connected_users_api(ctx, repeat, warmup):
+    from django.urls import reverse
+    return _get(ctx, reverse('accounts:connected_users_api')), ctx.devices
+
+
+# Порядок важливий: stats_sync публікує живі snapshot'и, які читають API кейси
+CASES = {
+    'stats_sync': case_stats_sync,
+    'config_render': case_config_render,
+    'config_render_cached': case_config_render_cached,
+    'ip_allocation': case_ip_allocation,
+    'ip_allocation_batch': case_ip_allocation_batch,
+    'firewall_compile': case_firewall_compile,
+    'firewall_compile_expanded': case_firewall_compile_expanded,
+    'locations_list': case_locations_list,
+    'api_location_stats': case_api_location_stats,
+    'connected_users_api': case_connected_users_api,
+}
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'host': platform.node(),
+    }
+
+
+def run(cases=None, repeat=5, warmup=1, progress=None):
+    """Виконує кейси (усі за замовчуванням) і повертає результати з метаданими"""
+    ctx = Context()
+    results = {}
+    for name, case in CASES.items():
+        if cases and name not in cases:
+            continue
+        func, items = case(ctx, repeat, warmup)
+        result = measure(func, repeat, warmup)
+        if items:
+            result['items'] = items
+            result['per_item_us'] = round(result['median_ms'] * 1000 / items, 3)
+        results[name] = result
+        if progress:
+            progress(name, result)
+    return {
+        'version': 1,
+        'started_at': timezone.now().isoformat(),
+        'environment': environment(),
+        'fleet': fleet_summary(),
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold=0.2):
+    """
+    {кейс: {baseline_ms, current_ms, ratio, regression}} для кейсів з обох
+    запусків; регресія - медіана більша за базову більш ніж на threshold.
+    """
+    comparison = {}
+    for name, result in current['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous or not previous.get('median_ms'):
+            continue
+        ratio = result['median_ms'] / previous['median_ms']
+        comparison[name] = {
+            'baseline_ms': previous['median_ms'],
+            'current_ms': result['median_ms'],
+            'ratio': round(ratio, 3),
+            'regression': ratio > 1 + threshold,
+        }
+    return comparison
@@ -107,12 +107,17 @@ else
     echo "🚀 Starting Gunicorn (production)..."
     # Sensible defaults; can be overridden via env
     WORKERS=${GUNICORN_WORKERS:-3}
+    # gthread: long-lived SSE stats streams hold a thread, not a whole worker;
+    # WG_LIVE_STREAMS (default 8) caps them per worker so other requests keep threads
+    THREADS=${GUNICORN_THREADS:-16}
     TIMEOUT=${GUNICORN_TIMEOUT:-60}
     BIND=${GUNICORN_BIND:-0.0.0.0:8000}
     ACCESS_LOG=${GUNICORN_ACCESS_LOG:--}
     ERROR_LOG=${GUNICORN_ERROR_LOG:--}
     exec gunicorn \
         --workers "$WORKERS" \
+        --worker-class gthread \
+        --threads "$THREADS" \
         --timeout "$TIMEOUT" \
         --bind "$BIND" \
         --access-logfile "$ACCESS_LOG" \
@@ -0,0 +1,100 @@
+"""
+Черга застосування конфігурацій WireGuard з debounce та злиттям змін.
+
+Кожна зміна локації/мережі/пристрою лише позначає інтерфейс як "брудний".
+Перший запис у вікні ставить Celery задачу з countdown, наступні зливаються
+з нею - інтерфейс рендериться та застосовується один раз на вікно.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from wireguard_manager.metrics import inc, snapshot, value
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'wg:apply:pending:{interface}'
+RESTART_KEY = 'wg:apply:restart:{interface}'
+METRIC = 'wg_apply_queue_total'
+METRIC_NAMES = ('queued', 'coalesced', 'applied', 'failed')
+
+# Страховка: якщо worker загубив задачу, pending ключ не блокує інтерфейс назавжди
+PENDING_TIMEOUT = 60
+
+
+def _debounce():
+    return getattr(settings, 'WG_APPLY_DEBOUNCE', 0.25)
+
+
+def incr_metric(name, delta=1):
+    """Збільшує лічильник черги (wg_apply_queue_total з міткою event)"""
+    inc(METRIC, delta, event=name)
+
+
+def get_metrics():
+    """Поточні лічильники queued/coalesced/applied/failed"""
+    stored = snapshot()
+    return {name: int(value(stored, METRIC, event=name)) for name in METRIC_NAMES}
+
+
+def schedule_apply(location, restart=False):
+    """Позначає інтерфейс локації для застосування після коміту транзакції"""
+    interface = location.interface_name
+    transaction.on_commit(lambda: enqueue(interface, restart=restart))
+
+
+def enqueue(interface, restart=False):
+    """Ставить (або зливає з уже запланованим) застосування інтерфейсу"""
+    incr_metric('queued')
+    if restart:
+        cache.set(RESTART_KEY.format(interface=interface), 1, timeout=PENDING_TIMEOUT)
+
+    if not cache.add(PENDING_KEY.format(interface=interface), 1, timeout=PENDING_TIMEOUT):
+        incr_metric('coalesced')
+        return False
+
+    try:
+        from .tasks import apply_interface_task
+        apply_interface_task.apply_async(args=[interface], countdown=_debounce())
+    except Exception as e:
+        # Брокер недоступний - застосовуємо одразу в поточному процесі
+        logger.warning(f"Черга застосування недоступна, застосовую {interface} синхронно: {str(e)}")
+        apply_pending(interface)
+    return True
+
+
+def apply_pending(interface):
+    """Рендерить та застосовує інтерфейс один раз для всіх накопичених змін"""
+    from .docker_manager import WireGuardDockerManager
+    from .models import Location
+
+    # Знімаємо позначку до читання БД: зміни під час застосування поставлять нову задачу
+    cache.delete(PENDING_KEY.format(interface=interface))
+    restart_key = RESTART_KEY.format(interface=interface)
+    restart = bool(cache.get(restart_key))
+    if restart:
+        cache.delete(restart_key)
+
+    location = Location.objects.filter(interface_name=interface, is_active=True).first()
+    if location is None:
+        return False
+
+    try:
+        manager = WireGuardDockerManager()
+        if restart:
+            # Зміни рівня інтерфейсу (порт, ключ, адреса) - повний перезапуск
+            applied = manager.generate_server_config(location, signal=False) and manager.restart_wireguard(interface)
+        else:
+            applied = manager.sync_location_peers(location)
+    except Exception as e:
+        logger.error(f"Помилка застосування конфігурації {interface}: {str(e)}")
+        applied = False
+
+    incr_metric('applied' if applied else 'failed')
+    if applied:
+        # Нові/змінені peer'и - опитуємо інтерфейс з мінімальним інтервалом
+        from .sync_scheduler import wake
+        wake(interface)
+    return applied
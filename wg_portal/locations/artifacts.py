@@ -0,0 +1,98 @@
+"""
+Кеш артефактів клієнтських конфігурацій: QR коди (PNG/SVG) та ETag.
+
+Ключ - хеш вмісту (Device.get_config(), WireGuardPeer.generate_config(),
+otpauth URL), тож окрема інвалідація не потрібна: зміна полів peer'а чи мережі
+дає інший текст і інший ключ, а незмінена конфігурація завжди влучає в кеш.
+Старі артефакти просто вичерпують ARTIFACT_TTL.
+"""
+import base64
+import hashlib
+import io
+import logging
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_TTL = 7 * 24 * 3600
+ARTIFACT_KEY = 'wg:artifact:{kind}:{digest}'
+CONTENT_TYPES = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+
+def content_etag(text, kind='config'):
+    """ETag артефакту: хеш вмісту та виду артефакту"""
+    return hashlib.sha256(f'{kind}\n{text}'.encode()).hexdigest()[:32]
+
+
+def _render_qr(text, kind):
+    import qrcode
+    factory = None
+    if kind == 'svg':
+        import qrcode.image.svg
+        factory = qrcode.image.svg.SvgPathImage
+    qr = qrcode.QRCode(version=1, box_size=10, border=5, image_factory=factory)
+    qr.add_data(text)
+    qr.make(fit=True)
+
+    buffer = io.BytesIO()
+    if kind == 'svg':
+        qr.make_image().save(buffer)
+    else:
+        qr.make_image(fill_color="black", back_color="white").save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def qr_code(text, kind='png', timeout=ARTIFACT_TTL):
+    """Байти QR коду тексту (png або svg) з кешу; рендериться лише при промаху"""
+    key = ARTIFACT_KEY.format(kind=kind, digest=content_etag(text, kind))
+    try:
+        cached = cache.get(key)
+    except Exception as e:
+        logger.warning(f"Кеш артефактів недоступний: {str(e)}")
+        return _render_qr(text, kind)
+    if cached is not None:
+        return cached
+
+    rendered = _render_qr(text, kind)
+    try:
+        cache.set(key, rendered, timeout=timeout)
+    except Exception as e:
+        logger.warning(f"Не вдалося зберегти QR код у кеш: {str(e)}")
+    return rendered
+
+
+def qr_base64(text, timeout=ARTIFACT_TTL):
+    """PNG QR код у base64 (для <img src="data:...">)"""
+    return base64.b64encode(qr_code(text, 'png', timeout=timeout)).decode()
+
+
+def qr_data_uri(text, timeout=ARTIFACT_TTL):
+    return f"data:image/png;base64,{qr_base64(text, timeout=timeout)}"
+
+
+def _conditional(request, render, content_type, etag):
+    """Відповідь з ETag; 304 без рендерингу, якщо клієнт уже має цю версію"""
+    etag = quote_etag(etag)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(render(), content_type=content_type)
+    response['ETag'] = etag
+    # У конфігурації приватний ключ - лише кеш браузера з обов'язковою ревалідацією
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def config_response(request, config, filename):
+    """Файл конфігурації .conf з ETag за вмістом"""
+    response = _conditional(request, lambda: config, 'text/plain', content_etag(config))
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def qr_response(request, text, kind='png'):
+    """QR код тексту з кешу артефактів з ETag за вмістом"""
+    return _conditional(request, lambda: qr_code(text, kind), CONTENT_TYPES[kind], content_etag(text, kind))
@@ -0,0 +1,65 @@
+"""
+Споживач Redis stream, який наповнює агент wireguard_scripts/wg-stats-collector.py
+"""
+import logging
+
+from .wg_dump import parse_columns
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = 'wg:stats'
+CURSOR_KEY = 'wg:stats:cursor'
+# Курсор спільний для всіх інтерфейсів - читачі stream'у серіалізуються
+CURSOR_LOCK_KEY = 'wg:stats:cursor:lock'
+CURSOR_LOCK_TIMEOUT = 30
+HEARTBEAT_KEY = 'wg:stats:heartbeat'
+
+
+def get_redis():
+    """Повертає raw Redis з'єднання кешу за замовчуванням"""
+    from django_redis import get_redis_connection
+    return get_redis_connection('default')
+
+
+def collector_alive(conn=None):
+    """Чи живий агент (є heartbeat)"""
+    conn = conn or get_redis()
+    return bool(conn.exists(HEARTBEAT_KEY))
+
+
+def read_collector_peers(conn=None, count=1000):
+    """
+    Читає нові записи stream'у після збереженого курсора.
+
+    Агент пише рядки peer'ів у форматі `wg show all dump`, тому повертаємо
+    wg_dump.PeerColumns або None, якщо агент не живий (немає heartbeat) -
+    тоді викликач повертається до docker exec. Курсор один на весь stream,
+    тож викликач має інжестити peer'ів усіх інтерфейсів з результату.
+    """
+    conn = conn or get_redis()
+    if not collector_alive(conn):
+        return None
+
+    # Паралельні читачі інакше прочитали б ті самі записи та переставили курсор назад
+    with conn.lock(CURSOR_LOCK_KEY, timeout=CURSOR_LOCK_TIMEOUT, blocking_timeout=CURSOR_LOCK_TIMEOUT):
+        return _read_stream(conn, count)
+
+
+def _read_stream(conn, count):
+    cursor = conn.get(CURSOR_KEY) or b'0-0'
+    payloads = []
+    while True:
+        response = conn.xread({STREAM_KEY: cursor}, count=count)
+        if not response:
+            break
+        entries = response[0][1]
+        for entry_id, fields in entries:
+            payload = fields.get(b'peers', b'').decode()
+            if payload:
+                payloads.append(payload)
+            cursor = entry_id
+        if len(entries) < count:
+            break
+
+    conn.set(CURSOR_KEY, cursor)
+    return parse_columns('\n'.join(payloads))
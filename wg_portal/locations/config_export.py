@@ -0,0 +1,112 @@
+"""
+Потоковий експорт клієнтських конфігурацій у ZIP.
+
+Архів пишеться в буфер, який спорожнюється після кожного файлу, а записи
+беруться з queryset.iterator() - пам'ять не залежить від кількості пристроїв.
+zipfile сам переходить на data descriptor'и для потоку без seek.
+"""
+import io
+import logging
+import zipfile
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+
+
+class _StreamBuffer(io.RawIOBase):
+    """Файл лише для запису, вміст якого забирається частинами"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def iter_zip(entries):
+    """Частини ZIP архіву з (ім'я файлу, bytes) - по одній на кожен файл"""
+    buffer = _StreamBuffer()
+    date_time = timezone.localtime().timetuple()[:6]
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, data in entries:
+            info = zipfile.ZipInfo(name, date_time=date_time)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            # У конфігураціях приватні ключі - лише власнику
+            info.external_attr = 0o600 << 16
+            archive.writestr(info, data)
+            chunk = buffer.drain()
+            if chunk:
+                yield chunk
+    yield buffer.drain()
+
+
+def _entries(items, config_of, path_of, include_qr):
+    from .artifacts import qr_code
+    seen = set()
+    for item in items:
+        try:
+            config = config_of(item)
+        except Exception as e:
+            logger.error(f"Помилка генерації конфігурації {item}: {str(e)}")
+            continue
+        path = path_of(item)
+        # Однакові назви в межах каталогу - додаємо id
+        if path in seen:
+            path = f'{path}_{item.pk}'
+        seen.add(path)
+        yield f'{path}.conf', config.encode()
+        if include_qr:
+            yield f'{path}.png', qr_code(config)
+
+
+def device_entries(queryset, include_qr=False):
+    """Файли конфігурацій Device: <локація>/<користувач>_<пристрій>.conf (+ .png)"""
+    devices = queryset.select_related('user', 'location', 'network').order_by('location_id', 'pk')
+    return _entries(
+        devices.iterator(chunk_size=CHUNK_SIZE),
+        lambda device: device.get_config(),
+        lambda device: '/'.join((
+            get_valid_filename(device.location.name),
+            get_valid_filename(f'{device.user.username}_{device.name}'),
+        )),
+        include_qr,
+    )
+
+
+def peer_entries(queryset, include_qr=False):
+    """Файли конфігурацій WireGuardPeer: <сервер>/<користувач>_<peer>.conf (+ .png)"""
+    from wireguard_management.utils import generate_wireguard_config
+    peers = queryset.select_related('user', 'server').order_by('server_id', 'pk')
+    return _entries(
+        peers.iterator(chunk_size=CHUNK_SIZE),
+        generate_wireguard_config,
+        lambda peer: '/'.join((
+            get_valid_filename(peer.server.name),
+            get_valid_filename(f'{peer.user.username}_{peer.name}'),
+        )),
+        include_qr,
+    )
+
+
+def zip_response(entries, filename):
+    """StreamingHttpResponse з ZIP архівом"""
+    response = StreamingHttpResponse(iter_zip(entries), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Cache-Control'] = 'private, no-store'
+    # Не буферизувати архів у nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,119 @@
+"""
+Інкрементальний рендер серверних конфігурацій WireGuard.
+
+Фрагмент [Peer] кешується за (public_key, ip_address, allowed_ips, status),
+конфіг збирається одним join, а файл переписується (і сигнал перезапуску
+створюється) лише якщо sha256 вмісту відрізняється від того, що на диску.
+"""
+import hashlib
+import ipaddress
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# Кеш фрагментів на процес (gunicorn/celery worker'и живуть довго)
+FRAGMENT_CACHE_LIMIT = 100000
+_fragment_cache = {}
+
+# path -> (mtime_ns, size, sha256) - щоб не перечитувати незмінений файл
+_digest_cache = {}
+
+INTERFACE_TEMPLATE = """[Interface]
+Address = {server_ip}
+ListenPort = {listen_port}
+PrivateKey = {private_key}
+PostUp = iptables -A FORWARD -i %i -j ACCEPT; iptables -A FORWARD -o %i -j ACCEPT; iptables -t nat -A POSTROUTING -o eth+ -j MASQUERADE
+PostDown = iptables -D FORWARD -i %i -j ACCEPT; iptables -D FORWARD -o %i -j ACCEPT; iptables -t nat -D POSTROUTING -o eth+ -j MASQUERADE
+
+"""
+
+
+def server_address(subnet):
+    """Остання хост-адреса підмережі (broadcast - 1) без побудови списку hosts()"""
+    network = ipaddress.ip_network(subnet, strict=False)
+    if network.num_addresses <= 2:
+        return str(list(network.hosts())[-1])
+    return str(network.broadcast_address - 1)
+
+
+def render_peer(public_key, ip_address, allowed_ips, status):
+    """Повертає (з кешу) фрагмент [Peer] для пристрою"""
+    key = (public_key, ip_address, allowed_ips, status)
+    fragment = _fragment_cache.get(key)
+    if fragment is None:
+        if len(_fragment_cache) >= FRAGMENT_CACHE_LIMIT:
+            _fragment_cache.clear()
+        fragment = f"""
+[Peer]
+PublicKey = {public_key}
+AllowedIPs = {ip_address}/32
+"""
+        _fragment_cache[key] = fragment
+    return fragment
+
+
+def render_server_config(location, network):
+    """Збирає повний конфіг інтерфейсу локації"""
+    peers = (
+        location.devices.filter(status='active')
+        .exclude(public_key__isnull=True).exclude(public_key='')
+        .order_by('pk')
+        .values_list('public_key', 'ip_address', 'allowed_ips', 'status')
+    )
+    parts = [INTERFACE_TEMPLATE.format(
+        server_ip=server_address(network.subnet),
+        listen_port=network.listen_port,
+        private_key=location.private_key,
+    )]
+    parts.extend(render_peer(*row) for row in peers)
+    return ''.join(parts)
+
+
+def file_digest(path):
+    """sha256 файлу на диску або None, якщо файлу немає"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        _digest_cache.pop(str(path), None)
+        return None
+    cached = _digest_cache.get(str(path))
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+    with open(path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    _digest_cache[str(path)] = (stat.st_mtime_ns, stat.st_size, digest)
+    return digest
+
+
+def write_if_changed(path, content):
+    """Записує конфіг лише якщо вміст змінився; повертає True, якщо файл переписано"""
+    data = content.encode()
+    digest = hashlib.sha256(data).hexdigest()
+    if file_digest(path) == digest:
+        return False
+
+    # Атомарна заміна, щоб watcher не прочитав напівзаписаний файл; тимчасовий файл
+    # унікальний на запис і в тій самій директорії (не *.conf - watcher його пропускає)
+    directory, name = os.path.split(os.fspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f'.{name}.', suffix='.tmp', dir=directory or '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        # mkstemp створює 0600 (конфіг містить приватний ключ); наявний файл зберігає свої права
+        try:
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    stat = os.stat(path)
+    _digest_cache[str(path)] = (stat.st_mtime_ns, stat.st_size, digest)
+    return True
@@ -7,6 +7,8 @@ import json
 import os
 from pathlib import Path
 
+from .config_renderer import render_server_config, write_if_changed
+
 logger = logging.getLogger(__name__)
 
 class WireGuardDockerManager:
@@ -62,8 +64,14 @@ class WireGuardDockerManager:
         # Створюємо каталог якщо не існує
         self.wg_confs_path.mkdir(parents=True, exist_ok=True)
     
-    def generate_server_config(self, location):
-        """Генерує конфігурацію сервера для локації"""
+    def generate_server_config(self, location, signal=True):
+        """Генерує конфігурацію сервера для локації (signal=False - без сигналу watcher'у)"""
+        from wireguard_manager.metrics import track
+        with track('server_config'):
+            return self._generate_server_config(location, signal)
+
+    def _generate_server_config(self, location, signal):
+        from wireguard_manager.metrics import inc
         try:
             # Отримуємо першу мережу локації
             network = location.networks.first()
@@ -71,44 +79,27 @@ class WireGuardDockerManager:
                 logger.error(f"Локація {location.name} не має мереж")
                 return False
             
-            # Генеруємо IP сервера з підмережі (останній доступний IP)
-            import ipaddress
-            network_ip = ipaddress.IPv4Network(network.subnet, strict=False)
-            # Використовуємо передостанню IP адресу як IP сервера (остання зарезервована для broadcast)
-            server_ip = str(list(network_ip.hosts())[-1])
-            
             # Використовуємо інтерфейс з локації
             interface = location.interface_name
             
-            config_content = f"""[Interface]
-Address = {server_ip}
-ListenPort = {network.listen_port}
-PrivateKey = {location.private_key}
-PostUp = iptables -A FORWARD -i %i -j ACCEPT; iptables -A FORWARD -o %i -j ACCEPT; iptables -t nat -A POSTROUTING -o eth+ -j MASQUERADE
-PostDown = iptables -D FORWARD -i %i -j ACCEPT; iptables -D FORWARD -o %i -j ACCEPT; iptables -t nat -D POSTROUTING -o eth+ -j MASQUERADE
-
-"""
-            
-            # Додаємо всі активні пристрої локації як peer'и
-            for device in location.devices.filter(status='active'):
-                if device.public_key:
-                    config_content += f"""
-[Peer]
-PublicKey = {device.public_key}
-AllowedIPs = {device.ip_address}/32
-"""
+            # Фрагменти peer'ів кешуються, конфіг збирається одним join
+            config_content = render_server_config(location, network)
             
-            # Записуємо конфігурацію в shared volume
+            # Записуємо конфігурацію в shared volume лише якщо вміст змінився
             config_file = self.wg_confs_path / f"{interface}.conf"
             
-            with open(config_file, 'w') as f:
-                f.write(config_content)
+            if not write_if_changed(config_file, config_content):
+                logger.debug(f"Конфігурація для {location.name} не змінилась, перезапуск не потрібен")
+                return True
             
             logger.info(f"Конфігурація для {location.name} записана в {config_file}")
+            inc('wg_config_bytes_written_total', len(config_content.encode()), interface=interface)
             
-            # Створюємо файл-сигнал для перезапуску конкретного інтерфейсу
-            restart_signal = self.config_path / f'restart_{interface}'
-            restart_signal.touch()
+            # Порожній файл-сигнал: watcher застосовує конфіг через wg syncconf
+            if signal:
+                restart_signal = self.config_path / f'restart_{interface}'
+                restart_signal.touch()
+                inc('wg_restart_signals_total', interface=interface)
             
             return True
                 
@@ -149,31 +140,46 @@ AllowedIPs = {device.ip_address}/32
                 restart_signal.write_text(f"restart_{interface}")
                 logger.info(f"Створено сигнал для перезапуску WireGuard інтерфейсу {interface}")
             
+            from wireguard_manager.metrics import inc
+            inc('wg_restart_signals_total', interface=interface)
             return True
             
         except Exception as e:
             logger.error(f"Помилка створення сигналу перезапуску: {str(e)}")
             return False
     
+    def sync_location_peers(self, location):
+        """Записує конфіг і застосовує різницю peer'ів наживо (wg set), без перезапуску інтерфейсу"""
+        if not self.generate_server_config(location, signal=False):
+            return False
+        try:
+            from .peer_reconciler import PeerReconciler
+            PeerReconciler(location).apply()
+        except Exception as e:
+            # Інтерфейс недоступний наживо - watcher застосує конфіг через wg syncconf
+            logger.warning(f"[LIVE-PEER] Не вдалося застосувати peer'ів {location.interface_name} наживо: {str(e)}")
+            (self.config_path / f'restart_{location.interface_name}').touch()
+            from wireguard_manager.metrics import inc
+            inc('wg_restart_signals_total', interface=location.interface_name)
+        return True
+
     def add_peer_to_server(self, device):
-        """Додає peer до конфігурації сервера (через regeneration)"""
+        """Додає peer до конфігурації сервера та інтерфейсу (live)"""
         try:
             if not device.public_key:
                 logger.error(f"Пристрій {device.name} не має публічного ключа")
                 return False
             
-            # Перегенеровуємо повну конфігурацію сервера
-            return self.generate_server_config(device.location)
+            return self.sync_location_peers(device.location)
                 
         except Exception as e:
             logger.error(f"Помилка додавання peer: {str(e)}")
             return False
 
     def remove_peer_from_server(self, device):
-        """Видаляє peer з конфігурації сервера (через regeneration)"""
+        """Видаляє peer з конфігурації сервера та інтерфейсу (live)"""
         try:
-            # Перегенеровуємо повну конфігурацію сервера
-            return self.generate_server_config(device.location)
+            return self.sync_location_peers(device.location)
                 
         except Exception as e:
             logger.error(f"Помилка видалення peer: {str(e)}")
@@ -240,32 +240,15 @@ PostDown = iptables -D FORWARD -i {network.interface} -j ACCEPT; iptables -t nat
 
     def _generate_private_key(self):
         """Генерація приватного ключа WireGuard"""
-        try:
-            result = subprocess.run(['wg', 'genkey'], capture_output=True, text=True)
-            if result.returncode == 0:
-                return result.stdout.strip()
-            else:
-                logger.error(f"Помилка при генерації приватного ключа: {result.stderr}")
-                return "GENERATED_PRIVATE_KEY_PLACEHOLDER"
-        except Exception as e:
-            logger.error(f"Помилка при генерації приватного ключа: {str(e)}")
-            return "GENERATED_PRIVATE_KEY_PLACEHOLDER"
+        from .wgkeys import generate_private_key
+        return generate_private_key()
 
     def _generate_public_key(self, private_key):
         """Генерація публічного ключа з приватного"""
+        from .wgkeys import public_key
         try:
-            result = subprocess.run(
-                ['wg', 'pubkey'], 
-                input=private_key, 
-                capture_output=True, 
-                text=True
-            )
-            if result.returncode == 0:
-                return result.stdout.strip()
-            else:
-                logger.error(f"Помилка при генерації публічного ключа: {result.stderr}")
-                return "GENERATED_PUBLIC_KEY_PLACEHOLDER"
-        except Exception as e:
+            return public_key(private_key)
+        except ValueError as e:
             logger.error(f"Помилка при генерації публічного ключа: {str(e)}")
             return "GENERATED_PUBLIC_KEY_PLACEHOLDER"
 
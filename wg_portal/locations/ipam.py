@@ -0,0 +1,197 @@
+"""
+IPAM: видача адрес з підмережі без перебору hosts().
+
+Стан пулу - рядок IPPool з bump-вказівником (усі зсуви нижче next_offset вже
+видавались) та таблиця IPPoolFreeOffset зі звільненими зсувами. Видача бере
+найменший вільний зсув або зсуває вказівник - O(1) амортизовано незалежно від
+розміру підмережі. Рядок пулу блокується select_for_update, тому паралельні
+device_create не отримують однакову адресу.
+"""
+import ipaddress
+import logging
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Device, IPPool, IPPoolFreeOffset
+
+logger = logging.getLogger(__name__)
+
+# Зсув 1 - шлюз (Location.gateway_ip), broadcast - 1 - адреса сервера в конфігу
+FIRST_OFFSET = 2
+# Межа кількості "дірок", які переносяться у free-list при першому заповненні пулу
+MAX_SEED_GAPS = 65536
+# Скільки кандидатів пропустити за одну видачу (адреси, задані вручну повз IPAM)
+MAX_ATTEMPTS = 64
+
+
+class IPAllocator:
+    """Видає та звільняє адреси одного пулу (scope + subnet)"""
+
+    def __init__(self, scope, subnet, used, reserved=()):
+        self.scope = scope
+        self.network = ipaddress.ip_network(subnet, strict=False)
+        self.subnet = str(self.network)
+        # QuerySet моделі з полем ip_address - адреси, які вже зайняті
+        self.used = used
+        self.reserved = {
+            offset for offset in (self._offset(ip) for ip in reserved if ip) if offset is not None
+        }
+
+    @property
+    def end_offset(self):
+        """Перший зсув за межами діапазону видачі (без broadcast - 1 та broadcast)"""
+        return self.network.num_addresses - 2
+
+    def _offset(self, ip):
+        try:
+            address = ipaddress.ip_address(str(ip))
+        except ValueError:
+            return None
+        if address not in self.network:
+            return None
+        return int(address) - int(self.network.network_address)
+
+    def _address(self, offset):
+        return str(self.network.network_address + offset)
+
+    def _seed(self, pool):
+        """Переносить існуючі адреси в пул: вказівник за максимальною, дірки - у free-list"""
+        used_offsets = {
+            offset for offset in (self._offset(ip) for ip in self.used.values_list('ip_address', flat=True))
+            if offset is not None and FIRST_OFFSET <= offset < self.end_offset
+        }
+        if not used_offsets:
+            return
+        pool.next_offset = max(used_offsets) + 1
+        pool.save(update_fields=['next_offset', 'updated_at'])
+
+        gaps = pool.next_offset - FIRST_OFFSET - len(used_offsets)
+        if gaps > MAX_SEED_GAPS:
+            logger.warning(f"IPAM {self.scope} {self.subnet}: {gaps} дірок не перенесено у free-list")
+            return
+        IPPoolFreeOffset.objects.bulk_create([
+            IPPoolFreeOffset(pool=pool, offset=offset)
+            for offset in range(FIRST_OFFSET, pool.next_offset)
+            if offset not in used_offsets
+        ], batch_size=1000)
+
+    def _locked_pool(self):
+        """Рядок пулу під select_for_update; створюється та заповнюється при першому зверненні"""
+        pool = IPPool.objects.select_for_update().filter(scope=self.scope, subnet=self.subnet).first()
+        if pool is not None:
+            return pool
+        try:
+            with transaction.atomic():
+                pool = IPPool.objects.create(scope=self.scope, subnet=self.subnet, next_offset=FIRST_OFFSET)
+                self._seed(pool)
+        except IntegrityError:
+            # Пул паралельно створив інший запит
+            pass
+        return IPPool.objects.select_for_update().get(scope=self.scope, subnet=self.subnet)
+
+    def allocate(self):
+        """Повертає вільну адресу або None, якщо пул вичерпано"""
+        with transaction.atomic():
+            pool = self._locked_pool()
+            next_offset = pool.next_offset
+            address = None
+
+            for _ in range(MAX_ATTEMPTS):
+                free = pool.free_offsets.order_by('offset').first()
+                if free is not None:
+                    offset = free.offset
+                    free.delete()
+                elif next_offset < self.end_offset:
+                    offset = next_offset
+                    next_offset += 1
+                else:
+                    break
+
+                if offset in self.reserved:
+                    continue
+                candidate = self._address(offset)
+                if self.used.filter(ip_address=candidate).exists():
+                    continue
+                address = candidate
+                break
+
+            if next_offset != pool.next_offset:
+                IPPool.objects.filter(pk=pool.pk).update(next_offset=next_offset, updated_at=timezone.now())
+            return address
+
+    def allocate_many(self, count):
+        """Видає до count адрес під одним блокуванням пулу (менше - якщо пул вичерпано)"""
+        addresses = []
+        with transaction.atomic():
+            pool = self._locked_pool()
+            next_offset = pool.next_offset
+            free_ids = []
+            last_free = -1
+
+            while len(addresses) < count:
+                wanted = count - len(addresses)
+                # Спершу звільнені зсуви, далі зсув вказівника - кандидати пачкою
+                free = list(
+                    pool.free_offsets.filter(offset__gt=last_free).order_by('offset').values_list('pk', 'offset')[:wanted]
+                )
+                free_ids.extend(pk for pk, _offset in free)
+                offsets = [offset for _pk, offset in free]
+                if free:
+                    last_free = offsets[-1]
+                bump = min(wanted - len(offsets), self.end_offset - next_offset)
+                offsets.extend(range(next_offset, next_offset + bump))
+                next_offset += bump
+                if not offsets:
+                    break
+
+                candidates = [self._address(offset) for offset in offsets if offset not in self.reserved]
+                taken = set(self.used.filter(ip_address__in=candidates).values_list('ip_address', flat=True))
+                addresses.extend(candidate for candidate in candidates if candidate not in taken)
+
+            if free_ids:
+                IPPoolFreeOffset.objects.filter(pk__in=free_ids).delete()
+            if next_offset != pool.next_offset:
+                IPPool.objects.filter(pk=pool.pk).update(next_offset=next_offset, updated_at=timezone.now())
+        return addresses
+
+    def release(self, ip):
+        """Повертає адресу у free-list пулу"""
+        offset = self._offset(ip)
+        if offset is None or offset < FIRST_OFFSET or offset in self.reserved:
+            return False
+        with transaction.atomic():
+            pool = IPPool.objects.select_for_update().filter(scope=self.scope, subnet=self.subnet).first()
+            if pool is None or offset >= pool.next_offset:
+                return False
+            IPPoolFreeOffset.objects.get_or_create(pool=pool, offset=offset)
+        return True
+
+
+def location_allocator(location, subnet=None):
+    """Пул адрес пристроїв локації (спільний для Location та її мереж)"""
+    return IPAllocator(
+        f'location:{location.pk}',
+        subnet or location.subnet,
+        Device.objects.filter(location=location),
+        reserved=[location.server_ip],
+    )
+
+
+def network_allocator(network):
+    """Пул адрес peer'ів WireGuardNetwork (IP серверів мережі зарезервовані)"""
+    from wireguard_management.models import WireGuardPeer
+    return IPAllocator(
+        f'wgnetwork:{network.pk}',
+        network.network_cidr,
+        WireGuardPeer.objects.filter(server__network=network),
+        reserved=list(network.servers.values_list('server_ip', flat=True)),
+    )
+
+
+def release_location_ip(location, ip):
+    """Звільняє адресу пристрою в усіх пулах локації, що її містять"""
+    released = False
+    for subnet in IPPool.objects.filter(scope=f'location:{location.pk}').values_list('subnet', flat=True):
+        released |= location_allocator(location, subnet).release(ip)
+    return released
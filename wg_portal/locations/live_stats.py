@@ -0,0 +1,279 @@
+"""
+Живі snapshot'и статистики в Redis для дашбордів.
+
+Інжестор після кожного проходу публікує по кожній локації:
+  wg:live:loc:<id>:devices - hash device_id -> JSON стану пристрою
+  wg:live:loc:<id>:online  - set id пристроїв онлайн
+  wg:live:loc:<id>:meta    - hash {etag, taken_at}
+  wg:live:loc:<id>:events  - pub/sub канал подій змін (підключення, відключення, трафік)
+Snapshot перезаписується лише коли змінився його вміст, ключі живуть LIVE_TTL
+секунд - якщо інжест зупинився, API повертаються до запитів у БД. ETag у meta
+рахується лише з вмісту, тож незмінена статистика відповідає 304 без читання
+самих даних; taken_at - час останньої зміни, тривалості підключень рахує клієнт
+від мітки часу.
+"""
+import hashlib
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils import timezone
+
+from .collector import get_redis
+
+logger = logging.getLogger(__name__)
+
+LIVE_PREFIX = 'wg:live'
+LOCATIONS_KEY = f'{LIVE_PREFIX}:locations'
+# Секунд життя snapshot'а без оновлення від інжестора (із запасом над
+# sync_scheduler.SYNC_MAX_INTERVAL, з яким опитуються інтерфейси без змін)
+LIVE_TTL = 90
+# Тривалість одного SSE з'єднання (далі EventSource перепідключається) та інтервал keepalive;
+# keepalive також виявляє відключених клієнтів - запис у закритий сокет завершує потік
+STREAM_SECONDS = settings.WG_LIVE_STREAM_SECONDS
+STREAM_KEEPALIVE = 15
+# Слоти SSE потоків процесу: решта потоків gthread лишається для звичайних запитів
+_stream_slots = threading.BoundedSemaphore(settings.WG_LIVE_STREAMS)
+
+
+def live_key(location_id, part):
+    return f'{LIVE_PREFIX}:loc:{location_id}:{part}'
+
+
+def format_duration(seconds):
+    """Тривалість у форматі HH:MM:SS або MM:SS"""
+    seconds = max(0, int(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours > 0:
+        return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
+
+
+def device_entry(device):
+    """Стан пристрою для snapshot'а (device з select_related('user', 'location'))"""
+    user = device.user
+    if user.first_name and user.last_name:
+        initials = (user.first_name[:1] + user.last_name[:1]).upper()
+    else:
+        initials = user.username[:1].upper()
+    return {
+        'id': device.pk,
+        'name': device.name,
+        'public_key': device.public_key,
+        'ip_address': device.ip_address,
+        'status': device.status,
+        'location_name': device.location.name,
+        'user': {
+            'id': user.pk,
+            'username': user.username,
+            'full_name': user.get_full_name() or user.username,
+            'avatar_initials': initials,
+        },
+        'is_online': device.is_online,
+        'connected_at': device.connected_at.timestamp() if device.connected_at else None,
+        'last_handshake': device.last_handshake.timestamp() if device.last_handshake else None,
+        'bytes_sent': device.bytes_sent,
+        'bytes_received': device.bytes_received,
+    }
+
+
+def publish(devices, now=None, conn=None):
+    """Публікує snapshot'и локацій; повертає кількість перезаписаних"""
+    now = now or timezone.now()
+    taken_at = int(now.timestamp())
+    snapshots = defaultdict(lambda: ({}, []))
+    for device in devices:
+        entries, online = snapshots[device.location_id]
+        entry = device_entry(device)
+        entries[str(device.pk)] = json.dumps(entry, sort_keys=True, separators=(',', ':'))
+        if entry['is_online']:
+            online.append(device.pk)
+    if not snapshots:
+        return 0
+
+    conn = conn or get_redis()
+    location_ids = list(snapshots)
+    read = conn.pipeline(transaction=False)
+    for location_id in location_ids:
+        read.hget(live_key(location_id, 'meta'), 'etag')
+    current = read.execute()
+
+    etags = {}
+    changed = []
+    for location_id, previous in zip(location_ids, current):
+        entries, online = snapshots[location_id]
+        digest = hashlib.sha1()
+        for device_id in sorted(entries):
+            digest.update(entries[device_id].encode())
+        etags[location_id] = digest.hexdigest()[:20]
+        if previous is None or previous.decode() != etags[location_id]:
+            changed.append((location_id, previous is not None))
+
+    # Попередній стан змінених локацій - для подій підключення/відключення/трафіку
+    read = conn.pipeline(transaction=False)
+    for location_id, _existed in changed:
+        read.hgetall(live_key(location_id, 'devices'))
+    previous_entries = dict(zip((location_id for location_id, _existed in changed), read.execute()))
+
+    write = conn.pipeline(transaction=True)
+    for location_id in location_ids:
+        if location_id not in previous_entries:
+            for part in ('devices', 'online', 'meta'):
+                write.expire(live_key(location_id, part), LIVE_TTL)
+
+    published = 0
+    for location_id, existed in changed:
+        entries, online = snapshots[location_id]
+        etag = etags[location_id]
+        keys = [live_key(location_id, part) for part in ('devices', 'online', 'meta')]
+        if existed:
+            event = diff_entries(previous_entries[location_id], entries, taken_at)
+            if event is not None:
+                write.publish(live_key(location_id, 'events'), json.dumps(event, separators=(',', ':')))
+        devices_key, online_key, meta_key = keys
+        write.delete(devices_key, online_key)
+        write.hset(devices_key, mapping=entries)
+        if online:
+            write.sadd(online_key, *online)
+        write.hset(meta_key, mapping={'etag': etag, 'taken_at': taken_at})
+        for key in keys:
+            write.expire(key, LIVE_TTL)
+        write.sadd(LOCATIONS_KEY, location_id)
+        published += 1
+    write.execute()
+    return published
+
+
+def diff_entries(previous, entries, taken_at):
+    """Подія змін між двома snapshot'ами локації або None, якщо для клієнтів нічого не змінилось"""
+    connected, disconnected, traffic = [], [], []
+    previous = {device_id.decode(): value.decode() for device_id, value in previous.items()}
+    for device_id, value in entries.items():
+        old_value = previous.pop(device_id, None)
+        if old_value == value:
+            continue
+        entry = json.loads(value)
+        old = json.loads(old_value) if old_value else None
+        was_online = bool(old and old['is_online'])
+        if entry['is_online'] and not was_online:
+            connected.append(entry)
+        elif was_online and not entry['is_online']:
+            disconnected.append(entry['id'])
+        if old and (old['bytes_sent'], old['bytes_received']) != (entry['bytes_sent'], entry['bytes_received']):
+            traffic.append({
+                'id': entry['id'],
+                'bytes_sent': entry['bytes_sent'],
+                'bytes_received': entry['bytes_received'],
+                'delta_sent': entry['bytes_sent'] - old['bytes_sent'],
+                'delta_received': entry['bytes_received'] - old['bytes_received'],
+            })
+    # Пристрої, що зникли зі snapshot'а (видалені або перенесені)
+    for value in previous.values():
+        old = json.loads(value)
+        if old['is_online']:
+            disconnected.append(old['id'])
+    if not (connected or disconnected or traffic):
+        return None
+    return {'taken_at': taken_at, 'connected': connected, 'disconnected': disconnected, 'traffic': traffic}
+
+
+def location_etag(location_id, conn=None):
+    """ETag snapshot'а локації або None, якщо snapshot'а немає"""
+    conn = conn or get_redis()
+    etag = conn.hget(live_key(location_id, 'meta'), 'etag')
+    return etag.decode() if etag else None
+
+
+def read_location(location_id, online_only=False, conn=None):
+    """(taken_at, [стани пристроїв]) зі snapshot'а або None"""
+    conn = conn or get_redis()
+    pipe = conn.pipeline(transaction=True)
+    pipe.hget(live_key(location_id, 'meta'), 'taken_at')
+    if online_only:
+        pipe.smembers(live_key(location_id, 'online'))
+    else:
+        pipe.hvals(live_key(location_id, 'devices'))
+    taken_at, payload = pipe.execute()
+    if taken_at is None:
+        return None
+    if online_only:
+        payload = conn.hmget(live_key(location_id, 'devices'), list(payload)) if payload else []
+    return int(taken_at), [json.loads(value) for value in payload if value]
+
+
+def published_locations(conn=None):
+    """Id локацій, для яких є живий snapshot"""
+    conn = conn or get_redis()
+    location_ids = sorted(int(value) for value in conn.smembers(LOCATIONS_KEY))
+    pipe = conn.pipeline(transaction=False)
+    for location_id in location_ids:
+        pipe.hget(live_key(location_id, 'meta'), 'etag')
+    etags = pipe.execute()
+    return [(location_id, etag.decode()) for location_id, etag in zip(location_ids, etags) if etag]
+
+
+def online_etag(conn=None):
+    """Спільний ETag онлайн-списку всіх локацій або None"""
+    locations = published_locations(conn)
+    if not locations:
+        return None
+    digest = hashlib.sha1(';'.join(f'{location_id}:{etag}' for location_id, etag in locations).encode())
+    return digest.hexdigest()[:20]
+
+
+def read_online(conn=None):
+    """(taken_at, [стани пристроїв онлайн]) по всіх локаціях або None"""
+    conn = conn or get_redis()
+    taken_at = None
+    devices = []
+    for location_id, _etag in published_locations(conn):
+        snapshot = read_location(location_id, online_only=True, conn=conn)
+        if snapshot is None:
+            continue
+        taken_at = max(taken_at or 0, snapshot[0])
+        devices.extend(snapshot[1])
+    if taken_at is None:
+        return None
+    return taken_at, devices
+
+
+def safe_read(func, *args):
+    """Читання snapshot'а, стійке до недоступного Redis (None - працюємо через БД)"""
+    try:
+        return func(*args)
+    except Exception as e:
+        logger.debug(f"Живий snapshot недоступний: {str(e)}")
+        return None
+
+
+def acquire_stream():
+    """Займає слот SSE потоку; False - ліміт WG_LIVE_STREAMS вичерпано"""
+    return _stream_slots.acquire(blocking=False)
+
+
+class StreamSlot:
+    """
+    Тіло SSE відповіді, що звільняє слот потоку при закритті відповіді.
+    Django закриває відповідь і тоді, коли генератор ще не запускався.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._released = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._stream)
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            if not self._released:
+                self._released = True
+                _stream_slots.release()
@@ -0,0 +1,70 @@
+# locations/management/commands/bench_wg_dump.py
+import base64
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from locations.wg_dump import iter_peers, parse_columns
+
+
+def build_dump(peers, interfaces=1, all_format=True):
+    """Генерує синтетичний вивід `wg show [all] dump` заданого розміру"""
+    lines = []
+    per_interface = max(peers // interfaces, 1)
+    now = int(time.time())
+    for n in range(interfaces):
+        name = f'wg{n}'
+        private_key = base64.b64encode(os.urandom(32)).decode()
+        public_key = base64.b64encode(os.urandom(32)).decode()
+        interface_line = f'{private_key}\t{public_key}\t{51820 + n}\toff'
+        lines.append(f'{name}\t{interface_line}' if all_format else interface_line)
+        for i in range(per_interface):
+            key = base64.b64encode(os.urandom(32)).decode()
+            peer_line = (
+                f'{key}\t(none)\t198.51.{i // 256 % 256}.{i % 256}:{40000 + i % 20000}\t'
+                f'10.{n}.{i // 256 % 256}.{i % 256}/32\t{now - i % 600 if i % 3 else 0}\t'
+                f'{i * 1337}\t{i * 7331}\toff'
+            )
+            lines.append(f'{name}\t{peer_line}' if all_format else peer_line)
+        if not all_format:
+            break
+    return '\n'.join(lines) + '\n'
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарк парсера wg show dump на синтетичному виводі'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--peers', type=int, default=50000, help='Кількість peer\'ів у dump (50000)')
+        parser.add_argument('--interfaces', type=int, default=4, help='Кількість інтерфейсів (4)')
+        parser.add_argument('--repeat', type=int, default=5, help='Кількість повторів (5)')
+        parser.add_argument('--budget-ms', type=float, default=100.0, help='Допустимий час швидкого шляху, мс')
+
+    def handle(self, *args, **options):
+        """Заміряє швидкий (колонковий) та потоковий шляхи парсера"""
+        peers = options['peers']
+        repeat = options['repeat']
+        dump = build_dump(peers, options['interfaces'])
+        self.stdout.write(f"Dump: {peers} peer'ів, {len(dump) / 1024 / 1024:.1f} MiB")
+
+        results = {}
+        for name, parse in (
+            ('parse_columns', parse_columns),
+            ('iter_peers', lambda output: list(iter_peers(output))),
+        ):
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                parsed = parse(dump)
+                timings.append((time.perf_counter() - started) * 1000)
+            assert len(parsed) == peers, f'{name}: {len(parsed)} != {peers}'
+            results[name] = min(timings)
+            self.stdout.write(f"{name}: min {min(timings):.1f} мс, max {max(timings):.1f} мс")
+
+        if results['parse_columns'] > options['budget_ms']:
+            raise CommandError(
+                f"parse_columns перевищив бюджет {options['budget_ms']:.0f} мс: {results['parse_columns']:.1f} мс"
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS('Швидкий шлях вкладається в бюджет'))
@@ -0,0 +1,48 @@
+# locations/management/commands/bench_wgkeys.py
+import shutil
+import subprocess
+import time
+
+from django.core.management.base import BaseCommand
+
+from locations.wgkeys import decode_key, generate_keypair, public_key
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарк генерації ключів WireGuard: X25519 у процесі проти `wg genkey`/`wg pubkey`'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=10000, help='Кількість пар ключів (10000)')
+        parser.add_argument('--fork-count', type=int, default=50, help='Кількість пар через утиліту wg (50)')
+        parser.add_argument('--min-rate', type=float, default=2000.0, help='Мінімальна кількість пар за секунду')
+
+    def handle(self, *args, **options):
+        """Заміряє генерацію в процесі та (якщо є wg) варіант з fork'ами"""
+        count = options['count']
+        results = {}
+
+        started = time.perf_counter()
+        pairs = [generate_keypair() for _ in range(count)]
+        results['generate_keypair'] = count / (time.perf_counter() - started)
+        assert len({private for private, _public in pairs}) == count, 'Повторювані приватні ключі'
+        raw = decode_key(pairs[0][0])
+        assert raw[0] & 7 == 0 and raw[31] & 0xC0 == 0x40, 'Приватний ключ без clamping'
+
+        if shutil.which('wg'):
+            fork_count = options['fork_count']
+            started = time.perf_counter()
+            for _ in range(fork_count):
+                private = subprocess.run(['wg', 'genkey'], capture_output=True, text=True, check=True).stdout.strip()
+                public = subprocess.run(['wg', 'pubkey'], input=private, capture_output=True, text=True, check=True).stdout.strip()
+            results['wg genkey/pubkey'] = fork_count / (time.perf_counter() - started)
+            assert public_key(private) == public, 'Публічний ключ не збігається з `wg pubkey`'
+        else:
+            self.stdout.write("Утиліта wg недоступна - порівняння з fork'ами пропущено")
+
+        for name, rate in results.items():
+            self.stdout.write(f"{name}: {rate:,.0f} пар/с")
+
+        if results['generate_keypair'] < options['min_rate']:
+            self.stdout.write(self.style.WARNING(f"Генерація повільніша за {options['min_rate']:,.0f} пар/с"))
+        else:
+            self.stdout.write(self.style.SUCCESS('Генерація ключів вкладається в бюджет'))
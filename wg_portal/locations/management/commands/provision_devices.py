@@ -0,0 +1,44 @@
+# locations/management/commands/provision_devices.py
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from locations.provisioning import parse_rows, provision
+
+
+class Command(BaseCommand):
+    help = 'Масово створює пристрої з CSV або JSON файлу (поля user, name, location)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str, help='Шлях до CSV або JSON файлу')
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'json'],
+            help='Формат файлу (за замовчуванням - за розширенням)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Перевірити та видати адреси без збереження',
+        )
+
+    def handle(self, *args, **options):
+        """Створює пристрої одним batch'ем та ставить одне застосування на інтерфейс"""
+        path = options['path']
+        fmt = options.get('format') or ('json' if path.lower().endswith('.json') else 'csv')
+        try:
+            with open(path, 'rb') as f:
+                rows = parse_rows(f.read(), fmt)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Не вдалося прочитати {path}: {str(e)}')
+
+        result = provision(rows, dry_run=options['dry_run'])
+
+        for error in result['errors']:
+            self.stdout.write(self.style.ERROR(f"Рядок {error['row']}: {error['error']}"))
+        if options['verbosity'] > 1:
+            self.stdout.write(json.dumps(result['created'], ensure_ascii=False, indent=2))
+        prefix = 'Перевірено (без збереження)' if options['dry_run'] else 'Створено'
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}: {len(result['created'])} пристроїв, {result['peers']} peer'ів, помилок {len(result['errors'])}"
+        ))
@@ -5,6 +5,7 @@ Django management команда для синхронізації WireGuard к
 from django.core.management.base import BaseCommand
 from locations.models import Location
 from locations.docker_manager import WireGuardDockerManager
+from locations.parallel import run_parallel
 import logging
 
 class Command(BaseCommand):
@@ -21,6 +22,11 @@ class Command(BaseCommand):
             action='store_true',
             help='Перезапустити WireGuard після синхронізації',
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Кількість локацій, що обробляються паралельно (за замовчуванням WG_SYNC_WORKERS)',
+        )
 
     def handle(self, *args, **options):
         location_filter = options.get('location')
@@ -52,25 +58,28 @@ class Command(BaseCommand):
             )
             return
 
+        # Локації обробляються паралельно: помилка або зависання однієї не блокує інших
+        locations = list(locations)
+        results = run_parallel(
+            manager.generate_server_config, locations,
+            key=lambda location: location.pk, workers=options.get('workers'),
+        )
+
         success_count = 0
         for location in locations:
-            self.stdout.write(f'Синхронізація локації: {location.name}')
-            
-            try:
-                # Генеруємо конфігурацію сервера
-                if manager.generate_server_config(location):
-                    self.stdout.write(
-                        self.style.SUCCESS(f'✓ Конфігурація для {location.name} оновлена')
-                    )
-                    success_count += 1
-                else:
-                    self.stdout.write(
-                        self.style.ERROR(f'✗ Помилка оновлення конфігурації для {location.name}')
-                    )
-                    
-            except Exception as e:
+            ok, result = results[location.pk]
+            if ok and result:
+                self.stdout.write(
+                    self.style.SUCCESS(f'✓ Конфігурація для {location.name} оновлена')
+                )
+                success_count += 1
+            elif ok:
+                self.stdout.write(
+                    self.style.ERROR(f'✗ Помилка оновлення конфігурації для {location.name}')
+                )
+            else:
                 self.stdout.write(
-                    self.style.ERROR(f'✗ Помилка обробки {location.name}: {str(e)}')
+                    self.style.ERROR(f'✗ Помилка обробки {location.name}: {result}')
                 )
 
         # Перезапускаємо WireGuard якщо потрібно
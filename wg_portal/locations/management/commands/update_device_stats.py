@@ -2,8 +2,8 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from locations.models import Device, Location
+from locations.wg_dump import iter_peers
 import subprocess
-import re
 
 
 class Command(BaseCommand):
@@ -50,52 +50,46 @@ class Command(BaseCommand):
                 self.stdout.write(f"Немає даних для {location.interface_name}")
                 return
                 
-            # Парсимо вивід
-            lines = output.split('\n')
-            
-            for line in lines[1:]:  # Пропускаємо заголовок
-                if not line.strip():
-                    continue
+            # Парсимо вивід спільним парсером dump'у (рядок інтерфейсу пропускається)
+            for peer in iter_peers(output, interface=location.interface_name):
+                public_key = peer.public_key
+                endpoint = peer.endpoint
+                bytes_received = peer.bytes_received
+                bytes_sent = peer.bytes_sent
+                last_handshake_timestamp = peer.last_handshake
+                
+                # Знаходимо пристрій за публічним ключем
+                try:
+                    device = Device.objects.get(
+                        public_key=public_key,
+                        location=location
+                    )
                     
-                parts = line.split('\t')
-                if len(parts) >= 6:
-                    public_key = parts[0]
-                    endpoint = parts[2] if parts[2] != '(none)' else None
-                    bytes_received = int(parts[4]) if parts[4] != '0' else 0
-                    bytes_sent = int(parts[5]) if parts[5] != '0' else 0
-                    last_handshake_timestamp = int(parts[3]) if parts[3] != '0' else None
+                    # Оновлюємо трафік вузьким UPDATE (без регенерації конфігурації)
+                    stats = {
+                        'bytes_sent': bytes_sent,
+                        'bytes_received': bytes_received,
+                    }
                     
-                    # Знаходимо пристрій за публічним ключем
-                    try:
-                        device = Device.objects.get(
-                            public_key=public_key,
-                            location=location
+                    # Оновлюємо last_handshake якщо є timestamp
+                    if last_handshake_timestamp:
+                        stats['last_handshake'] = timezone.datetime.fromtimestamp(
+                            last_handshake_timestamp, 
+                            tz=timezone.get_current_timezone()
                         )
-                        
-                        # Оновлюємо трафік
-                        old_total = device.traffic_total
-                        # Передаємо bytes_sent, bytes_received, last_handshake
-                        device.update_traffic(bytes_sent, bytes_received, handshake_time=timezone.datetime.fromtimestamp(last_handshake_timestamp, tz=timezone.get_current_timezone()) if last_handshake_timestamp else None)
-                        
-                        # Оновлюємо last_handshake якщо є timestamp
-                        if last_handshake_timestamp:
-                            device.last_handshake = timezone.datetime.fromtimestamp(
-                                last_handshake_timestamp, 
-                                tz=timezone.get_current_timezone()
-                            )
-                        
-                        # Якщо трафік змінився або є активне підключення
-                        if device.traffic_total != old_total or endpoint:
-                            if not device.connected_at:
-                                device.connected_at = timezone.now()
-                        
-                        device.save()
-                        
-                        self.stdout.write(f"Оновлено {device.name}: {bytes_received}↓ {bytes_sent}↑")
-                        
-                    except Device.DoesNotExist:
-                        self.stdout.write(f"Пристрій з ключем {public_key[:10]}... не знайдено")
-                        
+                    
+                    # Якщо трафік змінився або є активне підключення
+                    if bytes_sent + bytes_received != device.traffic_total or endpoint:
+                        if not device.connected_at:
+                            stats['connected_at'] = timezone.now()
+                    
+                    device.update_stats(**stats)
+                    
+                    self.stdout.write(f"Оновлено {device.name}: {bytes_received}↓ {bytes_sent}↑")
+                    
+                except Device.DoesNotExist:
+                    self.stdout.write(f"Пристрій з ключем {public_key[:10]}... не знайдено")
+                    
         except Exception as e:
             self.stdout.write(
                 self.style.ERROR(f'Неочікувана помилка для {location.name}: {e}')
@@ -130,21 +130,15 @@ class Location(models.Model):
     @property
     def gateway_ip(self):
         """IP адреса шлюзу (перший адрес в підмережі)"""
-        return str(list(self.network.hosts())[0])
+        network = self.network
+        if network.num_addresses <= 2:
+            return str(next(network.hosts()))
+        return str(network.network_address + 1)
 
-    @property
-    def next_available_ip(self):
-        """Наступний доступний IP в підмережі"""
-        used_ips = set(
-            Device.objects.filter(location=self)
-            .values_list('ip_address', flat=True)
-        )
-        used_ips.add(self.gateway_ip)
-        
-        for ip in self.network.hosts():
-            if str(ip) not in used_ips:
-                return str(ip)
-        return None
+    def allocate_ip(self, subnet=None):
+        """Видає вільну адресу з IPAM пулу локації або None"""
+        from .ipam import location_allocator
+        return location_allocator(self, subnet).allocate()
 
     def save(self, *args, **kwargs):
         """Зберігає локацію, оновлює порт у Network та WireGuard конфігурацію"""
@@ -168,17 +162,11 @@ class Location(models.Model):
         if is_new:
             self._create_default_network()
 
-        # Потім оновлюємо WireGuard конфігурацію
+        # Потім ставимо в чергу застосування WireGuard конфігурації (зміни зливаються)
         if self.is_active:
             try:
-                from .docker_manager import WireGuardDockerManager
-                manager = WireGuardDockerManager()
-                # Генеруємо конфігурацію для цієї локації
-                manager.generate_server_config(self)
-                # Генеруємо конфігурації для всіх активних локацій
-                manager.generate_all_active_configs()
-                # Перезапускаємо цей інтерфейс
-                manager.restart_wireguard(self.interface_name)
+                from .apply_queue import schedule_apply
+                schedule_apply(self, restart=True)
             except Exception as e:
                 import logging
                 logger = logging.getLogger(__name__)
@@ -186,39 +174,8 @@ class Location(models.Model):
 
     def _generate_keys(self):
         """Генерує приватний та публічний ключі WireGuard"""
-        try:
-            import subprocess
-            
-            # Генеруємо приватний ключ
-            private_key_result = subprocess.run(
-                ['wg', 'genkey'], 
-                capture_output=True, 
-                text=True, 
-                check=True
-            )
-            self.private_key = private_key_result.stdout.strip()
-            
-            # Генеруємо публічний ключ
-            public_key_result = subprocess.run(
-                ['wg', 'pubkey'], 
-                input=self.private_key,
-                capture_output=True, 
-                text=True, 
-                check=True
-            )
-            self.public_key = public_key_result.stdout.strip()
-            
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            # Якщо wg недоступний, генеруємо фейкові ключі для розробки
-            import secrets
-            import base64
-            
-            # Генеруємо 32 байти для ключа
-            private_bytes = secrets.token_bytes(32)
-            self.private_key = base64.b64encode(private_bytes).decode('ascii')
-            
-            public_bytes = secrets.token_bytes(32)
-            self.public_key = base64.b64encode(public_bytes).decode('ascii')
+        from .wgkeys import generate_keypair
+        self.private_key, self.public_key = generate_keypair()
 
     def _create_default_network(self):
         """Створює дефолтну мережу для нової локації"""
@@ -365,13 +322,10 @@ class Network(models.Model):
         # Оновлюємо WireGuard конфігурацію для пов'язаної локації
         if self.location and self.location.is_active and self.is_active:
             try:
-                from .docker_manager import WireGuardDockerManager
-                manager = WireGuardDockerManager()
+                from .apply_queue import schedule_apply
                 
-                # Генеруємо конфігурацію для локації цієї мережі
-                manager.generate_server_config(self.location)
-                # Перезапускаємо інтерфейс
-                manager.restart_wireguard(self.location.interface_name)
+                # Конфігурація локації цієї мережі з перезапуском інтерфейсу
+                schedule_apply(self.location, restart=True)
                 
             except Exception as e:
                 import logging
@@ -451,8 +405,36 @@ class AccessControlList(models.Model):
         return f"{self.name} ({self.action})"
 
 
+class DeviceQuerySet(models.QuerySet):
+    """QuerySet пристроїв з вузьким шляхом запису телеметрії"""
+
+    def update_stats(self, **stats):
+        """Оновлює тільки поля статистики одним UPDATE, оминаючи Device.save()"""
+        unknown = set(stats) - set(Device.STATS_FIELDS)
+        if unknown:
+            raise ValueError(f"Поля не є полями статистики: {', '.join(sorted(unknown))}")
+        return self.update(**stats)
+
+    def online(self, now=None):
+        """Пристрої онлайн: активні з handshake у межах Device.ONLINE_WINDOW (фільтр у SQL)"""
+        from datetime import timedelta
+        from django.utils import timezone
+        now = now or timezone.now()
+        return self.filter(
+            status='active',
+            last_handshake__gt=now - timedelta(seconds=Device.ONLINE_WINDOW),
+        )
+
+
 class Device(models.Model):
     """Пристрій користувача в WireGuard мережі"""
+    # Поля телеметрії, які оновлюють задачі синхронізації
+    STATS_FIELDS = ('last_handshake', 'connected_at', 'bytes_sent', 'bytes_received')
+    # Поля, зміна яких потребує регенерації конфігурації сервера
+    PEER_CONFIG_FIELDS = ('public_key', 'ip_address', 'status', 'allowed_ips', 'location')
+    # Секунд без handshake, після яких пристрій вважається відключеним
+    ONLINE_WINDOW = 60
+
     STATUS_CHOICES = [
         ('active', 'Активний'),
         ('inactive', 'Неактивний'),
@@ -487,6 +469,15 @@ class Device(models.Model):
         related_name='devices',
         verbose_name="Група"
     )
+    wg_peer = models.ForeignKey(
+        'wireguard_management.WireGuardPeer',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='devices',
+        verbose_name="WireGuard peer",
+        help_text="Peer моніторингу (зв'язується за користувачем та IP адресою)"
+    )
     name = models.CharField(
         max_length=100,
         verbose_name="Назва пристрою",
@@ -551,6 +542,8 @@ class Device(models.Model):
         verbose_name="Оновлено"
     )
 
+    objects = DeviceQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Пристрій"
         verbose_name_plural = "Пристрої"
@@ -558,6 +551,10 @@ class Device(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['user', 'name'], name='unique_device_name_per_user')
         ]
+        indexes = [
+            # Діапазонне сканування для Device.objects.online() в межах локації
+            models.Index(fields=['location', 'status', 'last_handshake'], name='device_online_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.name} ({self.ip_address})"
@@ -574,7 +571,7 @@ class Device(models.Model):
         from django.utils import timezone
         # Перевіряємо, чи був трафік протягом останньої 1 хвилини
         time_since_handshake = (timezone.now() - self.last_handshake).total_seconds()
-        return time_since_handshake < 60  # 1 хвилина
+        return time_since_handshake < self.ONLINE_WINDOW
 
     @property
     def is_connected(self):
@@ -590,6 +587,28 @@ class Device(models.Model):
         """Оновлює трафік. last_handshake та connected_at оновлюються тільки в celery тасці."""
         self.bytes_sent = bytes_sent
         self.bytes_received = bytes_received
+
+    def update_stats(self, **stats):
+        """Записує телеметрію вузьким UPDATE без регенерації конфігурації WireGuard"""
+        Device.objects.filter(pk=self.pk).update_stats(**stats)
+        for field, value in stats.items():
+            setattr(self, field, value)
+
+    def sync_group_membership(self):
+        """Ставить оновлення ipset'ів груп (правила фаєрволу не перезавантажуються)"""
+        import logging
+        try:
+            from wireguard_management.firewall import schedule_group_sync
+            schedule_group_sync()
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Помилка синхронізації групи для пристрою {self.name}: {str(e)}")
+
+    def peer_config_changed(self, old_device):
+        """Чи змінились поля, що впливають на конфігурацію сервера"""
+        return any(
+            getattr(self, self._meta.get_field(name).attname) != getattr(old_device, self._meta.get_field(name).attname)
+            for name in self.PEER_CONFIG_FIELDS
+        )
     
     def get_connection_time_formatted(self):
         """Повертає відформатований час підключення на основі last_handshake"""
@@ -643,6 +662,14 @@ PersistentKeepalive = 25
         logger = logging.getLogger(__name__)
         is_new = self.pk is None
         old_device = None
+
+        # Збереження без полів peer'а (статистика, опис) не чіпає конфігурацію
+        update_fields = kwargs.get('update_fields')
+        if not is_new and update_fields is not None and not set(update_fields) & set(self.PEER_CONFIG_FIELDS):
+            super().save(*args, **kwargs)
+            if 'group' in update_fields:
+                self.sync_group_membership()
+            return
         
         # Якщо це оновлення, зберігаємо старі дані
         if not is_new:
@@ -651,21 +678,49 @@ PersistentKeepalive = 25
             except Device.DoesNotExist:
                 pass
         
+        # Зв'язок з peer'ом моніторингу тримається на (user, ip_address) - при зміні перев'язуємо
+        if old_device and self.wg_peer_id and self.wg_peer_id == old_device.wg_peer_id and (
+            (old_device.user_id, old_device.ip_address) != (self.user_id, self.ip_address)
+        ):
+            self.wg_peer = None
+            if update_fields is not None:
+                kwargs['update_fields'] = [*update_fields, 'wg_peer']
+        
         # Зберігаємо модель
         super().save(*args, **kwargs)
+
+        # Членство в групі визначає вміст ipset'ів ACL
+        if self.group_id or (old_device and old_device.group_id):
+            if not old_device or old_device.group_id != self.group_id or self.peer_config_changed(old_device):
+                self.sync_group_membership()
+
+        # Регенеруємо конфігурацію тільки якщо змінились поля peer'а
+        if old_device and not self.peer_config_changed(old_device):
+            return
+        
+        # Адресу змінено або пристрій перенесено - повертаємо стару в IPAM пул
+        if old_device and (old_device.ip_address != self.ip_address or old_device.location_id != self.location_id):
+            try:
+                from .ipam import release_location_ip
+                release_location_ip(old_device.location, old_device.ip_address)
+            except Exception as e:
+                logger.error(f"Помилка звільнення IP {old_device.ip_address}: {str(e)}")
         
-        # Оновлюємо WireGuard конфігурацію
+        # Ставимо в чергу застосування peer'ів (масові зміни зливаються в одне на інтерфейс)
         try:
-            from .docker_manager import WireGuardDockerManager
-            manager = WireGuardDockerManager()
+            from .apply_queue import schedule_apply
+
+            # Пристрій перенесено в іншу локацію - прибираємо його зі старої
+            if old_device and old_device.location_id != self.location_id and old_device.public_key:
+                schedule_apply(old_device.location)
             
             if self.status == 'active' and self.public_key:
                 # Додаємо або оновлюємо peer
-                added = manager.add_peer_to_server(self)
-                logger.info(f"Створено peer: {self} (user={self.user}, ip={self.ip_address}, public_key={self.public_key[:8]}...) | Додано в WG: {added}")
+                schedule_apply(self.location)
+                logger.info(f"Створено peer: {self} (user={self.user}, ip={self.ip_address}, public_key={self.public_key[:8]}...) | Поставлено в чергу WG")
             elif old_device and old_device.public_key:
                 # Видаляємо старий peer якщо пристрій деактивований
-                manager.remove_peer_from_server(old_device)
+                schedule_apply(old_device.location)
                 
         except Exception as e:
             logger.error(f"Помилка оновлення WireGuard peer для пристрою {self.name}: {str(e)}")
@@ -674,20 +729,26 @@ PersistentKeepalive = 25
         """Видаляє пристрій та прибирає його з WireGuard конфігурації"""
         import logging
         logger = logging.getLogger(__name__)
+        
+        # Спочатку видаляємо модель, щоб пристрою вже не було в бажаному стані peer'ів
+        result = super().delete(*args, **kwargs)
+        
         try:
-            from .docker_manager import WireGuardDockerManager
-            manager = WireGuardDockerManager()
+            from .apply_queue import schedule_apply
+            
+            # Адреса повертається в IPAM пул сигналом post_delete (locations.signals)
+            if self.group_id:
+                self.sync_group_membership()
             
             # Видаляємо peer з сервера
             if self.public_key:
-                removed = manager.remove_peer_from_server(self)
-                logger.info(f"Видалено peer: {self} (user={self.user}, ip={self.ip_address}, public_key={self.public_key[:8]}...) | Видалено з WG: {removed}")
+                schedule_apply(self.location)
+                logger.info(f"Видалено peer: {self} (user={self.user}, ip={self.ip_address}, public_key={self.public_key[:8]}...) | Поставлено в чергу WG")
                 
         except Exception as e:
             logger.error(f"Помилка видалення WireGuard peer для пристрою {self.name}: {str(e)}")
         
-        # Видаляємо модель
-        super().delete(*args, **kwargs)
+        return result
 
 
 class ACLRule(models.Model):
@@ -820,3 +881,135 @@ class UserLocationAccess(models.Model):
 
     def __str__(self):
         return f"{self.user.username} -> {self.location.name}"
+
+
+class IPPool(models.Model):
+    """Пул адрес підмережі для IPAM (bump-вказівник + список звільнених зсувів)"""
+    scope = models.CharField(
+        max_length=64,
+        verbose_name="Область",
+        help_text="Власник пулу, наприклад location:1 або wgnetwork:2"
+    )
+    subnet = models.CharField(
+        max_length=43,
+        verbose_name="Підмережа"
+    )
+    next_offset = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name="Наступний зсув",
+        help_text="Зсуви від адреси мережі нижче цього значення вже видавались"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Оновлено"
+    )
+
+    class Meta:
+        verbose_name = "IP пул"
+        verbose_name_plural = "IP пули"
+        unique_together = [['scope', 'subnet']]
+
+    def __str__(self):
+        return f"{self.scope} {self.subnet}"
+
+
+class IPPoolFreeOffset(models.Model):
+    """Звільнена адреса пулу, яку можна видати повторно"""
+    pool = models.ForeignKey(
+        IPPool,
+        on_delete=models.CASCADE,
+        related_name='free_offsets',
+        verbose_name="Пул"
+    )
+    offset = models.PositiveBigIntegerField(
+        verbose_name="Зсув"
+    )
+
+    class Meta:
+        verbose_name = "Вільна адреса пулу"
+        verbose_name_plural = "Вільні адреси пулу"
+        unique_together = [['pool', 'offset']]
+
+    def __str__(self):
+        return f"{self.pool} +{self.offset}"
+
+
+class TrafficCounter(models.Model):
+    """Останні зчитані лічильники пристрою - база для обчислення дельт трафіку"""
+    device = models.OneToOneField(
+        Device,
+        on_delete=models.CASCADE,
+        related_name='traffic_counter',
+        verbose_name="Пристрій"
+    )
+    bytes_sent = models.BigIntegerField(
+        default=0,
+        verbose_name="Відправлено байт"
+    )
+    bytes_received = models.BigIntegerField(
+        default=0,
+        verbose_name="Отримано байт"
+    )
+    sampled_at = models.DateTimeField(
+        verbose_name="Час зчитування"
+    )
+
+    class Meta:
+        verbose_name = "Лічильник трафіку"
+        verbose_name_plural = "Лічильники трафіку"
+
+    def __str__(self):
+        return f"{self.device_id}: {self.bytes_sent}/{self.bytes_received}"
+
+
+class TrafficRollup(models.Model):
+    """Трафік пристрою за інтервал (дельта лічильників) з роздільністю 1m/5m/1h/1d"""
+    RESOLUTION_CHOICES = [
+        ('1m', '1 хвилина'),
+        ('5m', '5 хвилин'),
+        ('1h', '1 година'),
+        ('1d', '1 день'),
+    ]
+
+    resolution = models.CharField(
+        max_length=2,
+        choices=RESOLUTION_CHOICES,
+        verbose_name="Роздільність"
+    )
+    bucket = models.DateTimeField(
+        verbose_name="Початок інтервалу"
+    )
+    device = models.ForeignKey(
+        Device,
+        on_delete=models.CASCADE,
+        related_name='traffic_rollups',
+        verbose_name="Пристрій"
+    )
+    location = models.ForeignKey(
+        Location,
+        on_delete=models.CASCADE,
+        related_name='traffic_rollups',
+        verbose_name="Локація"
+    )
+    bytes_sent = models.BigIntegerField(
+        default=0,
+        verbose_name="Відправлено байт"
+    )
+    bytes_received = models.BigIntegerField(
+        default=0,
+        verbose_name="Отримано байт"
+    )
+
+    class Meta:
+        verbose_name = "Агрегат трафіку"
+        verbose_name_plural = "Агрегати трафіку"
+        constraints = [
+            models.UniqueConstraint(fields=['resolution', 'device', 'bucket'], name='unique_traffic_rollup')
+        ]
+        indexes = [
+            models.Index(fields=['resolution', 'location', 'bucket'], name='traffic_rollup_location_idx'),
+            models.Index(fields=['resolution', 'bucket'], name='traffic_rollup_bucket_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.device_id} {self.resolution} {self.bucket}"
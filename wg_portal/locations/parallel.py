@@ -0,0 +1,69 @@
+"""
+Паралельне виконання операцій по локаціях/інтерфейсах.
+
+Кожен елемент обробляється в обмеженому пулі потоків, тож N локацій
+синхронізуються приблизно за час найповільнішої, а не за суму. Помилка або
+таймаут одного елемента повертається як його результат і не блокує інших.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+def default_workers():
+    return getattr(settings, 'WG_SYNC_WORKERS', 8)
+
+
+def default_timeout():
+    return getattr(settings, 'WG_SYNC_TIMEOUT', 10)
+
+
+def _call(func, item):
+    try:
+        return func(item)
+    finally:
+        # Потік пулу відкриває власне з'єднання з БД - не залишаємо його висіти
+        connection.close()
+
+
+def run_parallel(func, items, key=str, workers=None, timeout=None):
+    """
+    Виконує func(item) для кожного елемента в пулі потоків.
+
+    Повертає {key(item): (True, результат) | (False, текст помилки)}. timeout -
+    загальний дедлайн на весь прохід: елементи, що не встигли, позначаються
+    таймаутом, решта результатів повертається без очікування на них.
+    """
+    items = list(items)
+    if not items:
+        return {}
+    workers = max(1, min(workers or default_workers(), len(items)))
+    timeout = timeout if timeout is not None else default_timeout()
+
+    results = {}
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='wg-sync')
+    try:
+        started = time.monotonic()
+        futures = {executor.submit(_call, func, item): key(item) for item in items}
+        done, pending = wait(futures, timeout=timeout)
+        for future in done:
+            name = futures[future]
+            try:
+                results[name] = (True, future.result())
+            except Exception as e:
+                logger.error(f"Помилка синхронізації {name}: {str(e)}")
+                results[name] = (False, str(e))
+        for future in pending:
+            name = futures[future]
+            logger.error(f"Синхронізація {name} не завершилась за {timeout} с")
+            results[name] = (False, f'таймаут {timeout} с')
+        logger.debug(f"Паралельна синхронізація {len(items)} елементів за {time.monotonic() - started:.2f} с")
+    finally:
+        # Завислі елементи не тримають викликача; їхні потоки завершаться самі
+        executor.shutdown(wait=False, cancel_futures=True)
+    return results
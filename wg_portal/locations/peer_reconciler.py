@@ -0,0 +1,95 @@
+"""
+Живе застосування peer'ів без `wg-quick down/up`.
+
+Бажаний стан (активні пристрої локації в БД) порівнюється з живим
+(`wg show <iface> dump`), і різниця застосовується одним `wg set`:
+`peer X remove` для зайвих та `peer X allowed-ips ...` для нових/змінених.
+Інші тунелі інтерфейсу при цьому не перериваються.
+"""
+import logging
+import subprocess
+
+from .stats_sync import fetch_wg_dump
+from .wg_dump import NONE, parse_columns
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize_allowed_ips(value):
+    """'10.0.0.3/32, 10.0.0.2/32' -> frozenset для порівняння незалежно від порядку"""
+    if not value or value == NONE:
+        return frozenset()
+    return frozenset(part.strip() for part in value.split(',') if part.strip())
+
+
+class PeerReconciler:
+    """Зводить живих peer'ів інтерфейсу локації до стану з БД"""
+
+    def __init__(self, location, container='wireguard_vpn', chunk_size=500, timeout=10):
+        self.location = location
+        self.interface = location.interface_name
+        self.container = container
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+
+    def desired_peers(self):
+        """{public_key: allowed_ips} активних пристроїв локації"""
+        from .models import Device
+
+        rows = (
+            Device.objects.filter(location=self.location, status='active')
+            .exclude(public_key__isnull=True).exclude(public_key='')
+            .values_list('public_key', 'ip_address')
+        )
+        return {public_key: f"{ip_address}/32" for public_key, ip_address in rows}
+
+    def live_peers(self):
+        """{public_key: allowed_ips} peer'ів, що зараз є на інтерфейсі"""
+        columns = parse_columns(fetch_wg_dump(self.interface, timeout=self.timeout), self.interface)
+        return dict(zip(columns.public_keys, columns.allowed_ips))
+
+    @staticmethod
+    def diff(desired, live):
+        """Повертає (upserts {key: allowed_ips}, removals [key])"""
+        upserts = {
+            public_key: allowed_ips
+            for public_key, allowed_ips in desired.items()
+            if public_key not in live
+            or _normalize_allowed_ips(live[public_key]) != _normalize_allowed_ips(allowed_ips)
+        }
+        removals = [public_key for public_key in live if public_key not in desired]
+        return upserts, removals
+
+    def build_commands(self, upserts, removals):
+        """Аргументи `wg set`, по chunk_size peer'ів на виклик"""
+        operations = [['peer', public_key, 'remove'] for public_key in removals]
+        operations += [['peer', public_key, 'allowed-ips', allowed_ips] for public_key, allowed_ips in upserts.items()]
+
+        commands = []
+        for start in range(0, len(operations), self.chunk_size):
+            command = ['docker', 'exec', self.container, 'wg', 'set', self.interface]
+            for operation in operations[start:start + self.chunk_size]:
+                command.extend(operation)
+            commands.append(command)
+        return commands
+
+    def apply(self):
+        """Застосовує різницю; повертає лічильники змін"""
+        live = self.live_peers()
+        upserts, removals = self.diff(self.desired_peers(), live)
+        result = {
+            'added': sum(1 for public_key in upserts if public_key not in live),
+            'updated': sum(1 for public_key in upserts if public_key in live),
+            'removed': len(removals),
+        }
+
+        for command in self.build_commands(upserts, removals):
+            completed = subprocess.run(command, capture_output=True, text=True, timeout=self.timeout)
+            if completed.returncode != 0:
+                raise RuntimeError(completed.stderr.strip() or f'wg set завершився з кодом {completed.returncode}')
+
+        if upserts or removals:
+            logger.info(
+                f"[LIVE-PEER] {self.interface}: +{result['added']} ~{result['updated']} -{result['removed']}"
+            )
+        return result
@@ -0,0 +1,207 @@
+"""
+Масове створення пристроїв з CSV або JSON рядків (user, name, location).
+
+Користувачі, локації та вже існуючі пристрої читаються кількома запитами на
+весь batch, ключі генеруються в процесі (wgkeys), адреси видаються одним
+блокуванням пулу на локацію (IPAllocator.allocate_many), а пристрої та
+дзеркальні WireGuardPeer вставляються bulk_create в одній транзакції.
+Застосування конфігурації ставиться один раз на інтерфейс після коміту.
+"""
+import csv
+import io
+import json
+import logging
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Device, Location
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('user', 'name', 'location')
+MAX_ROWS = 5000
+BATCH_SIZE = 500
+
+
+def parse_rows(content, fmt='csv'):
+    """Рядки {user, name, location} з CSV (із заголовком) або JSON (список чи {"devices": [...]})"""
+    if isinstance(content, bytes):
+        content = content.decode('utf-8-sig')
+    if fmt == 'json':
+        data = json.loads(content)
+        if isinstance(data, dict):
+            data = data.get('devices', [])
+        if not isinstance(data, list):
+            raise ValueError('Очікується список пристроїв')
+        rows = data
+    else:
+        rows = list(csv.DictReader(io.StringIO(content)))
+    if len(rows) > MAX_ROWS:
+        raise ValueError(f'Забагато рядків: {len(rows)} (максимум {MAX_ROWS})')
+    return [
+        {field: str(row.get(field) or '').strip() for field in FIELDS} if isinstance(row, dict) else {}
+        for row in rows
+    ]
+
+
+def _resolve_users(values):
+    """{значення: користувач} за id, username або email"""
+    User = get_user_model()
+    ids = [int(value) for value in values if value.isdigit()]
+    users = User.objects.filter(Q(username__in=values) | Q(email__in=values) | Q(pk__in=ids))
+    resolved = {}
+    for user in users:
+        for key in (str(user.pk), user.username, user.email):
+            if key in values:
+                resolved.setdefault(key, user)
+    return resolved
+
+
+def _resolve_locations(values):
+    """{значення: локація} за id, назвою або інтерфейсом"""
+    ids = [int(value) for value in values if value.isdigit()]
+    locations = Location.objects.filter(Q(name__in=values) | Q(interface_name__in=values) | Q(pk__in=ids))
+    resolved = {}
+    for location in locations:
+        for key in (str(location.pk), location.name, location.interface_name):
+            if key in values:
+                resolved.setdefault(key, location)
+    return resolved
+
+
+def _default_network(location):
+    network = location.networks.first()
+    if network is None:
+        location._create_default_network()
+        network = location.networks.first()
+    return network
+
+
+def _mirror_peers(devices):
+    """Дзеркальні WireGuardPeer для нових пристроїв (як device_create) одним bulk_create"""
+    from wireguard_management.models import WireGuardPeer, WireGuardServer
+
+    subnets = {device.network.subnet for device in devices if device.network.subnet}
+    servers = {}
+    for server in WireGuardServer.objects.filter(network__network_cidr__in=subnets).select_related('network').order_by('pk'):
+        servers.setdefault(server.network.network_cidr, server)
+    # Мережа без сервера - peer не створюється (так само, як при поодинокому створенні)
+    candidates = [device for device in devices if device.network.subnet in servers]
+    if not candidates:
+        return 0
+
+    # Найновіший peer на (user, ip) - так само обирає save_peer_stats
+    existing = dict(
+        ((user_id, ip), pk)
+        for pk, user_id, ip in WireGuardPeer.objects.filter(
+            user__in={device.user_id for device in candidates},
+            ip_address__in={device.ip_address for device in candidates},
+        ).order_by('created_at', 'pk').values_list('pk', 'user_id', 'ip_address')
+    )
+    peers = [
+        WireGuardPeer(
+            user_id=device.user_id, server=servers[device.network.subnet], name=device.name,
+            ip_address=device.ip_address, public_key=device.public_key, private_key=device.private_key,
+            allowed_ips='0.0.0.0/0', is_active=True,
+        )
+        for device in candidates
+        if (device.user_id, device.ip_address) not in existing
+    ]
+    WireGuardPeer.objects.bulk_create(peers, batch_size=BATCH_SIZE)
+    created = len(peers)
+    if any(peer.pk is None for peer in peers):
+        # Бекенд без RETURNING - перечитуємо peer'и разом зі щойно створеними
+        peers = WireGuardPeer.objects.filter(
+            user__in={peer.user_id for peer in peers},
+            ip_address__in={peer.ip_address for peer in peers},
+        ).order_by('created_at', 'pk')
+    existing.update(((peer.user_id, peer.ip_address), peer.pk) for peer in peers)
+
+    # Зв'язок Device.wg_peer одним bulk_update (bulk_create оминає Device.save)
+    for device in candidates:
+        device.wg_peer_id = existing[(device.user_id, device.ip_address)]
+    Device.objects.bulk_update(candidates, ['wg_peer'], batch_size=BATCH_SIZE)
+    return created
+
+
+def provision(rows, dry_run=False):
+    """
+    Створює пристрої з рядків parse_rows. Повертає {'created': [...], 'errors': [...], 'peers': N};
+    рядки з помилками (невідомий користувач/локація, дубль назви, немає адрес) пропускаються.
+    """
+    from .apply_queue import schedule_apply
+    from .ipam import location_allocator
+    from .wgkeys import generate_keypair
+
+    errors = []
+    users = _resolve_users({row.get('user') for row in rows if row.get('user')})
+    locations = _resolve_locations({row.get('location') for row in rows if row.get('location')})
+    existing = set(
+        Device.objects.filter(user__in={user.pk for user in users.values()}).values_list('user_id', 'name')
+    )
+
+    pending = defaultdict(list)
+    by_pk = {location.pk: location for location in locations.values()}
+    seen = set()
+    for number, row in enumerate(rows, start=1):
+        if not all(row.get(field) for field in FIELDS):
+            errors.append({'row': number, 'error': 'Потрібні поля user, name та location'})
+            continue
+        user = users.get(row['user'])
+        location = locations.get(row['location'])
+        if user is None:
+            errors.append({'row': number, 'error': f"Користувача {row['user']} не знайдено"})
+        elif location is None:
+            errors.append({'row': number, 'error': f"Локацію {row['location']} не знайдено"})
+        elif (user.pk, row['name']) in existing or (user.pk, row['name']) in seen:
+            errors.append({'row': number, 'error': f"У {user.username} вже є пристрій {row['name']}"})
+        else:
+            seen.add((user.pk, row['name']))
+            pending[location.pk].append((number, user, row['name']))
+
+    created = []
+    peers = 0
+    with transaction.atomic():
+        devices = []
+        for location_id, items in pending.items():
+            location = by_pk[location_id]
+            network = _default_network(location)
+            if network is None:
+                errors.extend({'row': number, 'error': f'Локація {location.name} не має мережі'} for number, _u, _n in items)
+                continue
+            addresses = location_allocator(location, network.subnet).allocate_many(len(items))
+            for (number, user, name), address in zip(items, addresses):
+                private_key, public_key = generate_keypair()
+                devices.append(Device(
+                    name=name, user=user, location=location, network=network, ip_address=address,
+                    public_key=public_key, private_key=private_key, status='active',
+                ))
+            errors.extend(
+                {'row': number, 'error': f'Немає вільних IP адрес у {location.name}'}
+                for number, _user, _name in items[len(addresses):]
+            )
+
+        # bulk_create оминає Device.save - жодного застосування на кожен пристрій
+        Device.objects.bulk_create(devices, batch_size=BATCH_SIZE)
+        peers = _mirror_peers(devices)
+        created = [
+            {
+                'id': device.pk, 'user': device.user.username, 'name': device.name,
+                'location': device.location.name, 'ip_address': device.ip_address, 'public_key': device.public_key,
+            }
+            for device in devices
+        ]
+
+        if dry_run:
+            transaction.set_rollback(True)
+        else:
+            # Одне застосування на інтерфейс після коміту
+            for location in {device.location.pk: device.location for device in devices}.values():
+                schedule_apply(location)
+
+    errors.sort(key=lambda error: error['row'])
+    logger.info(f"Масове створення пристроїв: створено {len(created)}, помилок {len(errors)}, peer'ів {peers}")
+    return {'created': created, 'errors': errors, 'peers': peers, 'dry_run': dry_run}
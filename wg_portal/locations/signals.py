@@ -0,0 +1,21 @@
+import logging
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from locations.models import Device
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_delete, sender=Device)
+def release_device_ip(sender, instance, **kwargs):
+    """Повертає адресу пристрою в IPAM пул локації (також для queryset та каскадних видалень)"""
+    from locations.ipam import release_location_ip
+    try:
+        release_location_ip(instance.location, instance.ip_address)
+    except ObjectDoesNotExist:
+        pass
+    except Exception as e:
+        logger.error(f"Помилка звільнення IP {instance.ip_address}: {str(e)}")
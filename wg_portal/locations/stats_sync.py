@@ -0,0 +1,148 @@
+"""
+Інжест статистики WireGuard: один `wg show all dump`, один запит до БД
+та один bulk_update тільки по полях статистики для змінених пристроїв.
+"""
+import datetime
+import logging
+import subprocess
+
+from django.conf import settings
+
+from .collector import read_collector_peers
+from .live_stats import publish as publish_snapshots
+from .models import Device
+from .parallel import default_timeout, run_parallel
+from .wg_dump import merge_columns, parse_columns
+
+logger = logging.getLogger(__name__)
+
+# Поля, які оновлює синхронізація статистики (без побічних ефектів Device.save)
+STATS_FIELDS = list(Device.STATS_FIELDS)
+# Поля пристрою, користувача та локації для живого snapshot'а (live_stats)
+SNAPSHOT_FIELDS = (
+    'name', 'ip_address', 'location__name', 'location__interface_name',
+    'user__username', 'user__first_name', 'user__last_name',
+)
+
+
+def fetch_wg_dump(interface='all', timeout=10):
+    """Повертає вивід `wg show <interface> dump` з VPN контейнера"""
+    from wireguard_manager.metrics import timer
+    with timer('wg_subprocess_seconds', command='wg_show_dump'):
+        result = subprocess.run([
+            'docker', 'exec', 'wireguard_vpn',
+            'wg', 'show', interface, 'dump'
+        ], capture_output=True, text=True, timeout=timeout)
+
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f'wg show {interface} dump завершився з кодом {result.returncode}')
+    return result.stdout
+
+
+def fetch_interface_peers(interfaces, workers=None, timeout=None):
+    """
+    Паралельно читає `wg show <interface> dump` кожного інтерфейсу з власним таймаутом.
+    Повертає (PeerColumns успішних інтерфейсів, {інтерфейс: помилка}).
+    """
+    timeout = timeout if timeout is not None else default_timeout()
+    results = run_parallel(
+        lambda interface: parse_columns(fetch_wg_dump(interface, timeout=timeout), interface=interface),
+        sorted(interfaces), workers=workers,
+        # Дедлайн проходу трохи більший за таймаут subprocess'а одного інтерфейсу
+        timeout=timeout + 1,
+    )
+    peers = merge_columns(results[interface][1] for interface in sorted(results) if results[interface][0])
+    failed = {interface: result for interface, (ok, result) in results.items() if not ok}
+    return peers, failed
+
+
+class StatsIngestor:
+    """Зіставляє peer'ів з пристроями за публічним ключем і пише зміни одним batch'ем"""
+
+    def __init__(self, interfaces=None, batch_size=500, workers=None):
+        self.interfaces = set(interfaces) if interfaces else None
+        self.batch_size = batch_size
+        self.workers = workers
+        self.failed = {}
+
+    def run(self, dump=None):
+        """Отримує (або приймає готовий) dump та інжестить його"""
+        peers = None
+        if dump is None and settings.WG_STATS_SOURCE == 'collector':
+            # Дельти від агента в VPN контейнері - без docker exec на кожен тік
+            try:
+                peers = read_collector_peers()
+            except Exception as e:
+                logger.warning(f"Stream агента статистики недоступний: {str(e)}")
+            if peers is not None:
+                # Курсор stream'у вже за цими записами - інжестимо всі інтерфейси,
+                # інакше дані інтерфейсів поза self.interfaces були б втрачені
+                self.interfaces = None
+        if peers is None and dump is None and self.interfaces:
+            # Окремий dump на інтерфейс: завислий інтерфейс не зупиняє інших
+            peers, self.failed = fetch_interface_peers(self.interfaces, workers=self.workers)
+            if self.failed:
+                if len(self.failed) == len(self.interfaces):
+                    raise RuntimeError(f"Не вдалося прочитати жоден інтерфейс: {self.failed}")
+                # Пристрої інтерфейсів без даних не чіпаємо - їх snapshot'и просто застаріють
+                self.interfaces -= set(self.failed)
+        if peers is None:
+            peers = parse_columns(dump if dump is not None else fetch_wg_dump('all'))
+        if self.interfaces:
+            peers = peers.select_interfaces(self.interfaces)
+        result = self.ingest(peers)
+        result['failed'] = self.failed
+        return result
+
+    def ingest(self, peers):
+        """Оновлює статистику пристроїв з wg_dump.PeerColumns; повертає лічильники peer'ів/збігів/оновлень"""
+        devices = Device.objects.filter(location__is_active=True).select_related('user', 'location').only(
+            'id', 'public_key', 'status', *STATS_FIELDS, *SNAPSHOT_FIELDS
+        )
+        if self.interfaces:
+            devices = devices.filter(location__interface_name__in=self.interfaces)
+        devices_by_key = {device.public_key: device for device in devices}
+
+        matched = set()
+        changed = {}
+        # Рядки йдуть у порядку dump'у/stream'у - для дублікатів перемагає останній
+        for _interface, public_key, handshake, received, sent in peers.rows():
+            device = devices_by_key.get(public_key)
+            if device is None:
+                continue
+            matched.add(device.pk)
+            if self.apply_peer_stats(device, handshake, received, sent):
+                changed[device.pk] = device
+
+        if changed:
+            Device.objects.bulk_update(list(changed.values()), STATS_FIELDS, batch_size=self.batch_size)
+
+        # Живий snapshot для дашбордів; недоступний Redis не зупиняє інжест
+        try:
+            publish_snapshots(devices_by_key.values())
+        except Exception as e:
+            logger.warning(f"Не вдалося опублікувати живу статистику: {str(e)}")
+
+        # Кількість змінених пристроїв по інтерфейсах - для адаптивного планувальника
+        by_interface = {}
+        for device in changed.values():
+            interface = device.location.interface_name
+            by_interface[interface] = by_interface.get(interface, 0) + 1
+
+        return {'peers': len(peers), 'matched': len(matched), 'updated': len(changed), 'by_interface': by_interface}
+
+    @staticmethod
+    def apply_peer_stats(device, handshake, bytes_received, bytes_sent):
+        """Застосовує дані peer'а до пристрою; повертає True, якщо щось змінилось"""
+        before = (device.last_handshake, device.connected_at, device.bytes_sent, device.bytes_received)
+
+        if handshake:
+            new_handshake = datetime.datetime.fromtimestamp(handshake, tz=datetime.timezone.utc)
+            # Якщо пристрій був offline і став online — оновлюємо connected_at
+            if not device.is_online:
+                device.connected_at = new_handshake
+            device.last_handshake = new_handshake
+        device.bytes_received = bytes_received
+        device.bytes_sent = bytes_sent
+
+        return before != (device.last_handshake, device.connected_at, device.bytes_sent, device.bytes_received)
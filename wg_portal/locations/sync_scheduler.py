@@ -0,0 +1,157 @@
+"""
+Адаптивний планувальник синхронізації статистики WireGuard.
+
+Beat щосекунди ставить легкий tick (з expires, тож черга не накопичується).
+Tick синхронізує лише інтерфейси, чий час настав (кожен окремим dump'ом у
+пулі потоків, див. parallel.py): інтерфейс зі змінами
+опитується щосекунди, без змін - інтервал подвоюється до SYNC_MAX_INTERVAL.
+У режимі collector розклад не застосовується: stream агента має один курсор
+на всі інтерфейси, тож кожен tick читає та інжестить його повністю.
+Кожен інтерфейс синхронізується під single-flight lock'ом - перекриті запуски
+пропускаються. Затримка відносно розкладу та тривалість проходу пишуться
+гістограмами в wireguard_manager.metrics.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from wireguard_manager.metrics import histogram, inc, observe, snapshot, track, value
+
+from .collector import collector_alive
+from .models import Location
+from .stats_sync import StatsIngestor
+
+logger = logging.getLogger(__name__)
+
+SYNC_MIN_INTERVAL = 1.0
+SYNC_MAX_INTERVAL = 30.0
+# Страховка: lock впалого worker'а звільняється сам
+LOCK_TIMEOUT = 30
+
+LOCK_KEY = 'wg:sync:lock:{interface}'
+NEXT_KEY = 'wg:sync:next:{interface}'
+INTERVAL_KEY = 'wg:sync:interval:{interface}'
+COUNTER = 'wg_sync_scheduler_total'
+COUNTER_NAMES = ('runs', 'skipped', 'failed')
+HISTOGRAM = 'wg_sync_{name}_seconds'
+HISTOGRAM_NAMES = ('lag', 'duration')
+
+
+def next_interval(previous, changed):
+    """Гарячий інтерфейс - мінімальний інтервал, без змін - подвоєння до максимуму"""
+    if changed:
+        return SYNC_MIN_INTERVAL
+    return min(SYNC_MAX_INTERVAL, max(SYNC_MIN_INTERVAL, (previous or SYNC_MIN_INTERVAL) * 2))
+
+
+def wake(interface):
+    """Скидає інтервал інтерфейсу - наступний tick синхронізує його одразу"""
+    cache.delete_many([NEXT_KEY.format(interface=interface), INTERVAL_KEY.format(interface=interface)])
+
+
+def _collector_alive():
+    try:
+        return collector_alive()
+    except Exception as e:
+        logger.warning(f"Stream агента статистики недоступний: {str(e)}")
+        return False
+
+
+def active_interfaces():
+    return list(Location.objects.filter(is_active=True).values_list('interface_name', flat=True))
+
+
+def sync_interfaces(interfaces, now=None, workers=None):
+    """Синхронізує інтерфейси (паралельно, під single-flight lock'ами) та оновлює їх інтервали"""
+    now = now or time.time()
+    acquired = [iface for iface in interfaces if cache.add(LOCK_KEY.format(interface=iface), now, timeout=LOCK_TIMEOUT)]
+    skipped = len(interfaces) - len(acquired)
+    if skipped:
+        inc(COUNTER, skipped, event='skipped')
+        logger.debug(f"Пропущено {skipped} інтерфейсів: попередня синхронізація ще триває")
+    if not acquired:
+        return {'interfaces': 0, 'skipped': skipped, 'updated': 0, 'failed': {}}
+
+    try:
+        state = cache.get_many(
+            [NEXT_KEY.format(interface=iface) for iface in acquired]
+            + [INTERVAL_KEY.format(interface=iface) for iface in acquired]
+        )
+        for iface in acquired:
+            due = state.get(NEXT_KEY.format(interface=iface))
+            observe(HISTOGRAM.format(name='lag'), max(0.0, now - due) if due else 0.0)
+
+        started = time.monotonic()
+        try:
+            with track('stats_sync'):
+                result = StatsIngestor(interfaces=acquired, workers=workers).run()
+        except Exception:
+            inc(COUNTER, event='failed')
+            raise
+        duration = time.monotonic() - started
+        observe(HISTOGRAM.format(name='duration'), duration)
+        inc(COUNTER, event='runs')
+        inc('wg_rows_touched_total', result['updated'], operation='stats_sync')
+        if result['failed']:
+            # Інтерфейси з помилкою відкладаються як незмінені, решта вже оновлена
+            inc(COUNTER, len(result['failed']), event='failed')
+
+        schedule = {}
+        for iface in acquired:
+            interval = next_interval(
+                state.get(INTERVAL_KEY.format(interface=iface)),
+                result['by_interface'].get(iface, 0),
+            )
+            schedule[INTERVAL_KEY.format(interface=iface)] = interval
+            schedule[NEXT_KEY.format(interface=iface)] = now + interval
+        cache.set_many(schedule, timeout=None)
+    finally:
+        cache.delete_many([LOCK_KEY.format(interface=iface) for iface in acquired])
+
+    return {'interfaces': len(acquired), 'skipped': skipped, 'updated': result['updated'], 'failed': result['failed']}
+
+
+def tick(now=None):
+    """Один тік beat'а: синхронізує інтерфейси, чий час настав"""
+    now = now or time.time()
+    interfaces = active_interfaces()
+    if settings.WG_STATS_SOURCE == 'collector' and _collector_alive():
+        # Stream агента спільний для всіх інтерфейсів: кожен tick читає його цілком,
+        # розклад інтерфейсів стосується лише docker exec (`wg show`)
+        due = interfaces
+    else:
+        due_at = cache.get_many([NEXT_KEY.format(interface=iface) for iface in interfaces])
+        due = [iface for iface in interfaces if due_at.get(NEXT_KEY.format(interface=iface), 0) <= now]
+    if not due:
+        return {'interfaces': 0, 'skipped': 0, 'updated': 0, 'failed': {}}
+    return sync_interfaces(due, now=now)
+
+
+def interface_intervals():
+    """Поточні інтервали опитування активних інтерфейсів, секунди (None - ще не синхронізувався)"""
+    interfaces = active_interfaces()
+    values = cache.get_many([INTERVAL_KEY.format(interface=iface) for iface in interfaces])
+    return {iface: values.get(INTERVAL_KEY.format(interface=iface)) for iface in interfaces}
+
+
+def get_metrics():
+    """Інтервали інтерфейсів, лічильники та гістограми lag/duration (кумулятивні кошики)"""
+    interfaces = active_interfaces()
+    values = cache.get_many([key.format(interface=iface) for iface in interfaces for key in (NEXT_KEY, INTERVAL_KEY)])
+    stored = snapshot()
+
+    now = time.time()
+    return {
+        **{name: int(value(stored, COUNTER, event=name)) for name in COUNTER_NAMES},
+        'histograms': {name: histogram(stored, HISTOGRAM.format(name=name)) for name in HISTOGRAM_NAMES},
+        'interfaces': {
+            iface: {
+                'interval': values.get(INTERVAL_KEY.format(interface=iface)),
+                'next_in': round(max(0.0, values[NEXT_KEY.format(interface=iface)] - now), 3)
+                if NEXT_KEY.format(interface=iface) in values else None,
+            }
+            for iface in interfaces
+        },
+    }
@@ -4,8 +4,9 @@ import logging
 
 @shared_task
 def fast_sync_stats_task():
+	from .sync_scheduler import tick
 	try:
-		call_command('fast_sync_stats', '--quiet')
+		tick()
 	except Exception as e:
 		logging.error(f"fast_sync_stats_task error: {e}")
 
@@ -15,3 +16,28 @@ def save_peer_stats_task():
 		call_command('save_peer_stats')
 	except Exception as e:
 		logging.error(f"save_peer_stats_task error: {e}")
+
+@shared_task
+def apply_interface_task(interface):
+	from .apply_queue import apply_pending
+	try:
+		apply_pending(interface)
+	except Exception as e:
+		logging.error(f"apply_interface_task error ({interface}): {e}")
+
+@shared_task
+def sample_traffic_task():
+	from .traffic_series import sample_counters
+	try:
+		sample_counters()
+	except Exception as e:
+		logging.error(f"sample_traffic_task error: {e}")
+
+@shared_task
+def rollup_traffic_task():
+	from .traffic_series import prune, rollup
+	try:
+		rollup()
+		prune()
+	except Exception as e:
+		logging.error(f"rollup_traffic_task error: {e}")
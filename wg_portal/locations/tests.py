@@ -0,0 +1,656 @@
+import base64
+import importlib.util
+import shutil
+import subprocess
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from . import collector, sync_scheduler, traffic_series, wgkeys
+from .models import Device, Location, Network, TrafficRollup
+from .stats_sync import StatsIngestor
+from .wg_dump import PEER_FIELDS, iter_peers, parse_columns
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+AGENT_PATH = Path(settings.BASE_DIR).parent / 'wireguard_scripts' / 'wg-stats-collector.py'
+
+
+def create_locations(user, count, devices_per_location):
+    """Локації з мережею та пристроями через bulk_create - без застосування конфігурацій"""
+    start = Location.objects.count()
+    Location.objects.bulk_create([
+        Location(
+            name=f'Location {n}', server_ip='192.0.2.1', server_port=51820 + n,
+            subnet=f'10.{n}.0.0/24', interface_name=f'wg{n}', public_key=f'pub{n}', private_key=f'priv{n}',
+        )
+        for n in range(start, start + count)
+    ])
+    locations = list(Location.objects.order_by('pk')[start:])
+    Network.objects.bulk_create([
+        Network(
+            name=f'{location.name} - Default Network', location=location, subnet=location.subnet,
+            interface=location.interface_name, server_port=location.server_port,
+            listen_port=location.server_port, server_ip=location.server_ip,
+        )
+        for location in locations
+    ])
+    Device.objects.bulk_create([
+        Device(
+            name=f'{location.name} device {i}', user=user, location=location,
+            ip_address=f'10.{location.server_port - 51820}.0.{i + 2}', public_key=f'{location.pk}-{i}',
+            status='active' if i % 2 else 'inactive', bytes_received=i, bytes_sent=i,
+        )
+        for location in locations
+        for i in range(devices_per_location)
+    ])
+    return locations
+
+
+@override_settings(CACHES=LOCMEM_CACHES, SESSION_ENGINE='django.contrib.sessions.backends.cache')
+class LocationsListQueriesTest(TestCase):
+    """Кількість запитів locations_list не залежить від кількості локацій та пристроїв"""
+
+    # Користувач сесії, count пагінатора, сторінка локацій з агрегатами,
+    # підсумки пристроїв та кількість мереж
+    EXPECTED_QUERIES = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username='staff', email='staff@example.com', password='staff', is_staff=True,
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def add_locations(self, count, devices_per_location):
+        create_locations(self.user, count, devices_per_location)
+
+    def get_list(self, page=None):
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            response = self.client.get(reverse('locations:actual_list'), {'page': page} if page else {})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_single_location(self):
+        self.add_locations(1, 1)
+        response = self.get_list()
+        self.assertEqual(response.context['total_locations'], 1)
+        self.assertEqual(response.context['total_devices'], 1)
+
+    def test_queries_do_not_grow_with_locations_and_devices(self):
+        self.add_locations(1, 1)
+        self.get_list()
+        self.add_locations(20, 10)
+        response = self.get_list()
+        self.assertEqual(response.context['total_locations'], 21)
+        self.assertEqual(response.context['total_devices'], 201)
+
+    def test_annotated_counts(self):
+        self.add_locations(3, 4)
+        response = self.get_list()
+        for location in response.context['locations']:
+            self.assertEqual(location.total_devices_count, 4)
+            self.assertEqual(location.connected_users_count, 2)
+            self.assertEqual(location.traffic_in, 6)
+            self.assertTrue(location.is_active)
+
+    def test_second_page(self):
+        self.add_locations(21, 3)
+        response = self.get_list(page=2)
+        self.assertEqual(len(response.context['locations']), 9)
+
+
+def _peer_line(n, interface=None, handshake=None):
+    line = (
+        f'peer{n}key=\t(none)\t198.51.100.{n % 256}:{40000 + n}\t10.0.{n // 256}.{n % 256}/32\t'
+        f'{1700000000 + n if handshake is None else handshake}\t{n * 1337}\t{n * 7331}\toff'
+    )
+    return f'{interface}\t{line}' if interface else line
+
+
+def _all_dump(peers_per_interface):
+    lines = []
+    for n, (interface, peers) in enumerate(peers_per_interface.items()):
+        lines.append(f'{interface}\tprivate{n}=\tpublic{n}=\t{51820 + n}\toff')
+        lines += [_peer_line(1000 * n + i, interface) for i in range(peers)]
+    return '\n'.join(lines) + '\n'
+
+
+class ParseColumnsTest(SimpleTestCase):
+    """parse_columns (швидкий шлях) збігається з потоковим iter_peers на будь-якому вводі"""
+
+    def assertSameAsIterPeers(self, output, interface=None):
+        expected = [
+            (p.interface, p.public_key, p.endpoint, p.allowed_ips, p.last_handshake, p.bytes_received, p.bytes_sent)
+            for p in iter_peers(output, interface)
+        ]
+        actual = [
+            (p.interface, p.public_key, p.endpoint, p.allowed_ips, p.last_handshake, p.bytes_received, p.bytes_sent)
+            for p in parse_columns(output, interface)
+        ]
+        self.assertEqual(actual, expected)
+        return actual
+
+    def test_all_dump(self):
+        for sizes in ({'wg0': 0}, {'wg0': 1}, {'wg0': 5}, {'wg0': 3, 'wg1': 0, 'wg2': 10}, {'wg0': 7, 'wg1': 5}):
+            with self.subTest(sizes=sizes):
+                peers = self.assertSameAsIterPeers(_all_dump(sizes))
+                self.assertEqual(len(peers), sum(sizes.values()))
+
+    def test_single_interface_dump(self):
+        for count in (0, 1, 5, 9):
+            output = '\n'.join(['private=\tpublic=\t51820\toff'] + [_peer_line(i) for i in range(count)])
+            with self.subTest(count=count):
+                peers = self.assertSameAsIterPeers(output, 'wg0')
+                self.assertEqual(len(peers), count)
+
+    def test_peer_lines_without_interface_lines(self):
+        # Формат stream'у агента статистики; кратність 5 раніше давала 0 peer'ів
+        for count in (1, 3, 5, 7, 10, 45):
+            output = '\n'.join(_peer_line(i, f'wg{i % 2}', handshake=0) for i in range(count))
+            with self.subTest(count=count):
+                peers = self.assertSameAsIterPeers(output)
+                self.assertEqual(len(peers), count)
+
+    def test_truncated(self):
+        # Обрізаний посеред рядка вивід: неповний рядок пропускається
+        output = _all_dump({'wg0': 4, 'wg1': 6})
+        for cut in range(40, len(output), 37):
+            # Рядок, обрізаний рівно до 8 полів, неоднозначний (формат `<interface> dump`)
+            if output[:cut].rsplit('\n', 1)[-1].count('\t') == PEER_FIELDS - 1:
+                continue
+            with self.subTest(cut=cut):
+                self.assertSameAsIterPeers(output[:cut])
+
+    def test_garbage(self):
+        output = _all_dump({'wg0': 3, 'wg1': 5})
+        for noise in ('', 'garbage', 'a\tb', 'a\tb\tc\td\te\tf', 'wg0\tx\ty\t1\toff'):
+            lines = output.splitlines()
+            with self.subTest(noise=noise):
+                self.assertSameAsIterPeers('\n'.join(lines[:4] + [noise] + lines[4:]))
+        self.assertEqual(len(parse_columns('')), 0)
+        self.assertEqual(len(parse_columns('\n\n')), 0)
+
+
+class FakeStreamRedis:
+    """Мінімальний Redis для stream'у агента: ключі, XADD/XREAD та lock"""
+
+    def __init__(self):
+        self.values = {}
+        self.entries = []
+        self._lock = threading.Lock()
+
+    def exists(self, key):
+        return int(key in self.values)
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value if isinstance(value, bytes) else str(value).encode()
+
+    def lock(self, name, timeout=None, blocking_timeout=None):
+        return self._lock
+
+    def xadd(self, fields):
+        entry_id = f'{len(self.entries) + 1}-0'.encode()
+        self.entries.append((entry_id, {key.encode(): str(value).encode() for key, value in fields.items()}))
+        return entry_id
+
+    def xread(self, streams, count=None):
+        (key, cursor), = streams.items()
+        after = int(cursor.split(b'-')[0])
+        entries = [entry for entry in self.entries if int(entry[0].split(b'-')[0]) > after][:count]
+        return [(key.encode(), entries)] if entries else []
+
+
+class FakeSink:
+    """Sink агента, що пише в FakeStreamRedis ті самі поля, що й RedisStreamSink"""
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    def publish(self, lines, full, interval):
+        if lines or full:
+            self.redis.xadd({'full': int(full), 'peers': '\n'.join(lines)})
+        self.redis.set(collector.HEARTBEAT_KEY, 1)
+
+
+class FakeSource:
+    def __init__(self, *snapshots):
+        self.snapshots = list(snapshots)
+
+    def read(self):
+        return self.snapshots.pop(0)
+
+
+def _stream_line(interface, public_key, received):
+    return f'{interface}\t{public_key}\t(none)\t(none)\t(none)\t1700000000\t{received}\t{received * 2}\toff'
+
+
+def load_agent():
+    """Агент wireguard_scripts/wg-stats-collector.py (живе поза Django проєктом)"""
+    spec = importlib.util.spec_from_file_location('wg_stats_collector', AGENT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class ReadCollectorPeersTest(SimpleTestCase):
+    """Читання stream'у агента статистики з курсора"""
+
+    def setUp(self):
+        self.redis = FakeStreamRedis()
+        self.redis.set(collector.HEARTBEAT_KEY, 1)
+
+    def test_no_heartbeat(self):
+        del self.redis.values[collector.HEARTBEAT_KEY]
+        self.assertIsNone(collector.read_collector_peers(self.redis))
+
+    def test_reads_every_line_and_advances_cursor(self):
+        # 5 та 10 рядків peer'ів без рядків інтерфейсів раніше парсились у 0 peer'ів
+        for count in (5, 10, 7):
+            lines = [_stream_line(f'wg{i % 2}', f'key{i}', i) for i in range(count)]
+            self.redis.xadd({'full': 0, 'peers': '\n'.join(lines[:2])})
+            self.redis.xadd({'full': 0, 'peers': '\n'.join(lines[2:])})
+            with self.subTest(count=count):
+                peers = collector.read_collector_peers(self.redis)
+                self.assertEqual(list(peers.public_keys), [f'key{i}' for i in range(count)])
+                self.assertEqual(list(peers.bytes_received), list(range(count)))
+                self.assertEqual(self.redis.get(collector.CURSOR_KEY), self.redis.entries[-1][0])
+                self.assertEqual(len(collector.read_collector_peers(self.redis)), 0)
+
+    def test_pages_through_stream(self):
+        for i in range(5):
+            self.redis.xadd({'full': 0, 'peers': _stream_line('wg0', f'key{i}', i)})
+        self.redis.xadd({'full': 0, 'peers': ''})
+        peers = collector.read_collector_peers(self.redis, count=2)
+        self.assertEqual(len(peers), 5)
+        self.assertEqual(self.redis.get(collector.CURSOR_KEY), b'6-0')
+
+
+@skipUnless(AGENT_PATH.exists(), 'Агент статистики поза образом порталу')
+class CollectorAgentTest(SimpleTestCase):
+    """Collector.tick агента з фейковим джерелом -> stream -> read_collector_peers"""
+
+    def test_ticks_reach_portal(self):
+        agent = load_agent()
+        first = {
+            'wg0': {f'key{i}': (1700000000, i, i * 2, '198.51.100.1:51820') for i in range(3)},
+            'wg1': {f'key{i}': (0, i, i * 2, None) for i in range(3, 5)},
+        }
+        second = {'wg0': dict(first['wg0']), 'wg1': dict(first['wg1'])}
+        second['wg1']['key4'] = (1700000100, 400, 800, '203.0.113.7:40000')
+        redis = FakeStreamRedis()
+        agent_collector = agent.Collector(FakeSource(first, second, second), FakeSink(redis))
+
+        # Перший тік - повний знімок (5 peer'ів двох інтерфейсів)
+        agent_collector.tick()
+        peers = collector.read_collector_peers(redis)
+        self.assertEqual(sorted(zip(peers.interfaces, peers.public_keys)), sorted(
+            (interface, key) for interface, keys in first.items() for key in keys
+        ))
+        self.assertEqual(peers.by_public_key()['key0'].endpoint, '198.51.100.1:51820')
+
+        # Далі - лише змінені peer'и
+        agent_collector.tick()
+        record, = collector.read_collector_peers(redis)
+        self.assertEqual(
+            (record.interface, record.public_key, record.last_handshake, record.bytes_received, record.bytes_sent),
+            ('wg1', 'key4', 1700000100, 400, 800),
+        )
+
+        # Без змін запис у stream не додається, heartbeat лишається
+        agent_collector.tick()
+        self.assertEqual(len(redis.entries), 2)
+        self.assertEqual(len(collector.read_collector_peers(redis)), 0)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, WG_STATS_SOURCE='collector')
+class CollectorIngestTest(TestCase):
+    """Інжест зі stream'у агента: курсор спільний, тож оновлюються пристрої всіх інтерфейсів"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(username='owner', email='owner@example.com', password='owner')
+        cls.locations = create_locations(user, 2, 5)
+
+    def setUp(self):
+        self.redis = FakeStreamRedis()
+        self.redis.set(collector.HEARTBEAT_KEY, 1)
+        # 10 рядків без рядків інтерфейсів - кратність 5 раніше губила весь batch
+        self.redis.xadd({'full': 1, 'peers': '\n'.join(
+            _stream_line(device.location.interface_name, device.public_key, 1000 + n)
+            for n, device in enumerate(Device.objects.order_by('pk').select_related('location'))
+        )})
+        for target, patched in (
+            ('locations.collector.get_redis', lambda: self.redis),
+            ('locations.stats_sync.publish_snapshots', lambda devices: None),
+        ):
+            patcher = mock.patch(target, patched)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def assertAllIngested(self):
+        devices = Device.objects.order_by('pk')
+        self.assertEqual([device.bytes_received for device in devices], [1000 + n for n in range(10)])
+        self.assertTrue(all(device.last_handshake for device in devices))
+        self.assertEqual(self.redis.get(collector.CURSOR_KEY), self.redis.entries[-1][0])
+
+    def test_ingestor_reads_all_interfaces(self):
+        # Запит лише за wg0 не губить peer'ів wg1, які вже за курсором
+        result = StatsIngestor(interfaces=[self.locations[0].interface_name]).run()
+        self.assertEqual((result['peers'], result['matched'], result['updated']), (10, 10, 10))
+        self.assertEqual(result['by_interface'], {location.interface_name: 5 for location in self.locations})
+        self.assertAllIngested()
+
+    def test_scheduler_tick(self):
+        result = sync_scheduler.tick()
+        self.assertEqual((result['interfaces'], result['updated']), (2, 10))
+        self.assertAllIngested()
+
+
+def create_mirror_peers(user, locations):
+    """WireGuardNetwork/Server на підмережу кожної локації та peer на кожен активний пристрій"""
+    from wireguard_management.models import WireGuardNetwork, WireGuardPeer, WireGuardServer
+
+    servers = {}
+    for location in locations:
+        network = WireGuardNetwork.objects.create(name=location.name, network_cidr=location.subnet)
+        servers[location.pk] = WireGuardServer.objects.create(
+            name=location.name, network=network, endpoint='192.0.2.1', server_ip=location.subnet[:-4] + '1',
+            public_key=location.public_key, private_key=location.private_key,
+        )
+    WireGuardPeer.objects.bulk_create([
+        WireGuardPeer(
+            user=user, server=servers[device.location_id], name=device.name, ip_address=device.ip_address,
+            public_key=device.public_key, private_key='priv',
+        )
+        for device in Device.objects.filter(location__in=locations, status='active')
+    ])
+
+
+class SavePeerStatsQueriesTest(TestCase):
+    """Кількість запитів save_peer_stats не залежить від кількості пристроїв"""
+
+    # Пристрої, мапа peer'ів, bulk_update зв'язків, bulk_create моніторингу
+    FIRST_RUN_QUERIES = 4
+    # Пристрої та bulk_create моніторингу
+    NEXT_RUN_QUERIES = 2
+
+    def run_command(self, queries):
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        with self.assertNumQueries(queries):
+            call_command('save_peer_stats', stdout=StringIO())
+
+    def test_queries_constant(self):
+        from wireguard_management.models import PeerMonitoring
+
+        user = get_user_model().objects.create_user('owner')
+        for count in (2, 4):
+            create_mirror_peers(user, create_locations(user, count, 10))
+            # Перший прохід зв'язує пристрої з peer'ами, наступні йдуть лише через FK
+            self.run_command(self.FIRST_RUN_QUERIES)
+            self.run_command(self.NEXT_RUN_QUERIES)
+        active = Device.objects.filter(status='active')
+        self.assertFalse(active.filter(wg_peer__isnull=True).exists())
+        # По два проходи: 10 активних пристроїв, потім 30
+        self.assertEqual(PeerMonitoring.objects.count(), 2 * 10 + 2 * 30)
+
+
+@mock.patch('locations.apply_queue.schedule_apply')
+class ProvisionLinksPeersTest(TestCase):
+    def test_devices_linked_to_mirror_peers(self, schedule_apply):
+        from .provisioning import provision
+
+        user = get_user_model().objects.create_user('owner')
+        location = create_locations(user, 1, 0)[0]
+        create_mirror_peers(user, [location])
+        result = provision([
+            {'user': 'owner', 'name': f'bulk {i}', 'location': location.name} for i in range(3)
+        ])
+        self.assertEqual(result['errors'], [])
+        self.assertEqual(result['peers'], 3)
+        devices = Device.objects.filter(name__startswith='bulk').select_related('wg_peer')
+        self.assertEqual(len(devices), 3)
+        for device in devices:
+            self.assertEqual(
+                (device.wg_peer.user_id, device.wg_peer.ip_address), (device.user_id, device.ip_address)
+            )
+
+
+@override_settings(CACHES=LOCMEM_CACHES, SESSION_ENGINE='django.contrib.sessions.backends.cache')
+@mock.patch('locations.apply_queue.schedule_apply')
+class DeviceCreateLinksPeerTest(TestCase):
+    def test_device_linked_to_mirror_peer(self, schedule_apply):
+        user = get_user_model().objects.create_user('owner')
+        location = create_locations(user, 1, 0)[0]
+        create_mirror_peers(user, [location])
+        self.client.force_login(user)
+        response = self.client.post(reverse('locations:device_create'), {'name': 'laptop', 'location_id': location.pk})
+        self.assertTrue(response.json()['success'])
+        device = Device.objects.select_related('wg_peer').get(name='laptop')
+        self.assertEqual((device.wg_peer.user_id, device.wg_peer.ip_address), (user.pk, device.ip_address))
+
+
+def _hex_key(hex_string):
+    return base64.b64encode(bytes.fromhex(hex_string)).decode('ascii')
+
+
+class WgKeysTest(SimpleTestCase):
+    # RFC 7748, розділ 6.1 (Alice): приватний скаляр та його публічний ключ
+    RFC7748_PRIVATE = '77076d0a7318a57d3c16c17251b26645df4c2f87ebc0992ab177fba51db92c2a'
+    RFC7748_PUBLIC = '8520f0098930a754748b7ddcb43ef75a0dbf3a0d26381af4eba4a98eaa9b4e6a'
+
+    def test_rfc7748_vector(self):
+        self.assertEqual(wgkeys.public_key(_hex_key(self.RFC7748_PRIVATE)), _hex_key(self.RFC7748_PUBLIC))
+
+    def test_generated_keys_clamped(self):
+        for _ in range(50):
+            private_key, public_key = wgkeys.generate_keypair()
+            raw = wgkeys.decode_key(private_key)
+            self.assertEqual(raw[0] & 7, 0)
+            self.assertEqual(raw[31] & 0xC0, 0x40)
+            self.assertEqual(wgkeys.public_key(private_key), public_key)
+            self.assertEqual(len(wgkeys.decode_key(public_key)), wgkeys.KEY_SIZE)
+
+            raw = wgkeys.decode_key(wgkeys.generate_private_key())
+            self.assertEqual((raw[0] & 7, raw[31] & 0xC0), (0, 0x40))
+
+    def test_decode_rejects_invalid(self):
+        for key in ('', 'not base64!', base64.b64encode(b'short').decode('ascii'), None):
+            with self.assertRaises(ValueError):
+                wgkeys.decode_key(key)
+
+    @skipUnless(shutil.which('wg'), 'утиліта wg не встановлена')
+    def test_matches_wg_pubkey(self):
+        for private_key in (_hex_key(self.RFC7748_PRIVATE), wgkeys.generate_keypair()[0]):
+            result = subprocess.run(['wg', 'pubkey'], input=private_key, capture_output=True, text=True, check=True)
+            self.assertEqual(result.stdout.strip(), wgkeys.public_key(private_key))
+
+
+# Початок 1d інтервалу - усі грубіші роздільності вирівняні з ним
+SERIES_START = datetime(2026, 1, 5, tzinfo=dt_timezone.utc)
+
+
+class TrafficSeriesTest(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user('owner')
+        create_locations(user, 1, 2)
+        self.first, self.second = Device.objects.order_by('pk')
+
+    def set_counters(self, device, sent, received):
+        # update() замість save(): без застосування конфігурації
+        Device.objects.filter(pk=device.pk).update(bytes_sent=sent, bytes_received=received)
+
+    def rollups(self, resolution):
+        return {
+            (row.device_id, row.bucket): (row.bytes_sent, row.bytes_received)
+            for row in TrafficRollup.objects.filter(resolution=resolution)
+        }
+
+    def test_counter_delta(self):
+        self.assertEqual(traffic_series.counter_delta(100, 150), 50)
+        self.assertEqual(traffic_series.counter_delta(100, 100), 0)
+        # Рестарт інтерфейсу: лічильник почався з нуля, весь поточний обсяг - приріст
+        self.assertEqual(traffic_series.counter_delta(100, 30), 30)
+
+    def test_sample_counters(self):
+        minute = SERIES_START
+        self.set_counters(self.first, 100, 1000)
+        self.set_counters(self.second, 50, 500)
+        # Перше зчитування - лише база
+        self.assertEqual(traffic_series.sample_counters(minute), 0)
+        self.assertEqual(self.rollups('1m'), {})
+
+        self.set_counters(self.first, 160, 1200)
+        self.assertEqual(traffic_series.sample_counters(minute + timedelta(minutes=1)), 1)
+        self.assertEqual(self.rollups('1m'), {(self.first.pk, minute + timedelta(minutes=1)): (60, 200)})
+
+        # Повторний запуск у тій самій хвилині додається до інтервалу
+        self.set_counters(self.first, 170, 1300)
+        traffic_series.sample_counters(minute + timedelta(minutes=1, seconds=30))
+        self.assertEqual(self.rollups('1m')[(self.first.pk, minute + timedelta(minutes=1))], (70, 300))
+
+        # Скидання лічильника після рестарту інтерфейсу
+        self.set_counters(self.second, 20, 40)
+        traffic_series.sample_counters(minute + timedelta(minutes=2))
+        self.assertEqual(self.rollups('1m')[(self.second.pk, minute + timedelta(minutes=2))], (20, 40))
+
+    def test_rollup(self):
+        TrafficRollup.objects.bulk_create([
+            TrafficRollup(
+                resolution='1m', bucket=SERIES_START + timedelta(minutes=minute), device=self.first,
+                location_id=self.first.location_id, bytes_sent=1, bytes_received=10,
+            )
+            for minute in (0, 1, 4, 5, 61)
+        ])
+        now = SERIES_START + timedelta(hours=2)
+        self.assertEqual(traffic_series.rollup(now), 3 + 2 + 1)
+        self.assertEqual(self.rollups('5m'), {
+            (self.first.pk, SERIES_START): (3, 30),
+            (self.first.pk, SERIES_START + timedelta(minutes=5)): (1, 10),
+            (self.first.pk, SERIES_START + timedelta(minutes=60)): (1, 10),
+        })
+        self.assertEqual(self.rollups('1h'), {
+            (self.first.pk, SERIES_START): (4, 40),
+            (self.first.pk, SERIES_START + timedelta(hours=1)): (1, 10),
+        })
+        self.assertEqual(self.rollups('1d'), {(self.first.pk, SERIES_START): (5, 50)})
+
+        # Повторний rollup перераховує останній інтервал без подвоєння
+        TrafficRollup.objects.create(
+            resolution='1m', bucket=SERIES_START + timedelta(minutes=62), device=self.first,
+            location_id=self.first.location_id, bytes_sent=1, bytes_received=10,
+        )
+        traffic_series.rollup(now)
+        self.assertEqual(self.rollups('1h')[(self.first.pk, SERIES_START + timedelta(hours=1))], (2, 20))
+        self.assertEqual(self.rollups('1d'), {(self.first.pk, SERIES_START): (6, 60)})
+
+    def test_prune(self):
+        TrafficRollup.objects.bulk_create([
+            TrafficRollup(
+                resolution='1m', bucket=SERIES_START + timedelta(minutes=minute), device=self.first,
+                location_id=self.first.location_id,
+            )
+            for minute in range(5)
+        ])
+        now = SERIES_START + traffic_series.RETENTION['1m'] + timedelta(minutes=2, seconds=30)
+        with mock.patch.object(traffic_series, 'PRUNE_BATCH', 2), \
+                mock.patch.object(TrafficRollup.objects, 'filter', wraps=TrafficRollup.objects.filter) as filter_:
+            self.assertEqual(traffic_series.prune(now), 3)
+        # Три застарілі рядки порціями по два
+        self.assertEqual(sum('pk__in' in call.kwargs for call in filter_.call_args_list), 2)
+        self.assertEqual(sorted(bucket for _d, bucket in self.rollups('1m')), [
+            SERIES_START + timedelta(minutes=3), SERIES_START + timedelta(minutes=4),
+        ])
+
+
+@override_settings(PEER_MONITORING_RAW_DAYS=1, PEER_MONITORING_HOURLY_DAYS=3, PEER_MONITORING_DAILY_DAYS=10)
+class CompactPeerMonitoringTest(TestCase):
+    def setUp(self):
+        from wireguard_management.models import PeerMonitoring, WireGuardPeer
+
+        user = get_user_model().objects.create_user('owner')
+        create_mirror_peers(user, create_locations(user, 1, 2))
+        self.peer = WireGuardPeer.objects.get()
+        for minutes, sent in ((5, 10), (35, 20), (70, 30)):
+            sample = PeerMonitoring.objects.create(peer=self.peer, bytes_sent=sent, bytes_received=sent * 10)
+            # timestamp - auto_now_add, тому час зразка задаємо окремо
+            PeerMonitoring.objects.filter(pk=sample.pk).update(timestamp=SERIES_START + timedelta(minutes=minutes))
+
+    def rollups(self, resolution):
+        from wireguard_management.models import PeerMonitoringRollup
+
+        return {
+            row.bucket: (row.bytes_sent, row.bytes_received, row.samples)
+            for row in PeerMonitoringRollup.objects.filter(peer=self.peer, resolution=resolution)
+        }
+
+    def test_compact(self):
+        from wireguard_management.models import PeerMonitoring
+        from wireguard_management.monitoring import compact
+
+        now = SERIES_START + timedelta(days=3)
+        self.assertEqual(compact(now), {'hour': 2, 'day': 1, 'deleted': 2})
+        # Агрегат зберігає лічильники на кінець інтервалу
+        hourly = {
+            SERIES_START: (20, 200, 2),
+            SERIES_START + timedelta(hours=1): (30, 300, 1),
+        }
+        self.assertEqual(self.rollups('hour'), hourly)
+        self.assertEqual(self.rollups('day'), {SERIES_START: (30, 300, 3)})
+        # Сирі зразки видаляються лише до останньої згорнутої години
+        self.assertEqual(
+            list(PeerMonitoring.objects.values_list('timestamp', flat=True)), [SERIES_START + timedelta(minutes=70)]
+        )
+
+        # Повторний прохід перераховує останні інтервали без подвоєння
+        self.assertEqual(compact(now), {'hour': 1, 'day': 1, 'deleted': 0})
+        self.assertEqual(self.rollups('hour'), hourly)
+        self.assertEqual(self.rollups('day'), {SERIES_START: (30, 300, 3)})
+
+        # Денні агрегати живуть PEER_MONITORING_DAILY_DAYS
+        self.assertEqual(compact(SERIES_START + timedelta(days=11))['deleted'], 1)
+        self.assertEqual(self.rollups('day'), {})
+
+
+@override_settings(CACHES=LOCMEM_CACHES, SESSION_ENGINE='django.contrib.sessions.backends.cache')
+@mock.patch('wireguard_manager.metrics.inc')
+@mock.patch('locations.live_stats.get_redis')
+class LocationStreamLimitTest(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user('owner')
+        self.location = create_locations(user, 1, 0)[0]
+        self.client.force_login(user)
+
+    def open_stream(self):
+        return self.client.get(reverse('locations:api_location_stream', args=[self.location.pk]))
+
+    def test_streams_capped(self, get_redis, inc):
+        from . import live_stats
+
+        with mock.patch.object(live_stats, '_stream_slots', threading.BoundedSemaphore(2)):
+            first, second = self.open_stream(), self.open_stream()
+            self.assertEqual((first.status_code, second.status_code), (200, 200))
+
+            rejected = self.open_stream()
+            self.assertEqual(rejected.status_code, 503)
+            self.assertEqual(rejected['Retry-After'], '60')
+            inc.assert_called_with('wg_live_streams_total', event='rejected')
+
+            # Закриття відповіді звільняє слот, навіть якщо потік не читався
+            first.close()
+            first.close()
+            self.assertEqual(self.open_stream().status_code, 200)
+            self.assertEqual(self.open_stream().status_code, 503)
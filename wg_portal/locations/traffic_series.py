@@ -0,0 +1,185 @@
+"""
+Часові ряди трафіку пристроїв.
+
+Раз на хвилину лічильники Device.bytes_* порівнюються з TrafficCounter, і
+дельта пишеться рядком TrafficRollup з роздільністю 1m. Періодичний rollup
+підсумовує 1m -> 5m -> 1h -> 1d, а retention видаляє дрібні інтервали, коли
+вони вже покриті грубішими. Історія для графіків читається одним GROUP BY
+запитом по потрібній роздільності.
+"""
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from .models import Device, TrafficCounter, TrafficRollup
+
+logger = logging.getLogger(__name__)
+
+# Ширина інтервалу кожної роздільності в секундах
+RESOLUTIONS = {
+    '1m': 60,
+    '5m': 300,
+    '1h': 3600,
+    '1d': 86400,
+}
+# (ціль, джерело): з чого будується кожна грубіша роздільність
+ROLLUP_CHAIN = (('5m', '1m'), ('1h', '5m'), ('1d', '1h'))
+# Скільки зберігати кожну роздільність
+RETENTION = {
+    '1m': timedelta(days=2),
+    '5m': timedelta(days=14),
+    '1h': timedelta(days=90),
+    '1d': timedelta(days=730),
+}
+# Період історії -> (тривалість, роздільність)
+HISTORY_PERIODS = {
+    '1h': (timedelta(hours=1), '1m'),
+    '24h': (timedelta(hours=24), '5m'),
+    '7d': (timedelta(days=7), '1h'),
+    '30d': (timedelta(days=30), '1d'),
+    '365d': (timedelta(days=365), '1d'),
+}
+BATCH_SIZE = 1000
+PRUNE_BATCH = 2000
+
+UPSERT = dict(
+    update_conflicts=True,
+    unique_fields=['resolution', 'device', 'bucket'],
+    update_fields=['location', 'bytes_sent', 'bytes_received'],
+)
+
+
+def bucket_start(moment, resolution):
+    """Початок інтервалу роздільності, в який потрапляє moment (UTC)"""
+    width = RESOLUTIONS[resolution]
+    epoch = int(moment.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % width, tz=dt_timezone.utc)
+
+
+def counter_delta(previous, current):
+    """Приріст лічильника; після рестарту інтерфейсу лічильник починається з нуля"""
+    return current - previous if current >= previous else current
+
+
+def sample_counters(now=None):
+    """Записує 1m дельти лічильників усіх пристроїв та оновлює базу лічильників"""
+    now = now or timezone.now()
+    bucket = bucket_start(now, '1m')
+    previous = {
+        device_id: (sent, received)
+        for device_id, sent, received in TrafficCounter.objects.values_list('device_id', 'bytes_sent', 'bytes_received')
+    }
+
+    counters = []
+    deltas = {}
+    devices = Device.objects.order_by().values_list('pk', 'location_id', 'bytes_sent', 'bytes_received')
+    for device_id, location_id, sent, received in devices.iterator(chunk_size=BATCH_SIZE):
+        last = previous.get(device_id)
+        if last == (sent, received):
+            continue
+        counters.append(TrafficCounter(device_id=device_id, bytes_sent=sent, bytes_received=received, sampled_at=now))
+        # Перше зчитування - лише база, без дельти
+        if last is not None:
+            deltas[device_id] = (location_id, counter_delta(last[0], sent), counter_delta(last[1], received))
+
+    with transaction.atomic():
+        # Повторний запуск у тій самій хвилині додає до вже записаного інтервалу
+        for row in TrafficRollup.objects.select_for_update().filter(resolution='1m', bucket=bucket):
+            if row.device_id not in deltas:
+                continue
+            location_id, sent, received = deltas[row.device_id]
+            deltas[row.device_id] = (location_id, sent + row.bytes_sent, received + row.bytes_received)
+        TrafficRollup.objects.bulk_create([
+            TrafficRollup(
+                resolution='1m', bucket=bucket, device_id=device_id, location_id=location_id,
+                bytes_sent=sent, bytes_received=received,
+            )
+            for device_id, (location_id, sent, received) in deltas.items()
+        ], batch_size=BATCH_SIZE, **UPSERT)
+        TrafficCounter.objects.bulk_create(
+            counters, batch_size=BATCH_SIZE, update_conflicts=True,
+            unique_fields=['device'], update_fields=['bytes_sent', 'bytes_received', 'sampled_at'],
+        )
+    return len(deltas)
+
+
+def rollup(now=None):
+    """Перераховує грубіші інтервали, починаючи з останнього вже агрегованого"""
+    now = now or timezone.now()
+    written = 0
+    for target, source in ROLLUP_CHAIN:
+        # Останній інтервал цілі міг бути неповним - перераховуємо і його
+        last = TrafficRollup.objects.filter(resolution=target).aggregate(last=Max('bucket'))['last']
+        pending = TrafficRollup.objects.filter(resolution=source, bucket__lte=now)
+        if last is not None:
+            pending = pending.filter(bucket__gte=last)
+        buckets = sorted({bucket_start(b, target) for b in pending.order_by().values_list('bucket', flat=True).distinct()})
+
+        for start in buckets:
+            end = start + timedelta(seconds=RESOLUTIONS[target])
+            rows = (
+                TrafficRollup.objects.filter(resolution=source, bucket__gte=start, bucket__lt=end)
+                .order_by().values('device_id')
+                .annotate(last_location=Max('location_id'), sent=Sum('bytes_sent'), received=Sum('bytes_received'))
+            )
+            objs = [
+                TrafficRollup(
+                    resolution=target, bucket=start, device_id=row['device_id'], location_id=row['last_location'],
+                    bytes_sent=row['sent'], bytes_received=row['received'],
+                )
+                for row in rows
+            ]
+            TrafficRollup.objects.bulk_create(objs, batch_size=BATCH_SIZE, **UPSERT)
+            written += len(objs)
+    return written
+
+
+def delete_batched(queryset, batch_size):
+    """Видаляє рядки queryset порціями, щоб не тримати довгих блокувань; повертає кількість"""
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by().values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += queryset.model.objects.filter(pk__in=ids).delete()[0]
+
+
+def prune(now=None):
+    """Видаляє інтервали старші за RETENTION"""
+    now = now or timezone.now()
+    deleted = 0
+    for resolution, keep in RETENTION.items():
+        deleted += delete_batched(TrafficRollup.objects.filter(resolution=resolution, bucket__lt=now - keep), PRUNE_BATCH)
+    if deleted:
+        logger.info(f"Видалено {deleted} застарілих агрегатів трафіку")
+    return deleted
+
+
+def history(period='1h', now=None, **filters):
+    """Точки графіка трафіку за період одним агрегуючим запитом; пропуски заповнюються нулями"""
+    span, resolution = HISTORY_PERIODS[period]
+    width = timedelta(seconds=RESOLUTIONS[resolution])
+    last = bucket_start(now or timezone.now(), resolution)
+    first = last - span + width
+
+    rows = (
+        TrafficRollup.objects.filter(resolution=resolution, bucket__gte=first, bucket__lte=last, **filters)
+        .order_by().values('bucket')
+        .annotate(sent=Sum('bytes_sent'), received=Sum('bytes_received'))
+    )
+    totals = {row['bucket']: (row['sent'], row['received']) for row in rows}
+
+    points = []
+    bucket = first
+    while bucket <= last:
+        sent, received = totals.get(bucket, (0, 0))
+        points.append({
+            'timestamp': bucket.isoformat(),
+            'bytes_sent': sent,
+            'bytes_received': received,
+        })
+        bucket += width
+    return resolution, points
@@ -35,11 +35,16 @@ urlpatterns = [
     
     # API endpoints
     path('api/networks/<int:pk>/info/', views.api_network_info, name='api_network_info'),
+    path('api/devices/export/', views.api_devices_export, name='api_devices_export'),
+    path('api/devices/provision/', views.api_devices_provision, name='api_devices_provision'),
     path('api/devices/<int:pk>/toggle/', views.api_toggle_device, name='api_toggle_device'),
     path('api/location-stats/<int:pk>/', views.api_location_stats, name='api_location_stats'),
+    path('api/location-stream/<int:pk>/', views.api_location_stream, name='api_location_stream'),
     path('api/location-history/<int:pk>/', views.api_location_history, name='api_location_history'),
     path('api/peer-history/<int:pk>/', views.api_peer_history, name='api_peer_history'),
     path('api/refresh-stats/<int:pk>/', views.api_refresh_location_stats, name='api_refresh_location_stats'),
+    path('api/apply-queue/', views.api_apply_queue_metrics, name='api_apply_queue_metrics'),
+    path('api/sync-scheduler/', views.api_sync_scheduler_metrics, name='api_sync_scheduler_metrics'),
 
     # Firewall
     path('firewall/', views.firewall, name='firewall'),
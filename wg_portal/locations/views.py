@@ -4,8 +4,10 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.paginator import Paginator
 from django.http import JsonResponse, HttpResponse
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.http import condition, require_http_methods
 from django.contrib.auth.decorators import user_passes_test
+from django.db import transaction
+from wireguard_manager.metrics import instrument_view
 from .models import Location, Network, AccessControlList, Device
 from .forms import LocationForm, NetworkForm, AccessControlListForm, DeviceForm, QuickNetworkForm
 import json
@@ -39,41 +41,65 @@ def default_location_detail(request):
     return redirect('locations:detail', pk=location.pk)
 
 
+def _location_aggregate(model, aggregate, **filters):
+    """Корельований підзапит агрегату по пов'язаних з локацією записах (0, якщо їх немає)"""
+    from django.db.models import OuterRef, Subquery, Value
+    from django.db.models.functions import Coalesce
+
+    rows = (
+        model.objects.filter(location=OuterRef('pk'), **filters)
+        .order_by().values('location').annotate(value=aggregate).values('value')
+    )
+    return Coalesce(Subquery(rows), Value(0))
+
+
+def annotate_location_stats(queryset):
+    """Додає до локацій лічильники мереж/пристроїв та трафік одним SQL запитом"""
+    from django.db.models import Count, Exists, OuterRef, Subquery, Sum
+
+    return queryset.annotate(
+        networks_count=_location_aggregate(Network, Count('pk')),
+        devices_count=_location_aggregate(Device, Count('pk')),
+        active_users_count=_location_aggregate(Device, Count('pk'), status='active'),
+        traffic_in=_location_aggregate(Device, Sum('bytes_received')),
+        traffic_out=_location_aggregate(Device, Sum('bytes_sent')),
+        has_active_network=Exists(Network.objects.filter(location=OuterRef('pk'), is_active=True)),
+        network_subnet=Subquery(
+            Network.objects.filter(location=OuterRef('pk')).order_by('name').values('subnet')[:1]
+        ),
+    )
+
+
 @login_required
+@instrument_view('locations_list')
 def locations_list(request):
     """Список всіх локацій"""
-    locations = Location.objects.all().order_by('name')
-    
-    # Додаємо статистику для кожної локації
-    for location in locations:
-        location.networks_count = location.networks.count()
-        location.devices_count = location.devices.count()
-        location.active_users_count = location.devices.filter(status='active').count()
-        location.total_devices_count = location.devices.count()
-        location.connected_users_count = location.devices.filter(status='active').count()
-        location.is_active = location.networks.filter(is_active=True).exists()
-        location.traffic_in = sum(d.bytes_received or 0 for d in location.devices.all())
-        location.traffic_out = sum(d.bytes_sent or 0 for d in location.devices.all())
-        
-        # Отримуємо перші налаштування мережі
-        first_network = location.networks.first()
-        if first_network:
-            location.network_subnet = first_network.subnet
-            location.endpoint = first_network.endpoint
-        else:
-            location.network_subnet = None
-            location.endpoint = None
+    from django.db.models import Count, Q
+
+    locations = annotate_location_stats(Location.objects.all().order_by('name'))
     
+    # Агрегати рахуються лише для локацій поточної сторінки
     paginator = Paginator(locations, 12)  # 12 карток на сторінку
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
+    for location in page_obj:
+        location.total_devices_count = location.devices_count
+        location.connected_users_count = location.active_users_count
+        location.is_active = location.has_active_network
+        location.endpoint = f"{location.server_ip}:{location.server_port}"
+    
+    device_totals = Device.objects.aggregate(
+        total=Count('pk'),
+        online=Count('pk', filter=Q(status='active')),
+    )
+    
     context = {
         'locations': page_obj,
-        'total_locations': locations.count(),
+        'total_locations': paginator.count,
         'total_networks': Network.objects.count(),
-        'total_devices': Device.objects.count(),
-        'online_devices': Device.objects.filter(status='active').count(),
+        'total_devices': device_totals['total'],
+        'online_devices': device_totals['online'],
     }
     
     return render(request, 'locations/list.html', context)
@@ -102,15 +128,8 @@ def location_create(request):
         try:
             # Генеруємо ключі якщо не вказані
             if not public_key or not private_key:
-                import subprocess
-                # Генеруємо приватний ключ
-                private_key_result = subprocess.run(['wg', 'genkey'], capture_output=True, text=True)
-                if private_key_result.returncode == 0:
-                    private_key = private_key_result.stdout.strip()
-                    # Генеруємо публічний ключ
-                    public_key_result = subprocess.run(['wg', 'pubkey'], input=private_key, capture_output=True, text=True)
-                    if public_key_result.returncode == 0:
-                        public_key = public_key_result.stdout.strip()
+                from .wgkeys import generate_keypair
+                private_key, public_key = generate_keypair()
             
             # Створюємо локацію
             location = Location.objects.create(
@@ -165,8 +184,7 @@ def location_detail(request, pk):
     
     # Статистика
     total_devices = location.devices.count()
-    devices = location.devices.all()
-    online_devices = sum(1 for device in devices if device.is_online)
+    online_devices = location.devices.online().count()
     
     # Статистика за останню годину
     from django.utils import timezone
@@ -182,8 +200,10 @@ def location_detail(request, pk):
     ).values('user').distinct().count()
     
     # Загальна статистика трафіку
-    total_bytes_received = sum(device.bytes_received for device in devices)
-    total_bytes_sent = sum(device.bytes_sent for device in devices)
+    from django.db.models import Sum
+    traffic = location.devices.aggregate(received=Sum('bytes_received'), sent=Sum('bytes_sent'))
+    total_bytes_received = traffic['received'] or 0
+    total_bytes_sent = traffic['sent'] or 0
     
     # Всі локації для навігації
     all_locations = Location.objects.all().order_by('name')
@@ -213,44 +233,37 @@ def location_edit(request, pk):
         # Перевіряємо чи це запит на регенерацію ключів
         if request.POST.get('regenerate_keys'):
             try:
-                import subprocess
-                # Генеруємо новий приватний ключ
-                private_key_result = subprocess.run(['wg', 'genkey'], capture_output=True, text=True)
-                if private_key_result.returncode == 0:
-                    private_key = private_key_result.stdout.strip()
-                    # Генеруємо новий публічний ключ
-                    public_key_result = subprocess.run(['wg', 'pubkey'], input=private_key, capture_output=True, text=True)
-                    if public_key_result.returncode == 0:
-                        public_key = public_key_result.stdout.strip()
-                        
-                        # Оновлюємо ключі в локації
-                        location.private_key = private_key
-                        location.public_key = public_key
-                        location.save()
-                        
-                        # Оновлюємо також в мережах цієї локації
-                        for network in location.networks.all():
-                            network.server_public_key = public_key
-                            network.save()
-                        
-                        # Оновлюємо WireGuard конфігурацію з новими ключами
-                        try:
-                            from .docker_manager import WireGuardDockerManager
-                            manager = WireGuardDockerManager()
-                            manager.generate_server_config(location)
-                            manager.restart_wireguard(location.interface_name)
-                        except Exception as wg_error:
-                            import logging
-                            logger = logging.getLogger(__name__)
-                            logger.error(f"Помилка оновлення WireGuard після регенерації ключів: {str(wg_error)}")
-                        
-                        return JsonResponse({
-                            'success': True,
-                            'public_key': public_key,
-                            'private_key': private_key,
-                            'message': 'Ключі регенеровано та WireGuard конфігурація оновлена!'
-                        })
-                return JsonResponse({'success': False, 'error': 'Помилка генерації ключів'})
+                from .wgkeys import generate_keypair
+                # Генеруємо нову пару ключів
+                private_key, public_key = generate_keypair()
+
+                # Оновлюємо ключі в локації
+                location.private_key = private_key
+                location.public_key = public_key
+                location.save()
+                
+                # Оновлюємо також в мережах цієї локації
+                for network in location.networks.all():
+                    network.server_public_key = public_key
+                    network.save()
+                
+                # Оновлюємо WireGuard конфігурацію з новими ключами
+                try:
+                    from .docker_manager import WireGuardDockerManager
+                    manager = WireGuardDockerManager()
+                    manager.generate_server_config(location)
+                    manager.restart_wireguard(location.interface_name)
+                except Exception as wg_error:
+                    import logging
+                    logger = logging.getLogger(__name__)
+                    logger.error(f"Помилка оновлення WireGuard після регенерації ключів: {str(wg_error)}")
+                
+                return JsonResponse({
+                    'success': True,
+                    'public_key': public_key,
+                    'private_key': private_key,
+                    'message': 'Ключі регенеровано та WireGuard конфігурація оновлена!'
+                })
             except Exception as e:
                 return JsonResponse({'success': False, 'error': str(e)})
         
@@ -430,10 +443,7 @@ def quick_setup(request):
 @login_required
 def device_create(request):
     """Створення нового пристрою"""
-    import qrcode
-    from io import BytesIO
-    import base64
-    import ipaddress
+    from .artifacts import qr_base64
     
     if request.method == 'POST':
         try:
@@ -461,26 +471,9 @@ def device_create(request):
             if Device.objects.filter(user=user, name=device_name).exists():
                 return JsonResponse({'success': False, 'error': 'У вас вже є пристрій з такою назвою. Виберіть іншу назву.'})
             
-            # Завжди генеруємо нову пару ключів
-            import subprocess
-            import tempfile
-            import os
-            
-            with tempfile.TemporaryDirectory() as temp_dir:
-                private_key_path = os.path.join(temp_dir, 'private.key')
-                public_key_path = os.path.join(temp_dir, 'public.key')
-                
-                # Генеруємо приватний ключ
-                subprocess.run(['wg', 'genkey'], stdout=open(private_key_path, 'w'), check=True)
-                
-                # Генеруємо публічний ключ
-                with open(private_key_path, 'r') as f:
-                    subprocess.run(['wg', 'pubkey'], stdin=f, stdout=open(public_key_path, 'w'), check=True)
-                
-                with open(private_key_path, 'r') as f:
-                    private_key = f.read().strip()
-                with open(public_key_path, 'r') as f:
-                    public_key = f.read().strip()
+            # Завжди генеруємо нову пару ключів (X25519 у процесі, без fork'ів wg)
+            from .wgkeys import generate_keypair
+            private_key, public_key = generate_keypair()
             
             # Отримуємо дефолтну мережу вибраної локації
             network = location.networks.first()
@@ -501,66 +494,56 @@ def device_create(request):
                     is_active=True
                 )
             
-            # Генеруємо IP адресу для пристрою
-            network_ip = ipaddress.IPv4Network(network.subnet)
-            existing_ips = set(Device.objects.filter(network=network).values_list('ip_address', flat=True))
-            
-            # Знаходимо вільну IP адресу
-            device_ip = None
-            for ip in network_ip.hosts():
-                if str(ip) not in existing_ips and str(ip) != network.server_ip:
-                    device_ip = str(ip)
-                    break
-            
-            if not device_ip:
-                return JsonResponse({'success': False, 'error': 'Немає доступних IP адрес у мережі'})
-            
-
+            # Видаємо IP адресу з IPAM пулу локації: рядок пулу заблокований до коміту,
+            # тож паралельні запити не отримають ту саму адресу. Пристрій і peer
+            # створюються в тій самій транзакції - якщо щось впаде, відкат поверне
+            # адресу в пул
+            from wireguard_management.models import WireGuardPeer, WireGuardServer, WireGuardNetwork
+            with transaction.atomic():
+                device_ip = location.allocate_ip(network.subnet)
+                
+                if not device_ip:
+                    return JsonResponse({'success': False, 'error': 'Немає доступних IP адрес у мережі'})
 
-            # Створюємо пристрій
-            device = Device.objects.create(
-                name=device_name,
-                user=user,
-                location=location,
-                network=network,
-                ip_address=device_ip,
-                public_key=public_key,
-                private_key=private_key,
-                status='active'
-            )
+                # Створюємо пристрій
+                device = Device.objects.create(
+                    name=device_name,
+                    user=user,
+                    location=location,
+                    network=network,
+                    ip_address=device_ip,
+                    public_key=public_key,
+                    private_key=private_key,
+                    status='active'
+                )
 
-            # Створюємо peer тільки після успішного створення пристрою
-            # Створюємо WireGuardPeer для пристрою, якщо такого ще немає
-            from wireguard_management.models import WireGuardPeer, WireGuardServer, WireGuardNetwork
-            if device and device.status == 'active':
-                wg_network = None
-                if device.network and device.network.subnet:
-                    wg_network = WireGuardNetwork.objects.filter(network_cidr=device.network.subnet).first()
-                if wg_network:
-                    server = WireGuardServer.objects.filter(network=wg_network).first()
-                    if server:
-                        exists = WireGuardPeer.objects.filter(user=device.user, ip_address=device.ip_address).exists()
-                        if not exists:
-                            WireGuardPeer.objects.create(
-                                user=device.user,
-                                server=server,
-                                name=device.name,
-                                ip_address=device.ip_address,
-                                public_key=device.public_key,
-                                private_key=device.private_key,
-                                allowed_ips='0.0.0.0/0',
-                                is_active=True
-                            )
-
-            # Live-додавання peer до wg (без перезапуску)
-            try:
-                from .docker_manager import WireGuardDockerManager
-                manager = WireGuardDockerManager()
-                manager.add_peer_live(device)
-            except Exception as e:
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.error(f"Live add peer error: {str(e)}")
+                # Створюємо WireGuardPeer для пристрою, якщо такого ще немає
+                if device.status == 'active':
+                    wg_network = None
+                    if device.network and device.network.subnet:
+                        wg_network = WireGuardNetwork.objects.filter(network_cidr=device.network.subnet).first()
+                    if wg_network:
+                        server = WireGuardServer.objects.filter(network=wg_network).first()
+                        if server:
+                            peer = WireGuardPeer.objects.filter(
+                                user=device.user, ip_address=device.ip_address
+                            ).order_by('-created_at').first()
+                            if peer is None:
+                                peer = WireGuardPeer.objects.create(
+                                    user=device.user,
+                                    server=server,
+                                    name=device.name,
+                                    ip_address=device.ip_address,
+                                    public_key=device.public_key,
+                                    private_key=device.private_key,
+                                    allowed_ips='0.0.0.0/0',
+                                    is_active=True
+                                )
+                            # update() замість save(): зв'язок не має повторно ставити застосування в чергу
+                            Device.objects.filter(pk=device.pk).update(wg_peer=peer)
+                            device.wg_peer = peer
+
+            # Peer застосовує черга (Device.save -> schedule_apply) після коміту транзакції
             
             # Генеруємо конфігурацію WireGuard
             config = f"""[Interface]
@@ -575,15 +558,8 @@ AllowedIPs = {network.allowed_ips or '0.0.0.0/0'}
 PersistentKeepalive = 25
 """
             
-            # Генеруємо QR код
-            qr = qrcode.QRCode(version=1, box_size=10, border=5)
-            qr.add_data(config)
-            qr.make(fit=True)
-            
-            img = qr.make_image(fill_color="black", back_color="white")
-            buffer = BytesIO()
-            img.save(buffer, format='PNG')
-            qr_image = base64.b64encode(buffer.getvalue()).decode()
+            # Генеруємо QR код (він же прогріває кеш артефактів для подальших переглядів)
+            qr_image = qr_base64(config)
             
             return JsonResponse({
                 'success': True,
@@ -637,9 +613,8 @@ AllowedIPs = {device.network.allowed_ips or '0.0.0.0/0'}
 PersistentKeepalive = 25
 """
     
-    response = HttpResponse(config, content_type='text/plain')
-    response['Content-Disposition'] = f'attachment; filename="{device.name}.conf"'
-    return response
+    from .artifacts import config_response
+    return config_response(request, config, f"{device.name}.conf")
 
 
 @login_required
@@ -670,13 +645,11 @@ def device_config(request, pk):
         messages.error(request, 'У вас немає прав для завантаження конфігурації')
         return redirect('locations:my_devices')
     
+    from .artifacts import config_response
     config = device.get_config()
     filename = f"{device.name.replace(' ', '_')}.conf"
     
-    response = HttpResponse(config, content_type='text/plain')
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    return response
+    return config_response(request, config, filename)
 
 
 @login_required
@@ -771,15 +744,77 @@ def api_toggle_device(request, pk):
     })
 
 
+def _location_stats_etag(request, pk):
+    from .live_stats import location_etag, safe_read
+    return safe_read(location_etag, pk)
+
+
+def _live_device_info(device, taken_at):
+    """Пристрій зі snapshot'а у форматі api_location_stats"""
+    import datetime
+    from django.template.defaultfilters import filesizeformat
+    from .live_stats import format_duration
+    
+    def isoformat(timestamp):
+        return datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc).isoformat() if timestamp else None
+    
+    # Станом на snapshot (ETag не залежить від часу); живий таймер клієнт рахує від connected_at
+    connection_time = None
+    if device['is_online'] and device['connected_at']:
+        connection_time = format_duration(taken_at - device['connected_at'])
+    return {
+        'id': device['id'],
+        'is_online': device['is_online'],
+        'connected_at': isoformat(device['connected_at']),
+        'connection_time': connection_time,
+        'bytes_received': device['bytes_received'],
+        'bytes_sent': device['bytes_sent'],
+        'bytes_received_human': filesizeformat(device['bytes_received']),
+        'bytes_sent_human': filesizeformat(device['bytes_sent']),
+        'user': {key: device['user'][key] for key in ('id', 'username', 'full_name')},
+        'name': device['name'],
+        'public_key': device['public_key'],
+        'device_name': device['name'],
+    }
+
+
+def _location_stats_from_snapshot(taken_at, devices):
+    """Відповідь api_location_stats зі живого snapshot'а Redis (без запитів у БД)"""
+    hour_ago = taken_at - 3600
+    recent = [device for device in devices if device['last_handshake'] and device['last_handshake'] >= hour_ago]
+    return {
+        'online_devices': sum(1 for device in devices if device['is_online']),
+        'devices_last_hour': len(recent),
+        'users_last_hour': len({device['user']['id'] for device in recent}),
+        'devices': [
+            _live_device_info(device, taken_at)
+            for device in sorted(devices, key=lambda item: item['id'], reverse=True)
+        ],
+    }
+
+
 @login_required
+@instrument_view('api_location_stats')
 @require_http_methods(["GET"])
+@condition(etag_func=_location_stats_etag)
 def api_location_stats(request, pk):
     """API для отримання статистики локації"""
-    location = get_object_or_404(Location, pk=pk)
+    from .live_stats import read_location, safe_read
     
+    # Дашборди опитують API постійно - відповідаємо зі snapshot'а інжестора, поки він живий
+    snapshot = safe_read(read_location, pk)
+    if snapshot is not None:
+        return JsonResponse(_location_stats_from_snapshot(*snapshot))
+    
+    location = get_object_or_404(Location, pk=pk)
+    return JsonResponse(_location_stats_from_db(location))
+
+
+def _location_stats_from_db(location):
+    """Відповідь api_location_stats із запитів у БД (коли живого snapshot'а немає)"""
     # Статистика
-    devices = location.devices.all()
-    online_devices = sum(1 for device in devices if device.is_online)
+    devices = location.devices.select_related('user')
+    online_devices = location.devices.online().count()
     
     # Статистика за останню годину
     from django.utils import timezone
@@ -833,17 +868,89 @@ def api_location_stats(request, pk):
             'device_name': device.name,
         })
     
-    data = {
+    return {
         'online_devices': online_devices,
         'devices_last_hour': devices_last_hour,
         'users_last_hour': users_last_hour,
         'devices': devices_info,
     }
+
+
+def _location_event_stream(location):
+    """Генератор SSE: початковий snapshot, далі події змін з pub/sub каналу інжестора"""
+    import time
+    from django.db import connection
+    from .live_stats import (
+        STREAM_KEEPALIVE, STREAM_SECONDS, get_redis, live_key, read_location, safe_read,
+    )
     
-    return JsonResponse(data)
+    def event(name, data):
+        return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+    
+    # Підписуємось до читання snapshot'а, щоб не пропустити зміни між ними
+    pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(live_key(location.pk, 'events'))
+    try:
+        snapshot = safe_read(read_location, location.pk)
+        initial = _location_stats_from_snapshot(*snapshot) if snapshot else _location_stats_from_db(location)
+        # Потік живе хвилинами - не тримаємо з'єднання з БД
+        connection.close()
+        yield f"retry: 2000\n{event('snapshot', initial)}"
+        
+        deadline = time.monotonic() + STREAM_SECONDS
+        while time.monotonic() < deadline:
+            message = pubsub.get_message(timeout=STREAM_KEEPALIVE)
+            if message is None:
+                yield ": keepalive\n\n"
+                continue
+            delta = json.loads(message['data'])
+            delta['connected'] = [_live_device_info(device, delta['taken_at']) for device in delta['connected']]
+            yield event('delta', delta)
+    finally:
+        pubsub.close()
+
+
+@login_required
+@require_http_methods(["GET"])
+def api_location_stream(request, pk):
+    """SSE потік змін статистики локації: підключення, відключення, трафік"""
+    from django.http import StreamingHttpResponse
+    from wireguard_manager import metrics
+    from .live_stats import StreamSlot, acquire_stream, get_redis, safe_read
+    
+    location = get_object_or_404(Location, pk=pk)
+    # Без Redis подій немає - клієнт повертається до опитування api_location_stats
+    if safe_read(lambda: get_redis().ping()) is None:
+        return JsonResponse({'error': 'Потік статистики недоступний'}, status=503)
+    # Кожен потік тримає потік gthread - понад ліміт клієнт теж переходить на опитування
+    if not acquire_stream():
+        metrics.inc('wg_live_streams_total', event='rejected')
+        response = JsonResponse({'error': 'Забагато відкритих потоків статистики'}, status=503)
+        response['Retry-After'] = '60'
+        return response
+    metrics.inc('wg_live_streams_total', event='opened')
+    
+    response = StreamingHttpResponse(StreamSlot(_location_event_stream(location)), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx не повинен буферизувати потік
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _traffic_history_response(request, **filters):
+    """Історія трафіку з агрегатів TrafficRollup за періодом ?period= (типово 1h)"""
+    from .traffic_series import HISTORY_PERIODS, history
+    
+    period = request.GET.get('period', '1h')
+    if period not in HISTORY_PERIODS:
+        return JsonResponse({'error': f"Невідомий період, допустимі: {', '.join(HISTORY_PERIODS)}"}, status=400)
+    
+    resolution, data = history(period, **filters)
+    return JsonResponse({'history': data, 'period': period, 'resolution': resolution})
 
 
 @login_required
+@instrument_view('api_location_history')
 @require_http_methods(["GET"])
 def api_location_history(request, pk):
     """API для отримання історії трафіку по локації"""
@@ -851,33 +958,11 @@ def api_location_history(request, pk):
     
     # Дозволяємо всім авторизованим користувачам
     # В майбутньому можна додати перевірку прав
-    
-    # Повертаємо тестові дані для демонстрації
-    # В реальному проекті тут буде запит до моніторингу
-    from django.utils import timezone
-    from datetime import timedelta
-    import random
-    
-    # Генеруємо тестові дані за останню годину
-    now = timezone.now()
-    data = []
-    
-    for i in range(60):  # 60 точок за годину (кожна хвилина)
-        timestamp = now - timedelta(minutes=60-i)
-        # Симулюємо трафік
-        bytes_sent = random.randint(100000, 1000000)  # 100KB - 1MB
-        bytes_received = random.randint(50000, 500000)  # 50KB - 500KB
-        
-        data.append({
-            'timestamp': timestamp.isoformat(),
-            'bytes_sent': bytes_sent,
-            'bytes_received': bytes_received
-        })
-    
-    return JsonResponse({'history': data})
+    return _traffic_history_response(request, location=location)
 
 
 @login_required  
+@instrument_view('api_peer_history')
 @require_http_methods(["GET"])
 def api_peer_history(request, pk):
     """API для отримання історії трафіку пристрою"""
@@ -887,28 +972,7 @@ def api_peer_history(request, pk):
     if not request.user.is_staff and device.user != request.user:
         return JsonResponse({'error': 'Немає прав доступу'}, status=403)
     
-    # Повертаємо тестові дані для демонстрації
-    from django.utils import timezone
-    from datetime import timedelta
-    import random
-    
-    # Генеруємо тестові дані за останню годину
-    now = timezone.now()
-    data = []
-    
-    for i in range(60):  # 60 точок за годину (кожна хвилина)
-        timestamp = now - timedelta(minutes=60-i)
-        # Симулюємо трафік для конкретного пристрою
-        bytes_sent = random.randint(10000, 100000)  # 10KB - 100KB
-        bytes_received = random.randint(5000, 50000)  # 5KB - 50KB
-        
-        data.append({
-            'timestamp': timestamp.isoformat(),
-            'bytes_sent': bytes_sent,
-            'bytes_received': bytes_received
-        })
-    
-    return JsonResponse({'history': data})
+    return _traffic_history_response(request, device=device)
 
 
 @login_required
@@ -941,6 +1005,77 @@ def api_refresh_location_stats(request, pk):
         }, status=500)
 
 
+@login_required
+@user_passes_test(is_staff)
+@require_http_methods(["GET"])
+def api_apply_queue_metrics(request):
+    """API лічильників черги застосування конфігурацій WireGuard"""
+    from .apply_queue import get_metrics
+    return JsonResponse(get_metrics())
+
+
+@login_required
+@user_passes_test(is_staff)
+@require_http_methods(["GET"])
+def api_sync_scheduler_metrics(request):
+    """API планувальника синхронізації: інтервали інтерфейсів, пропуски, гістограми lag/duration"""
+    from .sync_scheduler import get_metrics
+    return JsonResponse(get_metrics())
+
+
+@login_required
+@require_http_methods(["GET"])
+def api_devices_export(request):
+    """ZIP з конфігураціями пристроїв (?location=, ?user=, ?qr=1); не-персонал отримує лише власні"""
+    from .config_export import device_entries, zip_response
+
+    devices = Device.objects.all()
+    if not request.user.is_staff:
+        devices = devices.filter(user=request.user)
+    elif request.GET.getlist('user'):
+        devices = devices.filter(user_id__in=[value for value in request.GET.getlist('user') if value.isdigit()])
+    location_id = request.GET.get('location')
+    if location_id:
+        location = get_object_or_404(Location, pk=location_id)
+        devices = devices.filter(location=location)
+        filename = f"wireguard-{location.interface_name}.zip"
+    else:
+        filename = 'wireguard-configs.zip'
+
+    return zip_response(device_entries(devices, include_qr=request.GET.get('qr') in ('1', 'true')), filename)
+
+
+@login_required
+@user_passes_test(is_staff)
+@require_http_methods(["POST"])
+def api_devices_provision(request):
+    """API масового створення пристроїв з CSV або JSON (user, name, location)"""
+    from .provisioning import parse_rows, provision
+
+    upload = request.FILES.get('file')
+    if upload is not None:
+        content = upload.read()
+        fmt = 'json' if upload.name.lower().endswith('.json') else 'csv'
+    else:
+        content = request.body
+        fmt = 'json' if request.content_type == 'application/json' else 'csv'
+
+    try:
+        rows = parse_rows(content, fmt)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    if not rows:
+        return JsonResponse({'success': False, 'error': 'Немає рядків для створення'}, status=400)
+
+    try:
+        result = provision(rows, dry_run=request.GET.get('dry_run') in ('1', 'true'))
+    except Exception as e:
+        import logging
+        logging.getLogger(__name__).error(f"Помилка масового створення пристроїв: {str(e)}")
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+    return JsonResponse({'success': True, **result})
+
+
 # Firewall: список користувачів
 @login_required
 def firewall(request):
@@ -968,10 +1103,7 @@ def firewall_device(request, device_id):
     if request.method == 'POST' and (request.user.is_superuser or request.user == device.user):
         allowed_ips = request.POST.get('allowed_ips', '0.0.0.0/0')
         device.allowed_ips = allowed_ips
+        # Peer оновлює черга застосування (Device.save -> schedule_apply)
         device.save()
-        # live-оновлення peer
-        from .docker_manager import WireGuardDockerManager
-        manager = WireGuardDockerManager()
-        manager.add_peer_live(device)
         return redirect('locations:firewall_device', device_id=device.id)
     return render(request, 'firewall_device.html', {'device': device})
\ No newline at end of file
@@ -0,0 +1,203 @@
+"""
+Єдиний парсер виводу `wg show <interface> dump` та `wg show all dump`.
+
+Формати рядків (поля розділені табуляцією):
+    <interface> dump:  інтерфейс - 4 поля (private_key, public_key, listen_port, fwmark)
+                       peer      - 8 полів (public_key, preshared_key, endpoint, allowed_ips,
+                                            latest_handshake, rx_bytes, tx_bytes, persistent_keepalive)
+    all dump:          ті самі рядки з ім'ям інтерфейсу першим полем (5 та 9 полів)
+
+parse_columns() - швидкий шлях: весь вивід розбивається одним split без проходу
+по рядках, а колонки беруться зрізами з кроком, без об'єкта на кожен рядок.
+iter_peers() - потоковий шлях для невеликих dump'ів, повертає PeerRecord.
+"""
+from array import array
+
+NONE = '(none)'
+
+PEER_FIELDS = 8
+ALL_PEER_FIELDS = 9
+ALL_INTERFACE_FIELDS = 5
+
+
+class PeerRecord:
+    """Компактний запис одного peer'а"""
+    __slots__ = (
+        'interface', 'public_key', 'endpoint', 'allowed_ips',
+        'last_handshake', 'bytes_received', 'bytes_sent',
+    )
+
+    def __init__(self, interface, public_key, endpoint, allowed_ips, last_handshake, bytes_received, bytes_sent):
+        self.interface = interface
+        self.public_key = public_key
+        self.endpoint = endpoint
+        self.allowed_ips = allowed_ips
+        self.last_handshake = last_handshake
+        self.bytes_received = bytes_received
+        self.bytes_sent = bytes_sent
+
+    def __repr__(self):
+        return f"PeerRecord({self.interface}, {self.public_key[:8]}..., rx={self.bytes_received}, tx={self.bytes_sent})"
+
+
+class PeerColumns:
+    """Колонкове представлення peer'ів: списки рядків та array('q') для лічильників"""
+    __slots__ = (
+        'interfaces', 'public_keys', 'endpoints', 'allowed_ips',
+        'last_handshake', 'bytes_received', 'bytes_sent',
+    )
+
+    def __init__(self, interfaces=(), public_keys=(), endpoints=(), allowed_ips=(),
+                 last_handshake=(), bytes_received=(), bytes_sent=()):
+        self.interfaces = list(interfaces)
+        self.public_keys = list(public_keys)
+        self.endpoints = list(endpoints)
+        self.allowed_ips = list(allowed_ips)
+        self.last_handshake = array('q', last_handshake)
+        self.bytes_received = array('q', bytes_received)
+        self.bytes_sent = array('q', bytes_sent)
+
+    def __len__(self):
+        return len(self.public_keys)
+
+    def __iter__(self):
+        for i in range(len(self.public_keys)):
+            yield self.record(i)
+
+    def record(self, i):
+        endpoint = self.endpoints[i]
+        return PeerRecord(
+            self.interfaces[i], self.public_keys[i],
+            endpoint if endpoint != NONE else None,
+            self.allowed_ips[i], self.last_handshake[i] or None,
+            self.bytes_received[i], self.bytes_sent[i],
+        )
+
+    def rows(self):
+        """(interface, public_key, last_handshake, bytes_received, bytes_sent) без створення об'єктів"""
+        return zip(self.interfaces, self.public_keys, self.last_handshake, self.bytes_received, self.bytes_sent)
+
+    def select_interfaces(self, interfaces):
+        """Нові колонки тільки з peer'ами вказаних інтерфейсів"""
+        interfaces = set(interfaces)
+        keep = [i for i, name in enumerate(self.interfaces) if name in interfaces]
+        return PeerColumns(
+            [self.interfaces[i] for i in keep], [self.public_keys[i] for i in keep],
+            [self.endpoints[i] for i in keep], [self.allowed_ips[i] for i in keep],
+            [self.last_handshake[i] for i in keep], [self.bytes_received[i] for i in keep],
+            [self.bytes_sent[i] for i in keep],
+        )
+
+    def by_public_key(self):
+        """{public_key: PeerRecord}; для дублікатів перемагає останній рядок"""
+        return {record.public_key: record for record in self}
+
+
+def merge_columns(parts):
+    """Об'єднує PeerColumns кількох dump'ів (наприклад, окремих інтерфейсів) в одні"""
+    merged = PeerColumns()
+    for part in parts:
+        for field in PeerColumns.__slots__:
+            getattr(merged, field).extend(getattr(part, field))
+    return merged
+
+
+def _peer_fields(flat):
+    """
+    Плоский список полів `all dump` лише з peer'ами: рядки інтерфейсів (5 полів)
+    вирізаються на місці, тож кожна колонка - один зріз з кроком 9. Peer'и
+    інтерфейсу йдуть поспіль після його рядка, тож їх кількість шукається
+    бінарним пошуком за іменем у першому полі. None - якщо вивід не лягає на
+    цю структуру (сміття, обрізаний рядок).
+    """
+    headers = []
+    pos = 0
+    total = len(flat)
+    while pos < total:
+        # У рядку інтерфейсу четверте поле - listen_port; у peer'а там endpoint
+        if pos + ALL_INTERFACE_FIELDS > total or not flat[pos + 3].isdigit():
+            return None
+        name = flat[pos]
+        start = pos + ALL_INTERFACE_FIELDS
+        lo, hi = 0, (total - start) // ALL_PEER_FIELDS
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if flat[start + (mid - 1) * ALL_PEER_FIELDS] == name:
+                lo = mid
+            else:
+                hi = mid - 1
+        headers.append(pos)
+        pos = start + lo * ALL_PEER_FIELDS
+    if pos != total:
+        return None
+    for header in reversed(headers):
+        del flat[header:header + ALL_INTERFACE_FIELDS]
+    return flat
+
+
+def _filtered_fields(lines, width):
+    """Повільний шлях для нетипового виводу: лише рядки з правильною кількістю полів"""
+    peer_lines = [line for line in lines if line.count('\t') == width - 1]
+    return '\t'.join(peer_lines).split('\t') if peer_lines else []
+
+
+def _columns(flat, width, interface):
+    offset = 1 if width == ALL_PEER_FIELDS else 0
+    columns = PeerColumns()
+    # Лічильники першими: зсунуті колонки (пропущений нетиповий рядок) не парсяться в int.
+    # array зі списку помітно швидший, ніж з ітератора map
+    columns.last_handshake = array('q', list(map(int, flat[offset + 4::width])))
+    columns.bytes_received = array('q', list(map(int, flat[offset + 5::width])))
+    columns.bytes_sent = array('q', list(map(int, flat[offset + 6::width])))
+    columns.interfaces = flat[0::width] if offset else [interface] * (len(flat) // width)
+    columns.public_keys = flat[offset::width]
+    columns.endpoints = flat[offset + 2::width]
+    columns.allowed_ips = flat[offset + 3::width]
+    return columns
+
+
+def parse_columns(output, interface=None):
+    """Швидкий парсер dump'у у PeerColumns (формат визначається автоматично)"""
+    output = output.rstrip('\n')
+    first_end = output.find('\n')
+    first_line = output if first_end == -1 else output[:first_end]
+    if not first_line:
+        return PeerColumns()
+
+    # Один split на весь вивід: поле k кожного peer'а - кожен width-й елемент
+    fields = first_line.count('\t') + 1
+    if fields == ALL_INTERFACE_FIELDS:
+        width, lines = ALL_PEER_FIELDS, output
+        flat = _peer_fields(output.replace('\n', '\t').split('\t'))
+    elif fields == ALL_PEER_FIELDS:
+        # Лише рядки peer'ів без рядків інтерфейсів (stream агента статистики)
+        width, lines = ALL_PEER_FIELDS, output
+        flat = output.replace('\n', '\t').split('\t')
+    else:
+        width, lines = PEER_FIELDS, output[first_end + 1:] if first_end != -1 else ''
+        flat = lines.replace('\n', '\t').split('\t') if lines else []
+    if flat is not None and len(flat) % width == 0:
+        try:
+            return _columns(flat, width, interface)
+        except ValueError:
+            pass
+    return _columns(_filtered_fields(lines.split('\n'), width), width, interface)
+
+
+def iter_peers(output, interface=None):
+    """Потоковий парсер dump'у: PeerRecord на кожен рядок peer'а"""
+    for line in output.splitlines():
+        parts = line.split('\t')
+        if len(parts) == ALL_PEER_FIELDS:
+            name, parts = parts[0], parts[1:]
+        elif len(parts) == PEER_FIELDS:
+            name = interface
+        else:
+            # Рядок інтерфейсу або сміття
+            continue
+        yield PeerRecord(
+            name, parts[0],
+            parts[2] if parts[2] != NONE else None,
+            parts[3], int(parts[4]) or None,
+            int(parts[5]), int(parts[6]),
+        )
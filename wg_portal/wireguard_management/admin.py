@@ -5,7 +5,7 @@ from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 from django.urls import path, reverse
 from django.utils.safestring import mark_safe
-from .models import PeerMonitoring, WireGuardNetwork, WireGuardServer, WireGuardPeer
+from .models import PeerMonitoring, PeerMonitoringRollup, WireGuardNetwork, WireGuardServer, WireGuardPeer
 import subprocess
 import json
 
@@ -16,6 +16,13 @@ class PeerMonitoringAdmin(admin.ModelAdmin):
     search_fields = ('peer__name', 'peer__ip_address')
 
 
+@admin.register(PeerMonitoringRollup)
+class PeerMonitoringRollupAdmin(admin.ModelAdmin):
+    list_display = ('peer', 'resolution', 'bucket', 'bytes_sent', 'bytes_received', 'samples')
+    list_filter = ('resolution',)
+    search_fields = ('peer__name', 'peer__ip_address')
+
+
 @admin.register(WireGuardNetwork)
 class WireGuardNetworkAdmin(admin.ModelAdmin):
     """Адмін панель для WireGuard мереж"""
@@ -305,7 +312,7 @@ class WireGuardPeerAdmin(admin.ModelAdmin):
     reset_traffic.short_description = 'Скинути статистику'
     
     def download_config(self, request, queryset):
-        """Завантажити конфігурацію"""
-        # Ця функція буде реалізована пізніше
-        pass
+        """Завантажити конфігурації вибраних peer'ів одним ZIP архівом (потоково)"""
+        from locations.config_export import peer_entries, zip_response
+        return zip_response(peer_entries(queryset), 'wireguard-configs.zip')
     download_config.short_description = 'Завантажити конфігурацію'
@@ -0,0 +1,406 @@
+"""
+Компілятор фаєрволу: усі увімкнені FirewallRule, активні ACLRule та
+AccessControlList збираються в один ruleset для `iptables-restore --noflush`.
+
+Ланцюг FORWARD замінюється однією транзакцією (-F та нові правила в одному
+COMMIT), тому немає вікна з порожнім FORWARD. Перед застосуванням ruleset
+порівнюється з `iptables-save`, і незмінений набір не перезавантажується.
+
+Членство DeviceGroup компілюється в ipset wgp-g<id> (hash:ip): правило
+посилається на set, тож перевірка пакета не залежить від розміру групи, а зміна
+членства оновлює лише вміст set'у. Якщо ipset у контейнері недоступний,
+групи розгортаються в правило на кожну адресу.
+"""
+import ipaddress
+import logging
+import subprocess
+
+from wireguard_manager.metrics import set_gauge, timer, tracked
+
+logger = logging.getLogger(__name__)
+
+CONTAINER = 'wireguard_vpn'
+CHAIN = 'FORWARD'
+POLICY = 'DROP'
+SET_PREFIX = 'wgp-g'
+GROUP_SYNC_PENDING_KEY = 'wg:ipset:pending'
+
+# AccessControlList не має пріоритету - ставимо його на рівень за замовчуванням
+DEFAULT_ACL_PRIORITY = 100
+
+TARGETS = {
+    'allow': 'ACCEPT',
+    'deny': 'DROP',
+}
+
+
+def normalize_address(value):
+    """IP/підмережа у формі iptables-save (10.0.0.2 -> 10.0.0.2/32); '', any -> None"""
+    value = (value or '').strip()
+    if not value or value.lower() == 'any':
+        return None
+    return str(ipaddress.ip_network(value, strict=False))
+
+
+def normalize_ports(value):
+    """'80-90' -> '80:90', '80, 443' -> '80,443'; '', any -> None"""
+    value = (value or '').strip().replace(' ', '')
+    if not value or value.lower() == 'any':
+        return None
+    ports = value.replace('-', ':')
+    for part in ports.replace(':', ',').split(','):
+        if not part.isdigit() or not 0 < int(part) < 65536:
+            raise ValueError(f"Некоректний порт: {value}")
+    return ports
+
+
+def set_name(group_id):
+    """Ім'я ipset для DeviceGroup"""
+    return f'{SET_PREFIX}{group_id}'
+
+
+def compile_rule(target, source=None, destination=None, protocol='any',
+                 source_port=None, destination_port=None, interface=None, extra='', sets=()):
+    """Одне правило FORWARD у канонічному порядку iptables-save; sets - [(ім'я, 'src'|'dst')]"""
+    parts = ['-A', CHAIN]
+    if source:
+        parts += ['-s', source]
+    if destination:
+        parts += ['-d', destination]
+    if interface:
+        parts += ['-i', interface]
+    if protocol and protocol != 'any':
+        parts += ['-p', protocol]
+    for name, direction in sets:
+        parts += ['-m', 'set', '--match-set', name, direction]
+    if protocol and protocol != 'any':
+        if protocol in ('tcp', 'udp') and (source_port or destination_port):
+            simple = [
+                (flag, ports) for flag, ports in (('--sport', source_port), ('--dport', destination_port))
+                if ports and ',' not in ports
+            ]
+            multi = [
+                (flag, ports) for flag, ports in (('--sports', source_port), ('--dports', destination_port))
+                if ports and ',' in ports
+            ]
+            if simple:
+                parts += ['-m', protocol]
+                for flag, ports in simple:
+                    parts += [flag, ports]
+            if multi:
+                parts += ['-m', 'multiport']
+                for flag, ports in multi:
+                    parts += [flag, ports]
+    parts += ['-j', target]
+    if extra:
+        parts.append(extra)
+    return ' '.join(parts)
+
+
+class FirewallCompiler:
+    """Збирає правила з БД у впорядкований список рядків iptables-restore"""
+
+    def __init__(self, use_sets=True):
+        self.use_sets = use_sets
+        # Групи, на які посилаються скомпільовані правила (для синхронізації ipset)
+        self.group_ids = set()
+        self._group_ips = None
+
+    def group_sources(self, group_id, direction):
+        """Варіанти (адреса, sets) для групи: один set або адреса на кожен пристрій"""
+        self.group_ids.add(group_id)
+        if self.use_sets:
+            return [(None, [(set_name(group_id), direction)])]
+        if self._group_ips is None:
+            self._group_ips = group_members()
+        return [(normalize_address(ip), []) for ip in self._group_ips.get(group_id, [])]
+
+    def acl_side(self, groups, direction):
+        """Варіанти джерела/призначення AccessControlList за його групами"""
+        groups = list(groups)
+        if not groups:
+            return [(None, [])]
+        return [option for group in groups for option in self.group_sources(group.pk, direction)]
+
+    def firewall_rules(self):
+        from .models import FirewallRule
+
+        for rule in FirewallRule.objects.filter(is_enabled=True).order_by('priority', 'name', 'pk'):
+            try:
+                ports = dict(
+                    source=normalize_address(rule.source_ip),
+                    destination=normalize_address(rule.destination_ip),
+                    protocol=rule.protocol,
+                    source_port=normalize_ports(rule.source_port),
+                    destination_port=normalize_ports(rule.destination_port),
+                )
+            except ValueError as e:
+                # Некоректне правило не повинно зламати весь ruleset
+                logger.warning(f"Пропущено правило фаєрволу {rule.name}: {str(e)}")
+                continue
+            lines = []
+            if rule.action == 'log':
+                # Логуємо та пропускаємо (як і раніше 'log' означав ACCEPT)
+                lines.append(compile_rule('LOG', extra=f'--log-prefix "wgp-fw-{rule.pk} "', **ports))
+            lines.append(compile_rule(TARGETS.get(rule.action, 'ACCEPT'), **ports))
+            yield rule.priority, lines
+
+    def acl_rules(self):
+        from locations.models import ACLRule
+
+        rules = (
+            ACLRule.objects.filter(is_active=True, location__is_active=True)
+            .select_related('location').order_by('priority', 'name', 'pk')
+        )
+        for rule in rules:
+            try:
+                options = dict(
+                    destination=normalize_address(rule.destination_ip),
+                    protocol=rule.protocol,
+                    destination_port=normalize_ports(rule.destination_port),
+                    interface=rule.location.interface_name,
+                )
+                if rule.source_group_id:
+                    sources = self.group_sources(rule.source_group_id, 'src')
+                else:
+                    sources = [(normalize_address(rule.source_ip), [])]
+            except ValueError as e:
+                logger.warning(f"Пропущено ACL правило {rule.name}: {str(e)}")
+                continue
+            target = TARGETS.get(rule.action, 'DROP')
+            yield rule.priority, [
+                compile_rule(target, source=source, sets=sets, **options) for source, sets in sources
+            ]
+
+    def access_lists(self):
+        from locations.models import AccessControlList
+
+        acls = (
+            AccessControlList.objects.filter(
+                is_active=True, network__is_active=True, network__location__is_active=True
+            )
+            .select_related('network__location').prefetch_related('source_groups', 'destination_groups')
+            .order_by('name', 'pk')
+        )
+        for acl in acls:
+            protocol = 'any' if acl.protocol == 'all' else acl.protocol
+            try:
+                ports = normalize_ports(acl.port_ranges) if protocol in ('tcp', 'udp') else None
+            except ValueError as e:
+                logger.warning(f"Пропущено ACL {acl.name}: {str(e)}")
+                continue
+            # Без груп - будь-яке джерело/призначення; порожня група не збігається ні з чим
+            sources = self.acl_side(acl.source_groups.all(), 'src')
+            destinations = self.acl_side(acl.destination_groups.all(), 'dst')
+            target = TARGETS.get(acl.action, 'DROP')
+            yield DEFAULT_ACL_PRIORITY, [
+                compile_rule(
+                    target, source=source, destination=destination, protocol=protocol,
+                    destination_port=ports, interface=acl.network.location.interface_name,
+                    sets=source_sets + destination_sets,
+                )
+                for source, source_sets in sources
+                for destination, destination_sets in destinations
+            ]
+
+    def rules(self):
+        """Усі правила FORWARD за пріоритетом (при рівності: ACLRule, AccessControlList, FirewallRule)"""
+        compiled = []
+        for order, generator in enumerate((self.acl_rules, self.access_lists, self.firewall_rules)):
+            for priority, lines in generator():
+                compiled.append((priority, order, len(compiled), lines))
+        compiled.sort(key=lambda item: item[:3])
+        return [line for *_key, lines in compiled for line in lines]
+
+    def compile(self, rules=None):
+        """Повний вхід для `iptables-restore --noflush`"""
+        rules = self.rules() if rules is None else rules
+        return '\n'.join(['*filter', f':{CHAIN} {POLICY} [0:0]', f'-F {CHAIN}', *rules, 'COMMIT', ''])
+
+
+def live_forward_state(container=CONTAINER):
+    """(policy, [правила -A FORWARD]) з `iptables-save -t filter` у контейнері"""
+    with timer('wg_subprocess_seconds', command='iptables_save'):
+        result = subprocess.run(
+            ['docker', 'exec', container, 'iptables-save', '-t', 'filter'],
+            capture_output=True, text=True, timeout=10
+        )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or 'iptables-save завершився з помилкою')
+
+    policy = None
+    rules = []
+    for line in result.stdout.splitlines():
+        if line.startswith(f':{CHAIN} '):
+            policy = line.split()[1]
+        elif line.startswith(f'-A {CHAIN} '):
+            rules.append(line.strip())
+    return policy, rules
+
+
+def group_members(group_ids=None):
+    """{group_id: [ip]} активних пристроїв груп"""
+    from locations.models import Device
+
+    devices = Device.objects.filter(group__isnull=False, status='active')
+    if group_ids is not None:
+        devices = devices.filter(group_id__in=group_ids)
+    members = {}
+    for group_id, ip_address in devices.order_by('ip_address').values_list('group_id', 'ip_address'):
+        members.setdefault(group_id, []).append(ip_address)
+    return members
+
+
+def live_group_sets(container=CONTAINER):
+    """{ім'я: set(ip)} наших ipset'ів з `ipset save`; RuntimeError, якщо ipset недоступний"""
+    with timer('wg_subprocess_seconds', command='ipset_save'):
+        result = subprocess.run(
+            ['docker', 'exec', container, 'ipset', 'save'],
+            capture_output=True, text=True, timeout=10
+        )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or 'ipset недоступний')
+
+    sets = {}
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        if len(parts) < 2 or not parts[1].startswith(SET_PREFIX):
+            continue
+        if parts[0] == 'create':
+            sets.setdefault(parts[1], set())
+        elif parts[0] == 'add' and len(parts) >= 3:
+            sets.setdefault(parts[1], set()).add(parts[2])
+    return sets
+
+
+def sync_group_sets(group_ids, container=CONTAINER, live=None):
+    """
+    Приводить ipset'и груп до членства в БД одним `ipset restore`.
+
+    Для існуючих set'ів надсилаються лише add/del різниці - правила
+    iptables при цьому не перезавантажуються. Повертає імена змінених set'ів.
+    """
+    live = live_group_sets(container) if live is None else live
+    members = group_members(group_ids)
+
+    commands = []
+    changed = []
+    for group_id in sorted(group_ids):
+        name = set_name(group_id)
+        desired = set(members.get(group_id, []))
+        current = live.get(name)
+        if current is None:
+            commands.append(f'create {name} hash:ip family inet')
+            current = set()
+        if desired == current and name in live:
+            continue
+        commands += [f'del {name} {ip}' for ip in sorted(current - desired)]
+        commands += [f'add {name} {ip}' for ip in sorted(desired - current)]
+        changed.append(name)
+
+    if commands:
+        with timer('wg_subprocess_seconds', command='ipset_restore'):
+            result = subprocess.run(
+                ['docker', 'exec', '-i', container, 'ipset', '-exist', 'restore'],
+                input='\n'.join(commands) + '\n', capture_output=True, text=True, timeout=30
+            )
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip() or 'ipset restore завершився з помилкою')
+        logger.info(f"Оновлено ipset'и груп: {', '.join(changed)}")
+    return changed
+
+
+def destroy_stale_sets(referenced, live, container=CONTAINER):
+    """Видаляє наші ipset'и, на які вже не посилається жодне правило"""
+    for name in sorted(set(live) - referenced):
+        subprocess.run(
+            ['docker', 'exec', container, 'ipset', 'destroy', name],
+            capture_output=True, text=True, timeout=10
+        )
+
+
+@tracked('firewall_apply')
+def apply_ruleset(container=CONTAINER, force=False):
+    """Компілює та атомарно застосовує ruleset; пропускає, якщо він уже завантажений"""
+    try:
+        live_sets = live_group_sets(container)
+    except Exception as e:
+        logger.warning(f"ipset недоступний, групи розгортаються в окремі правила: {str(e)}")
+        live_sets = None
+
+    compiler = FirewallCompiler(use_sets=live_sets is not None)
+    rules = compiler.rules()
+
+    # Set'и мають існувати до того, як iptables-restore на них пошлеться
+    if live_sets is not None:
+        sync_group_sets(compiler.group_ids, container, live=live_sets)
+
+    changed = True
+    if not force:
+        try:
+            policy, live_rules = live_forward_state(container)
+            changed = not (policy == POLICY and live_rules == rules)
+        except Exception as e:
+            logger.warning(f"Не вдалося прочитати поточний ruleset: {str(e)}")
+
+    if changed:
+        with timer('wg_subprocess_seconds', command='iptables_restore'):
+            result = subprocess.run(
+                ['docker', 'exec', '-i', container, 'iptables-restore', '--noflush'],
+                input=compiler.compile(rules), capture_output=True, text=True, timeout=30
+            )
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip() or 'iptables-restore завершився з помилкою')
+        logger.info(f"Застосовано ruleset фаєрволу: {len(rules)} правил")
+    set_gauge('wg_firewall_rules', len(rules))
+
+    if live_sets is not None:
+        destroy_stale_sets({set_name(group_id) for group_id in compiler.group_ids}, live_sets, container)
+
+    return {'changed': changed, 'rules': len(rules)}
+
+
+def referenced_group_ids():
+    """Групи, на які посилаються активні ACLRule та AccessControlList"""
+    from locations.models import ACLRule, AccessControlList
+
+    group_ids = set(
+        ACLRule.objects.filter(is_active=True, source_group__isnull=False)
+        .values_list('source_group_id', flat=True)
+    )
+    for field in ('source_groups', 'destination_groups'):
+        group_ids.update(
+            AccessControlList.objects.filter(is_active=True, **{f'{field}__isnull': False})
+            .values_list(field, flat=True)
+        )
+    return group_ids
+
+
+def sync_group_membership(container=CONTAINER):
+    """Оновлює лише вміст ipset'ів; без ipset - повна перекомпіляція ruleset"""
+    try:
+        live_sets = live_group_sets(container)
+    except Exception:
+        return apply_ruleset(container)
+    return {'changed_sets': sync_group_sets(referenced_group_ids(), container, live=live_sets)}
+
+
+def schedule_group_sync():
+    """Ставить синхронізацію членства груп після коміту (зміни зливаються у вікні debounce)"""
+    from django.db import transaction
+
+    transaction.on_commit(_enqueue_group_sync)
+
+
+def _enqueue_group_sync():
+    from django.conf import settings
+    from django.core.cache import cache
+
+    if not cache.add(GROUP_SYNC_PENDING_KEY, 1, timeout=60):
+        return
+    try:
+        from .tasks import sync_group_sets_task
+        sync_group_sets_task.apply_async(countdown=getattr(settings, 'WG_APPLY_DEBOUNCE', 0.25))
+    except Exception as e:
+        cache.delete(GROUP_SYNC_PENDING_KEY)
+        logger.warning(f"Не вдалося поставити синхронізацію ipset у чергу: {str(e)}")
@@ -10,20 +10,37 @@ class Command(BaseCommand):
         from wireguard_management.models import WireGuardPeer
         import logging
         now = timezone.now()
-        count = 0
         skipped = 0
-        for device in Device.objects.filter(status='active'):
-            # Пошук відповідного peer (WireGuardPeer) для пристрою
-            peer = WireGuardPeer.objects.filter(user=device.user, ip_address=device.ip_address).first()
-            if peer:
-                PeerMonitoring.objects.create(
-                    peer=peer,
-                    bytes_sent=device.bytes_sent,
-                    bytes_received=device.bytes_received,
-                    timestamp=now
-                )
-                count += 1
-            else:
-                skipped += 1
-                logging.warning(f"[save_peer_stats] Не знайдено WireGuardPeer для Device id={device.id}, user={device.user}, ip={device.ip_address}")
-        self.stdout.write(self.style.SUCCESS(f'Збережено статистику для {count} пристроїв, пропущено {skipped}'))
+        peer_map = None
+        links = []
+        rows = []
+        devices = Device.objects.filter(status='active').values_list(
+            'pk', 'user_id', 'ip_address', 'wg_peer_id', 'bytes_sent', 'bytes_received'
+        )
+        for device_id, user_id, ip_address, peer_id, bytes_sent, bytes_received in devices:
+            if peer_id is None:
+                # Пристрої без зв'язку: одна мапа (user_id, ip) -> peer на весь прохід
+                if peer_map is None:
+                    # Найновіший peer перезаписує старіші, як .first() при ordering -created_at
+                    peer_map = {
+                        (peer_user_id, peer_ip): pk
+                        for pk, peer_user_id, peer_ip in WireGuardPeer.objects.order_by('created_at')
+                        .values_list('pk', 'user_id', 'ip_address')
+                    }
+                peer_id = peer_map.get((user_id, ip_address))
+                if peer_id is None:
+                    skipped += 1
+                    logging.warning(f"[save_peer_stats] Не знайдено WireGuardPeer для Device id={device_id}, user_id={user_id}, ip={ip_address}")
+                    continue
+                links.append(Device(pk=device_id, wg_peer_id=peer_id))
+            rows.append(PeerMonitoring(
+                peer_id=peer_id,
+                bytes_sent=bytes_sent,
+                bytes_received=bytes_received,
+                timestamp=now
+            ))
+        # Знайдені пари зберігаємо як FK, наступні проходи йдуть без мапи
+        if links:
+            Device.objects.bulk_update(links, ['wg_peer'], batch_size=1000)
+        PeerMonitoring.objects.bulk_create(rows, batch_size=1000)
+        self.stdout.write(self.style.SUCCESS(f'Збережено статистику для {len(rows)} пристроїв, пропущено {skipped}'))
@@ -1,9 +1,8 @@
 from django.core.management.base import BaseCommand
 from wireguard_management.models import WireGuardPeer
+from locations.wg_dump import iter_peers
 from django.utils import timezone
 import subprocess
-import json
-import re
 
 class Command(BaseCommand):
     help = 'Оновлює статус та статистику peer\'ів з WireGuard'
@@ -20,33 +19,21 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.ERROR('Не вдалося отримати статистику WireGuard'))
                 return
             
-            # Парсимо вивід
-            lines = result.stdout.strip().split('\n')
+            # Парсимо вивід спільним парсером dump'у
+            now_ts = timezone.now().timestamp()
             peer_stats = {}
             
-            for line in lines:
-                if not line:
-                    continue
-                    
-                parts = line.split('\t')
-                if len(parts) >= 6:
-                    interface = parts[0]
-                    public_key = parts[1]
-                    endpoint = parts[2] if parts[2] != '(none)' else None
-                    allowed_ips = parts[3]
-                    latest_handshake = int(parts[4]) if parts[4] != '0' else None
-                    rx_bytes = int(parts[5]) if parts[5] else 0
-                    tx_bytes = int(parts[6]) if len(parts) > 6 and parts[6] else 0
-                    
-                    peer_stats[public_key] = {
-                        'interface': interface,
-                        'endpoint': endpoint,
-                        'latest_handshake': latest_handshake,
-                        'rx_bytes': rx_bytes,
-                        'tx_bytes': tx_bytes,
-                        'is_online': latest_handshake is not None and 
-                                   (timezone.now().timestamp() - latest_handshake) < 180
-                    }
+            for record in iter_peers(result.stdout):
+                latest_handshake = record.last_handshake
+                peer_stats[record.public_key] = {
+                    'interface': record.interface,
+                    'endpoint': record.endpoint,
+                    'latest_handshake': latest_handshake,
+                    'rx_bytes': record.bytes_received,
+                    'tx_bytes': record.bytes_sent,
+                    'is_online': latest_handshake is not None and 
+                               (now_ts - latest_handshake) < 180
+                }
             
             # Оновлюємо peer'ів в базі даних
             updated_count = 0
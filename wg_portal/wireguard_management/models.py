@@ -3,7 +3,6 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django.core.validators import RegexValidator
 from django.utils import timezone
-import ipaddress
 
 class PeerMonitoring(models.Model):
     """Історія трафіку peer'а (пристрою) для моніторингу активності"""
@@ -16,10 +15,43 @@ class PeerMonitoring(models.Model):
         verbose_name = 'Моніторинг peer''а'
         verbose_name_plural = 'Моніторинг peer''ів'
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['peer', 'timestamp'], name='peer_monitoring_peer_ts_idx'),
+            models.Index(fields=['timestamp'], name='peer_monitoring_ts_idx'),
+        ]
 
     def __str__(self):
         return f"{self.peer} - {self.timestamp}"
 
+
+class PeerMonitoringRollup(models.Model):
+    """Стиснена історія PeerMonitoring: лічильники peer'а на кінець години/дня"""
+    RESOLUTION_CHOICES = [
+        ('hour', 'Година'),
+        ('day', 'День'),
+    ]
+
+    peer = models.ForeignKey('WireGuardPeer', on_delete=models.CASCADE, related_name='monitoring_rollups')
+    resolution = models.CharField(max_length=4, choices=RESOLUTION_CHOICES, verbose_name='Роздільність')
+    bucket = models.DateTimeField(verbose_name='Початок інтервалу')
+    bytes_sent = models.BigIntegerField(default=0)
+    bytes_received = models.BigIntegerField(default=0)
+    samples = models.PositiveIntegerField(default=0, verbose_name='Кількість зразків')
+
+    class Meta:
+        verbose_name = 'Агрегат моніторингу peer\'а'
+        verbose_name_plural = 'Агрегати моніторингу peer\'ів'
+        ordering = ['-bucket']
+        constraints = [
+            models.UniqueConstraint(fields=['peer', 'resolution', 'bucket'], name='unique_peer_monitoring_rollup')
+        ]
+        indexes = [
+            models.Index(fields=['resolution', 'bucket'], name='peer_rollup_bucket_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.peer} - {self.resolution} {self.bucket}"
+
 User = get_user_model()
 
 
@@ -45,30 +77,11 @@ class WireGuardNetwork(models.Model):
     def __str__(self):
         return f"{self.name} ({self.network_cidr})"
     
-    def get_next_available_ip(self):
-        """Отримує наступний доступний IP в мережі"""
+    def allocate_ip(self):
+        """Резервує вільну адресу в IPAM пулі мережі або None; викликати в транзакції разом зі створенням peer'а"""
         try:
-            network = ipaddress.IPv4Network(self.network_cidr)
-            used_ips = set()
-            
-            # Додаємо IP серверів
-            for server in self.servers.all():
-                if server.server_ip:
-                    used_ips.add(ipaddress.IPv4Address(server.server_ip))
-            
-            # Додаємо IP peer'ів
-            for server in self.servers.all():
-                for peer in server.peers.all():
-                    if peer.ip_address:
-                        used_ips.add(ipaddress.IPv4Address(peer.ip_address))
-            
-            # Знаходимо перший доступний IP
-            for ip in network.hosts():
-                if ip not in used_ips:
-                    return str(ip)
-            
-            return None
-            
+            from locations.ipam import network_allocator
+            return network_allocator(self).allocate()
         except Exception:
             return None
 
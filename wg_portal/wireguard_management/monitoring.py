@@ -0,0 +1,140 @@
+"""
+Компактизація PeerMonitoring.
+
+Сирі зразки (лічильники peer'а кожні 5 хвилин) згортаються в погодинні, а
+погодинні - в денні агрегати PeerMonitoringRollup. Агрегат зберігає значення
+лічильників на кінець інтервалу, тож графіки з грубших рівнів мають ту саму
+семантику. Після згортання дані старші за горизонт кожного рівня видаляються
+порціями, тому розмір таблиць обмежений незалежно від часу роботи.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Max, Sum
+from django.db.models.functions import TruncMinute
+from django.utils import timezone
+
+from locations.traffic_series import bucket_start, delete_batched
+
+from .models import PeerMonitoring, PeerMonitoringRollup
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 2000
+# Роздільність агрегату -> ключ locations.traffic_series.RESOLUTIONS
+BUCKETS = {'hour': '1h', 'day': '1d'}
+
+
+def retention():
+    """Горизонти зберігання: сирі зразки, погодинні та денні агрегати"""
+    return {
+        'raw': timedelta(days=settings.PEER_MONITORING_RAW_DAYS),
+        'hour': timedelta(days=settings.PEER_MONITORING_HOURLY_DAYS),
+        'day': timedelta(days=settings.PEER_MONITORING_DAILY_DAYS),
+    }
+
+
+def _watermark(resolution):
+    """Початок останнього агрегованого інтервалу (його перераховуємо - він міг бути неповним)"""
+    return PeerMonitoringRollup.objects.filter(resolution=resolution).aggregate(last=Max('bucket'))['last']
+
+
+def _fold(rows, resolution):
+    """Останні значення лічильників peer'а в кожному інтервалі; rows впорядковані за (peer, час)"""
+    folded = {}
+    for peer_id, moment, sent, received, samples in rows:
+        key = (peer_id, bucket_start(moment, BUCKETS[resolution]))
+        previous = folded.get(key)
+        folded[key] = (sent, received, samples + (previous[2] if previous else 0))
+    return folded
+
+
+def _upsert(resolution, folded):
+    PeerMonitoringRollup.objects.bulk_create(
+        [
+            PeerMonitoringRollup(
+                peer_id=peer_id, resolution=resolution, bucket=bucket,
+                bytes_sent=sent, bytes_received=received, samples=samples,
+            )
+            for (peer_id, bucket), (sent, received, samples) in folded.items()
+        ],
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['peer', 'resolution', 'bucket'],
+        update_fields=['bytes_sent', 'bytes_received', 'samples'],
+    )
+    return len(folded)
+
+
+def compact(now=None):
+    """Згортає сирі зразки в години, години в дні та видаляє дані за горизонтами"""
+    now = now or timezone.now()
+    horizons = retention()
+    result = {}
+
+    raw = PeerMonitoring.objects.filter(timestamp__lte=now)
+    since = _watermark('hour')
+    if since is not None:
+        raw = raw.filter(timestamp__gte=since)
+    rows = (
+        (peer_id, moment, sent, received, 1)
+        for peer_id, moment, sent, received in raw.order_by('peer_id', 'timestamp')
+        .values_list('peer_id', 'timestamp', 'bytes_sent', 'bytes_received').iterator(chunk_size=BATCH_SIZE)
+    )
+    result['hour'] = _upsert('hour', _fold(rows, 'hour'))
+
+    hourly = PeerMonitoringRollup.objects.filter(resolution='hour', bucket__lte=now)
+    since = _watermark('day')
+    if since is not None:
+        hourly = hourly.filter(bucket__gte=since)
+    rows = (
+        hourly.order_by('peer_id', 'bucket')
+        .values_list('peer_id', 'bucket', 'bytes_sent', 'bytes_received', 'samples').iterator(chunk_size=BATCH_SIZE)
+    )
+    result['day'] = _upsert('day', _fold(rows, 'day'))
+
+    # Видаляємо лише те, що вже згорнуто на наступний рівень
+    raw_cutoff = min(now - horizons['raw'], _watermark('hour') or now)
+    hour_cutoff = min(now - horizons['hour'], _watermark('day') or now)
+    result['deleted'] = (
+        delete_batched(PeerMonitoring.objects.filter(timestamp__lt=raw_cutoff), BATCH_SIZE)
+        + delete_batched(PeerMonitoringRollup.objects.filter(resolution='hour', bucket__lt=hour_cutoff), BATCH_SIZE)
+        + delete_batched(PeerMonitoringRollup.objects.filter(resolution='day', bucket__lt=now - horizons['day']), BATCH_SIZE)
+    )
+    logger.info(f"PeerMonitoring компактизовано: {result}")
+    return result
+
+
+def traffic_history(peers, start=None, end=None, now=None):
+    """
+    Історія лічильників (сума по peer'ах) з найдетальнішого рівня, що покриває start.
+    Один агрегуючий запит до PeerMonitoring або PeerMonitoringRollup.
+    """
+    now = now or timezone.now()
+    horizons = retention()
+    if start is None or start >= now - horizons['raw']:
+        queryset, field, moment = PeerMonitoring.objects.all(), 'timestamp', TruncMinute('timestamp')
+    else:
+        resolution = 'hour' if start >= now - horizons['hour'] else 'day'
+        queryset, field, moment = PeerMonitoringRollup.objects.filter(resolution=resolution), 'bucket', F('bucket')
+
+    queryset = queryset.filter(peer__in=peers)
+    if start is not None:
+        queryset = queryset.filter(**{f'{field}__gte': start})
+    if end is not None:
+        queryset = queryset.filter(**{f'{field}__lte': end})
+
+    grouped = (
+        queryset.annotate(moment=moment).order_by().values('moment')
+        .annotate(sent=Sum('bytes_sent'), received=Sum('bytes_received'))
+        .order_by('moment')
+    )
+    return [
+        {
+            'timestamp': row['moment'].isoformat() if row['moment'] else None,
+            'bytes_sent': row['sent'] or 0,
+            'bytes_received': row['received'] or 0,
+        }
+        for row in grouped
+    ]
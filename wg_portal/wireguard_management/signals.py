@@ -1,9 +1,26 @@
+import logging
+
+from django.core.exceptions import ObjectDoesNotExist
 from django.db.models.signals import post_delete
 from django.dispatch import receiver
 from wireguard_management.models import WireGuardPeer
 from locations.models import Device
 
+logger = logging.getLogger(__name__)
+
 @receiver(post_delete, sender=WireGuardPeer)
 def delete_device_on_peer_delete(sender, instance, **kwargs):
     # Видаляємо Device з таким же user та ip_address
     Device.objects.filter(user=instance.user, ip_address=instance.ip_address).delete()
+
+
+@receiver(post_delete, sender=WireGuardPeer)
+def release_peer_ip(sender, instance, **kwargs):
+    """Повертає адресу peer'а в IPAM пул мережі (у т.ч. при каскадному видаленні)"""
+    from locations.ipam import network_allocator
+    try:
+        network_allocator(instance.server.network).release(instance.ip_address)
+    except ObjectDoesNotExist:
+        pass
+    except Exception as e:
+        logger.error(f"Помилка звільнення IP {instance.ip_address}: {str(e)}")
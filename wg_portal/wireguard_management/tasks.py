@@ -1,52 +1,49 @@
-import subprocess
 from celery import shared_task
-from .models import FirewallRule, WireGuardServer
-
-def build_iptables_command(rule):
-    """Повертає команду iptables для правила FirewallRule"""
-    base = ["docker", "exec", "wireguard_vpn", "iptables"]
-    if rule.action == 'allow':
-        target = 'ACCEPT'
-    elif rule.action == 'deny':
-        target = 'DROP'
-    else:
-        target = 'ACCEPT'
-    
-    cmd = base + ['-A', 'FORWARD']
-    if rule.source_ip:
-        cmd += ['-s', rule.source_ip]
-    if rule.destination_ip:
-        cmd += ['-d', rule.destination_ip]
-    if rule.protocol and rule.protocol != 'any':
-        cmd += ['-p', rule.protocol]
-    cmd += ['-j', target]
-    return cmd
+from .firewall import GROUP_SYNC_PENDING_KEY, apply_ruleset, sync_group_membership
 
 @shared_task
 def apply_firewall_rules(server_id=None):
     """
-    Застосовує всі правила FirewallRule для вказаного WireGuardServer (або для всіх)
+    Застосовує всі правила FirewallRule та ACLRule одним iptables-restore.
+
+    FORWARD спільний для всіх серверів, тому компілюється повний ruleset;
+    server_id лишився для сумісності викликів.
     """
-    print('START TASK')
-    # 1. Очистити старі правила для FORWARD
-    subprocess.run(["docker", "exec", "wireguard_vpn", "iptables", "-F", "FORWARD"])
-    # 2. Встановити політику за замовчуванням DROP
-    subprocess.run(["docker", "exec", "wireguard_vpn", "iptables", "-P", "FORWARD", "DROP"])
-    # 3. Додати правила з БД (allow/deny)
-    rules = FirewallRule.objects.filter(is_enabled=True)
-    if server_id:
-        rules = rules.filter(network__servers__id=server_id)
-    print(f'Rules: {rules.count()}')
     import logging
     logger = logging.getLogger("firewall")
-    for rule in rules.order_by('priority'):
-        cmd = build_iptables_command(rule)
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        msg = f"Applied firewall rule: {rule.name} (src={rule.source_ip}, action={rule.action})"
-        if result.returncode == 0:
-            logger.info(msg)
-            print(msg)
-        else:
-            logger.error(f"FAILED: {msg} | {result.stderr}")
-            print(f"FAILED: {msg} | {result.stderr}")
-    return f"Applied {rules.count()} firewall rules."
+    try:
+        result = apply_ruleset()
+    except Exception as e:
+        logger.error(f"FAILED: застосування фаєрволу (server_id={server_id}) | {str(e)}")
+        return f"Firewall apply failed: {e}"
+    if not result['changed']:
+        return f"Firewall unchanged ({result['rules']} rules)."
+    return f"Applied {result['rules']} firewall rules."
+
+
+@shared_task
+def sync_group_sets_task():
+    """Оновлює вміст ipset'ів груп пристроїв (без перезавантаження ланцюга FORWARD)"""
+    import logging
+    from django.core.cache import cache
+    logger = logging.getLogger("firewall")
+    # Знімаємо позначку до читання БД: нові зміни поставлять наступну синхронізацію
+    cache.delete(GROUP_SYNC_PENDING_KEY)
+    try:
+        return sync_group_membership()
+    except Exception as e:
+        logger.error(f"FAILED: синхронізація ipset груп | {str(e)}")
+        return None
+
+
+@shared_task
+def compact_peer_monitoring_task():
+    """Згортає PeerMonitoring у погодинні/денні агрегати та видаляє старі зразки"""
+    import logging
+    from .monitoring import compact
+    logger = logging.getLogger(__name__)
+    try:
+        return compact()
+    except Exception as e:
+        logger.error(f"Помилка компактизації PeerMonitoring: {str(e)}")
+        return None
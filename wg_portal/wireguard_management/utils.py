@@ -2,6 +2,7 @@ import subprocess
 import os
 import logging
 from django.conf import settings
+from locations.wg_dump import iter_peers
 from .models import WireGuardPeer, WireGuardServer
 
 logger = logging.getLogger(__name__)
@@ -109,45 +110,33 @@ def update_peer_traffic_stats():
     
     try:
         # Отримуємо статистику з wg show
-        result = subprocess.run(['wg', 'show', 'all', 'transfer'], capture_output=True, text=True)
+        result = subprocess.run(['wg', 'show', 'all', 'dump'], capture_output=True, text=True)
         
         if result.returncode != 0:
             logger.warning("Не вдалося отримати статистику трафіку WireGuard")
             return
         
-        # Парсимо вивід wg show
-        lines = result.stdout.strip().split('\n')
-        current_interface = None
-        
-        for line in lines:
-            line = line.strip()
-            
-            if line.startswith('interface:'):
-                current_interface = line.split(':')[1].strip()
-                continue
+        # Парсимо вивід спільним парсером dump'у
+        for record in iter_peers(result.stdout):
+            public_key = record.public_key
+            bytes_received = record.bytes_received
+            bytes_sent = record.bytes_sent
             
-            if line and current_interface:
-                parts = line.split()
-                if len(parts) >= 3:
-                    public_key = parts[0]
-                    bytes_received = int(parts[1]) if parts[1] != '(none)' else 0
-                    bytes_sent = int(parts[2]) if parts[2] != '(none)' else 0
-                    
-                    # Оновлюємо статистику peer'а
-                    try:
-                        peer = WireGuardPeer.objects.get(public_key=public_key)
-                        peer.bytes_received = bytes_received
-                        peer.bytes_sent = bytes_sent
-                        peer.save(update_fields=['bytes_received', 'bytes_sent'])
-                        
-                        # Оновлюємо статистику користувача
-                        user = peer.user
-                        user.total_download = bytes_received
-                        user.total_upload = bytes_sent
-                        user.save(update_fields=['total_download', 'total_upload'])
-                        
-                    except WireGuardPeer.DoesNotExist:
-                        logger.warning(f"Peer з public key {public_key} не знайдено в БД")
+            # Оновлюємо статистику peer'а
+            try:
+                peer = WireGuardPeer.objects.get(public_key=public_key)
+                peer.bytes_received = bytes_received
+                peer.bytes_sent = bytes_sent
+                peer.save(update_fields=['bytes_received', 'bytes_sent'])
+                
+                # Оновлюємо статистику користувача
+                user = peer.user
+                user.total_download = bytes_received
+                user.total_upload = bytes_sent
+                user.save(update_fields=['total_download', 'total_upload'])
+                
+            except WireGuardPeer.DoesNotExist:
+                logger.warning(f"Peer з public key {public_key} не знайдено в БД")
         
         logger.info("Статистику трафіку peer'ів оновлено")
         
@@ -3,15 +3,12 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.http import JsonResponse, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.db import transaction
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
-import subprocess
 import json
-import qrcode
-import io
-import base64
 from locations.models import Location
-from .models import PeerMonitoring, WireGuardNetwork, WireGuardServer, WireGuardPeer
+from .models import WireGuardNetwork, WireGuardServer, WireGuardPeer
 from .utils import generate_wireguard_config, update_server_config
 from accounts.models import CustomUser
 # API: історія трафіку по локації
@@ -22,31 +19,16 @@ def api_location_history(request, pk):
     # Дозволяємо тільки staff/admin
     if not request.user.is_staff:
         return JsonResponse({'error': 'Немає доступу'}, status=403)
-    # Всі monitoring для peer'ів цієї локації
-    from django.db.models import Sum
-    from django.utils.dateparse import parse_datetime
-    peers = location.devices.all()
-    monitoring = PeerMonitoring.objects.filter(peer__in=peers)
+    # Peer'и пристроїв локації через Device.wg_peer, вибираються підзапитом
+    from .monitoring import traffic_history
+    peers = location.devices.filter(wg_peer__isnull=False).values('wg_peer')
     from_ts = request.GET.get('from')
     to_ts = request.GET.get('to')
-    if from_ts:
-        monitoring = monitoring.filter(timestamp__gte=parse_datetime(from_ts))
-    if to_ts:
-        monitoring = monitoring.filter(timestamp__lte=parse_datetime(to_ts))
-    # Групуємо по часу (наприклад, по хвилинах)
-    from django.db.models.functions import TruncMinute
-    grouped = monitoring.annotate(minute=TruncMinute('timestamp')).values('minute').annotate(
-        bytes_sent=Sum('bytes_sent'),
-        bytes_received=Sum('bytes_received')
-    ).order_by('minute')
-    data = [
-        {
-            'timestamp': g['minute'].isoformat() if g['minute'] else None,
-            'bytes_sent': g['bytes_sent'] or 0,
-            'bytes_received': g['bytes_received'] or 0
-        }
-        for g in grouped
-    ]
+    data = traffic_history(
+        peers,
+        start=parse_datetime(from_ts) if from_ts else None,
+        end=parse_datetime(to_ts) if to_ts else None,
+    )
     return JsonResponse({'history': data})
 
 
@@ -57,21 +39,15 @@ def api_peer_history(request, pk):
     if not request.user.is_superuser and peer.user != request.user:
         return JsonResponse({'error': 'Немає доступу'}, status=403)
     # Можна додати фільтр по часу (наприклад, ?from=2025-08-07T00:00:00&to=2025-08-07T23:59:59)
-    qs = peer.monitoring.order_by('timestamp')
+    # Старі періоди читаються з погодинних/денних агрегатів
+    from .monitoring import traffic_history
     from_ts = request.GET.get('from')
     to_ts = request.GET.get('to')
-    if from_ts:
-        qs = qs.filter(timestamp__gte=parse_datetime(from_ts))
-    if to_ts:
-        qs = qs.filter(timestamp__lte=parse_datetime(to_ts))
-    data = [
-        {
-            'timestamp': m.timestamp.isoformat(),
-            'bytes_sent': m.bytes_sent,
-            'bytes_received': m.bytes_received
-        }
-        for m in qs
-    ]
+    data = traffic_history(
+        [peer.pk],
+        start=parse_datetime(from_ts) if from_ts else None,
+        end=parse_datetime(to_ts) if to_ts else None,
+    )
     return JsonResponse({'history': data})
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
@@ -82,11 +58,7 @@ from django.utils import timezone
 from .models import WireGuardNetwork, WireGuardServer, WireGuardPeer
 from .utils import generate_wireguard_config, update_server_config
 from accounts.models import CustomUser
-import subprocess
 import json
-import qrcode
-import io
-import base64
 
 
 @login_required
@@ -107,25 +79,27 @@ def create_config(request):
                 return redirect('wireguard_management:dashboard')
             
             # Генеруємо ключі
-            private_key = subprocess.check_output(['wg', 'genkey'], text=True).strip()
-            public_key = subprocess.check_output(['wg', 'pubkey'], input=private_key, text=True).strip()
-            
-            # Отримуємо доступний IP
-            peer_ip = server.network.get_next_available_ip()
-            if not peer_ip:
-                messages.error(request, "Немає доступних IP адрес в мережі")
-                return redirect('wireguard_management:dashboard')
+            from locations.wgkeys import generate_keypair
+            private_key, public_key = generate_keypair()
             
-            # Створюємо peer
-            peer = WireGuardPeer.objects.create(
-                user=request.user,
-                server=server,
-                name=peer_name,
-                public_key=public_key,
-                private_key=private_key,
-                ip_address=peer_ip,
-                is_active=True
-            )
+            # Видача адреси та peer в одній транзакції: помилка створення повертає
+            # адресу в пул
+            with transaction.atomic():
+                peer_ip = server.network.allocate_ip()
+                if not peer_ip:
+                    messages.error(request, "Немає доступних IP адрес в мережі")
+                    return redirect('wireguard_management:dashboard')
+                
+                # Створюємо peer
+                peer = WireGuardPeer.objects.create(
+                    user=request.user,
+                    server=server,
+                    name=peer_name,
+                    public_key=public_key,
+                    private_key=private_key,
+                    ip_address=peer_ip,
+                    is_active=True
+                )
             
             # Оновлюємо користувача
             request.user.is_wireguard_enabled = True
@@ -237,13 +211,10 @@ def download_config(request):
             messages.error(request, "Немає доступу до цієї конфігурації")
             return redirect('wireguard_management:dashboard')
         
-        # Генеруємо конфігурацію
+        # Генеруємо конфігурацію та повертаємо файл з ETag за вмістом
+        from locations.artifacts import config_response
         config_content = generate_wireguard_config(peer)
-        
-        # Повертаємо файл
-        response = HttpResponse(config_content, content_type='text/plain')
-        response['Content-Disposition'] = f'attachment; filename="{peer.name}.conf"'
-        return response
+        return config_response(request, config_content, f"{peer.name}.conf")
         
     except Exception as e:
         messages.error(request, f"Помилка завантаження конфігурації: {str(e)}")
@@ -323,23 +294,12 @@ def get_qr_code(request):
         if not request.user.is_superuser and peer.user != request.user:
             return JsonResponse({'error': 'Немає доступу'}, status=403)
         
-        # Генеруємо конфігурацію
+        # Генеруємо конфігурацію; QR береться з кешу артефактів за її хешем
+        from locations.artifacts import qr_data_uri
         config_content = generate_wireguard_config(peer)
         
-        # Створюємо QR код
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(config_content)
-        qr.make(fit=True)
-        
-        # Конвертуємо в base64
-        img = qr.make_image(fill_color="black", back_color="white")
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
-        buffer.seek(0)
-        qr_base64 = base64.b64encode(buffer.getvalue()).decode()
-        
         return JsonResponse({
-            'qr_code': f"data:image/png;base64,{qr_base64}",
+            'qr_code': qr_data_uri(config_content),
             'config_name': peer.name
         })
         
@@ -456,10 +416,9 @@ def device_config(request, pk):
     if not request.user.is_superuser and device.user != request.user:
         return JsonResponse({'error': 'Немає доступу'}, status=403)
     
+    from locations.artifacts import config_response
     config = generate_wireguard_config(device)
-    response = HttpResponse(config, content_type='text/plain')
-    response['Content-Disposition'] = f'attachment; filename="{device.name}.conf"'
-    return response
+    return config_response(request, config, f"{device.name}.conf")
 
 
 @login_required
@@ -470,17 +429,13 @@ def device_qr_code(request, pk):
         return JsonResponse({'error': 'Немає доступу'}, status=403)
     
     try:
+        # PNG (або ?format=svg) з кешу артефактів; повторний запит з If-None-Match - 304
+        from locations.artifacts import CONTENT_TYPES, qr_response
         config_content = generate_wireguard_config(device)
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(config_content)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
-        buffer.seek(0)
-        
-        return HttpResponse(buffer.getvalue(), content_type='image/png')
+        kind = request.GET.get('format', 'png')
+        if kind not in CONTENT_TYPES:
+            return JsonResponse({'error': 'Непідтримуваний формат'}, status=400)
+        return qr_response(request, config_content, kind)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
@@ -11,13 +11,10 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth.models import User
 from django.http import JsonResponse, HttpResponse
+from django.db import transaction
 from django.db.models import Q, Count
 from locations.models import Location, Device, DeviceGroup, ACLRule, UserLocationAccess
 from .forms import LocationForm, DeviceForm, DeviceGroupForm, ACLRuleForm, UserLocationAccessForm
-import subprocess
-import qrcode
-from io import BytesIO
-import base64
 
 
 @login_required
@@ -67,7 +64,7 @@ def location_detail(request, pk):
     stats = {
         'total_devices': devices.count(),
         'active_devices': devices.filter(status='active').count(),
-        'online_devices': sum(1 for device in devices if device.is_online),
+        'online_devices': location.devices.online().count(),
         'total_users': location.user_access.count(),
     }
     
@@ -212,13 +209,15 @@ def device_create(request):
             # Генеруємо ключі
             generate_device_keys(device)
             
-            # Призначаємо IP
-            device.ip_address = device.location.next_available_ip
-            if not device.ip_address:
-                messages.error(request, 'Немає доступних IP адрес в цій локації!')
-                return render(request, 'wireguard_management/devices/create.html', {'form': form})
-            
-            device.save()
+            # Призначаємо IP: видача та збереження в одній транзакції,
+            # тож помилка збереження повертає адресу в пул
+            with transaction.atomic():
+                device.ip_address = device.location.allocate_ip()
+                if not device.ip_address:
+                    messages.error(request, 'Немає доступних IP адрес в цій локації!')
+                    return render(request, 'wireguard_management/devices/create.html', {'form': form})
+                
+                device.save()
             messages.success(request, f'Пристрій "{device.name}" створено!')
             return redirect('wireguard_management:device_detail', pk=device.pk)
     else:
@@ -266,15 +265,9 @@ def device_config(request, pk):
     # Генеруємо конфігурацію
     config = generate_device_config(device)
     
-    # Генеруємо QR код
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(config)
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="black", back_color="white")
-    buffer = BytesIO()
-    img.save(buffer, format='PNG')
-    qr_code = base64.b64encode(buffer.getvalue()).decode()
+    # QR код з кешу артефактів за хешем конфігурації
+    from locations.artifacts import qr_base64
+    qr_code = qr_base64(config)
     
     context = {
         'device': device,
@@ -361,51 +354,15 @@ def device_groups(request):
 # Допоміжні функції
 def generate_server_keys(location):
     """Генерація ключів для сервера"""
-    try:
-        # Генеруємо приватний ключ
-        private_key = subprocess.check_output(['wg', 'genkey'], text=True).strip()
-        
-        # Генеруємо публічний ключ
-        public_key = subprocess.check_output(
-            ['wg', 'pubkey'], 
-            input=private_key, 
-            text=True
-        ).strip()
-        
-        location.private_key = private_key
-        location.public_key = public_key
-        location.save()
-        
-    except subprocess.CalledProcessError:
-        pass  # Ігноруємо помилки генерації
+    from locations.wgkeys import generate_keypair
+    location.private_key, location.public_key = generate_keypair()
+    location.save()
 
 
 def generate_device_keys(device):
     """Генерація ключів для пристрою"""
-    try:
-        # Генеруємо приватний ключ
-        private_key = subprocess.check_output(['wg', 'genkey'], text=True).strip()
-        
-        # Генеруємо публічний ключ
-        public_key = subprocess.check_output(
-            ['wg', 'pubkey'], 
-            input=private_key, 
-            text=True
-        ).strip()
-        
-        device.private_key = private_key
-        device.public_key = public_key
-        
-    except subprocess.CalledProcessError:
-        # Якщо wg недоступний, генеруємо фейкові ключі
-        import secrets
-        import base64
-        
-        private_bytes = secrets.token_bytes(32)
-        device.private_key = base64.b64encode(private_bytes).decode()
-        
-        public_bytes = secrets.token_bytes(32)
-        device.public_key = base64.b64encode(public_bytes).decode()
+    from locations.wgkeys import generate_keypair
+    device.private_key, device.public_key = generate_keypair()
 
 
 def generate_device_config(device):
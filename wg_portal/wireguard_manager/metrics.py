@@ -0,0 +1,229 @@
+"""
+Метрики гарячих шляхів у форматі Prometheus.
+
+Лічильники, gauge'і та гістограми пишуться в один Redis hash (HINCRBYFLOAT
+одним pipeline'ом на спостереження), тож значення спільні для всіх gunicorn
+worker'ів та Celery процесів без multiprocess колектора. Черга застосування
+та планувальник синхронізації пишуть сюди ж; їх JSON API читають snapshot().
+Недоступний Redis ніколи не ламає інструментований код - метрики просто
+губляться.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+METRICS_KEY = 'wg:metrics'
+# Верхні межі кошиків гістограм тривалості, секунди
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Ім'я -> (тип, опис)
+METRICS = {
+    'wg_operation_seconds': ('histogram', 'Тривалість гарячих операцій'),
+    'wg_operation_total': ('counter', 'Кількість гарячих операцій за результатом'),
+    'wg_operation_queries_total': ('counter', 'Запити до БД, виконані гарячими операціями'),
+    'wg_subprocess_seconds': ('histogram', 'Тривалість викликів wg/iptables/ipset у VPN контейнері'),
+    'wg_rows_touched_total': ('counter', 'Рядки, оновлені гарячими операціями'),
+    'wg_config_bytes_written_total': ('counter', 'Байти конфігурацій серверів, записані на диск'),
+    'wg_restart_signals_total': ('counter', 'Сигнали застосування конфігурації для watcher\'а'),
+    'wg_firewall_rules': ('gauge', 'Кількість правил в останньому ruleset фаєрволу'),
+    'wg_http_request_seconds': ('histogram', 'Тривалість API дашбордів'),
+    'wg_http_request_queries_total': ('counter', 'Запити до БД, виконані API дашбордів'),
+    'wg_apply_queue_total': ('counter', 'Події черги застосування конфігурацій'),
+    'wg_sync_scheduler_total': ('counter', 'Проходи планувальника синхронізації'),
+    'wg_sync_lag_seconds': ('histogram', 'Затримка синхронізації інтерфейсу відносно розкладу'),
+    'wg_sync_duration_seconds': ('histogram', 'Тривалість проходу синхронізації'),
+    'wg_live_streams_total': ('counter', 'SSE потоки статистики: відкриті та відхилені через ліміт'),
+}
+
+
+def get_redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection('default')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = {key: str(value).replace('\\', '\\\\').replace('"', '\\"') for key, value in labels.items()}
+    return '{' + ','.join(f'{key}="{value}"' for key, value in sorted(escaped.items())) + '}'
+
+
+def _sort_key(field):
+    """Порядок рядків: набір міток, потім кошики за зростанням le, sum, count"""
+    sample, _sep, labels = field.partition('{')
+    parts = [part for part in labels.rstrip('}').split(',') if part]
+    le = next((part[4:-1] for part in parts if part.startswith('le="')), None)
+    rest = ','.join(part for part in parts if not part.startswith('le="'))
+    order = next((i for i, suffix in enumerate(('_bucket', '_sum', '_count')) if sample.endswith(suffix)), 0)
+    return rest, order, float(le) if le else 0.0
+
+
+def _write(commands):
+    """Виконує (метод, поле, значення) одним pipeline'ом; помилки лише логуються"""
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for method, field, value in commands:
+            getattr(pipe, method)(METRICS_KEY, field, value)
+        pipe.execute()
+    except Exception as e:
+        logger.debug(f"Метрики недоступні: {str(e)}")
+
+
+def inc(name, value=1, **labels):
+    """Збільшує лічильник"""
+    _write([('hincrbyfloat', f'{name}{_labels(labels)}', value)])
+
+
+def set_gauge(name, value, **labels):
+    _write([('hset', f'{name}{_labels(labels)}', value)])
+
+
+def _observation(name, value, labels):
+    """Команди одного спостереження гістограми (кумулятивні кошики, sum, count)"""
+    commands = [
+        ('hincrbyfloat', f'{name}_bucket{_labels({**labels, "le": le})}', 1)
+        for le in BUCKETS if value <= le
+    ]
+    commands += [
+        ('hincrbyfloat', f'{name}_bucket{_labels({**labels, "le": "+Inf"})}', 1),
+        ('hincrbyfloat', f'{name}_sum{_labels(labels)}', value),
+        ('hincrbyfloat', f'{name}_count{_labels(labels)}', 1),
+    ]
+    return commands
+
+
+def observe(name, value, **labels):
+    """Додає спостереження до гістограми"""
+    _write(_observation(name, value, labels))
+
+
+@contextmanager
+def timer(name, **labels):
+    """Вимірює тривалість блоку в гістограму name"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+@contextmanager
+def track(operation, prefix='wg_operation', **labels):
+    """
+    Тривалість, результат (ok/error) та кількість запитів до БД блоку -
+    усе одним записом у Redis після завершення.
+    """
+    from django.db import connection
+
+    queries = [0]
+
+    def count_queries(execute, sql, params, many, context):
+        queries[0] += 1
+        return execute(sql, params, many, context)
+
+    labels = {'operation': operation, **labels}
+    started = time.perf_counter()
+    status = 'ok'
+    try:
+        with connection.execute_wrapper(count_queries):
+            yield
+    except BaseException:
+        status = 'error'
+        raise
+    finally:
+        commands = _observation(f'{prefix}_seconds', time.perf_counter() - started, labels)
+        commands.append(('hincrbyfloat', f'{prefix}_queries_total{_labels(labels)}', queries[0]))
+        if prefix == 'wg_operation':
+            commands.append(('hincrbyfloat', f'wg_operation_total{_labels({**labels, "status": status})}', 1))
+        _write(commands)
+
+
+def tracked(operation):
+    """Декоратор track() для функцій"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with track(operation):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_view(view_name):
+    """Декоратор view: тривалість та кількість запитів до БД API дашборда"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            with track(view_name, prefix='wg_http_request'):
+                return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def snapshot():
+    """Усі збережені вибірки: {поле з мітками: значення}; порожньо, якщо Redis недоступний"""
+    try:
+        return {field.decode(): float(value) for field, value in get_redis().hgetall(METRICS_KEY).items()}
+    except Exception as e:
+        logger.warning(f"Не вдалося прочитати метрики: {str(e)}")
+        return {}
+
+
+def value(stored, name, **labels):
+    """Значення лічильника чи gauge'а зі snapshot()"""
+    return stored.get(f'{name}{_labels(labels)}', 0)
+
+
+def histogram(stored, name, **labels):
+    """Гістограма зі snapshot(): кумулятивні кошики, sum та count"""
+    return {
+        'buckets': {
+            str(le): int(value(stored, f'{name}_bucket', **labels, le=le)) for le in (*BUCKETS, '+Inf')
+        },
+        'sum': value(stored, f'{name}_sum', **labels),
+        'count': int(value(stored, f'{name}_count', **labels)),
+    }
+
+
+def _format(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _extra_samples():
+    """Поточні інтервали опитування інтерфейсів (стан розкладу планувальника в кеші)"""
+    samples = []
+    try:
+        from locations.sync_scheduler import interface_intervals
+        for interface, interval in interface_intervals().items():
+            if interval is not None:
+                samples.append(('wg_sync_interval_seconds', 'gauge', 'Поточний інтервал опитування інтерфейсу',
+                                _labels({'interface': interface}), interval))
+    except Exception as e:
+        logger.debug(f"Метрики планувальника недоступні: {str(e)}")
+    return samples
+
+
+def render():
+    """Усі метрики в текстовому форматі Prometheus 0.0.4"""
+    stored = snapshot()
+
+    lines = []
+    for name, (kind, description) in METRICS.items():
+        samples = (name,) if kind != 'histogram' else (f'{name}_bucket', f'{name}_sum', f'{name}_count')
+        fields = sorted((field for field in stored if field.split('{', 1)[0] in samples), key=_sort_key)
+        if not fields:
+            continue
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} {kind}']
+        lines += [f'{field} {_format(stored[field])}' for field in fields]
+
+    described = set()
+    for name, kind, description, labels, sample in _extra_samples():
+        if name not in described:
+            described.add(name)
+            lines += [f'# HELP {name} {description}', f'# TYPE {name} {kind}']
+        lines.append(f'{name}{labels} {_format(sample)}')
+    return '\n'.join(lines) + '\n'
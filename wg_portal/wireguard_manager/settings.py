@@ -46,6 +46,7 @@ INSTALLED_APPS = [
     'wireguard_management.apps.WireguardManagementConfig',
     'locations',
     'audit_logging',
+    'benchmarks',
 ]
 
 MIDDLEWARE = [
@@ -163,13 +164,27 @@ CELERY_BROKER_URL = REDIS_URL
 CELERY_RESULT_BACKEND = REDIS_URL
 CELERY_BEAT_SCHEDULE = {
     'fast-sync-stats-every-second': {
+        # Tick адаптивного планувальника; непочатий за секунду tick відкидається брокером
         'task': 'locations.tasks.fast_sync_stats_task',
         'schedule': 1.0,
+        'options': {'expires': 1.0},
     },
     'save-peer-stats-every-5-minutes': {
         'task': 'locations.tasks.save_peer_stats_task',
         'schedule': 300.0,
     },
+    'sample-traffic-every-minute': {
+        'task': 'locations.tasks.sample_traffic_task',
+        'schedule': 60.0,
+    },
+    'rollup-traffic-every-5-minutes': {
+        'task': 'locations.tasks.rollup_traffic_task',
+        'schedule': 300.0,
+    },
+    'compact-peer-monitoring-hourly': {
+        'task': 'wireguard_management.tasks.compact_peer_monitoring_task',
+        'schedule': 3600.0,
+    },
 }
 
 # Security: behind reverse proxy
@@ -235,6 +250,23 @@ LOGGING = {
 
 # WireGuard Settings
 WIREGUARD_CONFIG_DIR = BASE_DIR / 'wireguard_configs'
+# Джерело статистики: 'docker' (docker exec wg show) або 'collector' (Redis stream агента)
+WG_STATS_SOURCE = os.environ.get('WG_STATS_SOURCE', 'docker')
+# Вікно (секунди), за яке зміни одного інтерфейсу зливаються в одне застосування
+WG_APPLY_DEBOUNCE = float(os.environ.get('WG_APPLY_DEBOUNCE', '0.25'))
+# Паралельна синхронізація локацій: розмір пулу потоків та таймаут одного інтерфейсу (секунди)
+WG_SYNC_WORKERS = int(os.environ.get('WG_SYNC_WORKERS', '8'))
+WG_SYNC_TIMEOUT = float(os.environ.get('WG_SYNC_TIMEOUT', '10'))
+# Одночасних SSE потоків статистики на процес gunicorn (кожен тримає потік gthread)
+# та тривалість одного потоку в секундах, після якої EventSource перепідключається
+WG_LIVE_STREAMS = int(os.environ.get('WG_LIVE_STREAMS', '8'))
+WG_LIVE_STREAM_SECONDS = int(os.environ.get('WG_LIVE_STREAM_SECONDS', '300'))
+# Токен для /metrics (Authorization: Bearer ...); без нього метрики доступні лише персоналу
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+# Скільки днів зберігати PeerMonitoring: сирі зразки, погодинні та денні агрегати
+PEER_MONITORING_RAW_DAYS = int(os.environ.get('PEER_MONITORING_RAW_DAYS', '7'))
+PEER_MONITORING_HOURLY_DAYS = int(os.environ.get('PEER_MONITORING_HOURLY_DAYS', '90'))
+PEER_MONITORING_DAILY_DAYS = int(os.environ.get('PEER_MONITORING_DAILY_DAYS', '730'))
 
 # Django OTP Settings
 OTP_TOTP_ISSUER = 'WireGuard Manager'
@@ -8,6 +8,18 @@ from django.shortcuts import redirect
 def health_check(request):
     return HttpResponse("OK", content_type="text/plain")
 
+def metrics(request):
+    """Prometheus метрики: Bearer METRICS_TOKEN або сесія персоналу"""
+    import hmac
+    from .metrics import render
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    allowed = request.user.is_authenticated and request.user.is_staff
+    if not allowed and token:
+        allowed = hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not allowed:
+        return HttpResponse("Forbidden", status=403, content_type="text/plain")
+    return HttpResponse(render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
 def redirect_to_login(request):
     if request.user.is_authenticated:
         return redirect('accounts:vpn_overview')
@@ -21,6 +33,7 @@ urlpatterns = [
     # NOTE: audit_logging UI templates are not present; disable routes for now.
     # path('logs/', include('audit_logging.urls')),
     path('health/', health_check, name='health'),
+    path('metrics', metrics, name='metrics'),
     path('', redirect_to_login),  # Redirect to login or dashboard
 ]
 
@@ -1,27 +1,49 @@
 #!/bin/bash
 # Watcher script for WireGuard config reloads in Docker
 # Place this script in wireguard_scripts and add to container startup if needed
+#
+# Signal files restart_<iface> / restart_all:
+#   empty file      -> apply config live with `wg syncconf` (connected peers keep their tunnels)
+#   non-empty file  -> full `wg-quick down/up` (written by restart_wireguard for interface-level changes)
 
 CONFIG_DIR="/config/wg_confs"
 RESTART_DIR="/config"
 
+restart_iface() {
+    echo "[WG-RELOAD] Restarting $1"
+    wg-quick down "$1" 2>/dev/null
+    wg-quick up "$1"
+}
+
+sync_iface() {
+    # Interface is not up yet - syncconf needs an existing device
+    if ! wg show "$1" >/dev/null 2>&1; then
+        echo "[WG-RELOAD] Bringing up $1"
+        wg-quick up "$1"
+        return
+    fi
+    echo "[WG-RELOAD] Syncing $1"
+    wg syncconf "$1" <(wg-quick strip "$1") || restart_iface "$1"
+}
+
 while true; do
     for signal in "$RESTART_DIR"/restart_*; do
         [ -e "$signal" ] || continue
         iface=$(basename "$signal" | sed 's/^restart_//')
+        if [ -s "$signal" ]; then
+            action=restart_iface
+        else
+            action=sync_iface
+        fi
+        rm -f "$signal"
         if [ "$iface" = "all" ]; then
             for conf in "$CONFIG_DIR"/*.conf; do
-                intf=$(basename "$conf" .conf)
-                echo "[WG-RELOAD] Restarting $intf"
-                wg-quick down "$intf" 2>/dev/null
-                wg-quick up "$intf"
+                [ -e "$conf" ] || continue
+                $action "$(basename "$conf" .conf)"
             done
         else
-            echo "[WG-RELOAD] Restarting $iface"
-            wg-quick down "$iface" 2>/dev/null
-            wg-quick up "$iface"
+            $action "$iface"
         fi
-        rm -f "$signal"
     done
     sleep 2
 done
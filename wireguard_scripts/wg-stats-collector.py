@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Довгоживучий агент статистики WireGuard всередині VPN контейнера.
+
+Читає стан peer'ів напряму через generic netlink API WireGuard (з fallback
+на `wg show all dump`) і раз на інтервал публікує в Redis stream лише змінені
+peer'и. Портал читає stream замість `docker exec ... wg show` на кожен тік.
+
+Тільки стандартна бібліотека Python - у VPN контейнері немає pip залежностей.
+
+Змінні середовища:
+    WG_COLLECTOR_REDIS      redis://host:port/db (за замовчуванням redis://redis:6379/0)
+    WG_COLLECTOR_INTERVAL   інтервал опитування в секундах (1)
+    WG_COLLECTOR_SOURCE     netlink | dump (netlink, з fallback на dump)
+"""
+import base64
+import os
+import socket
+import struct
+import subprocess
+import sys
+import time
+from urllib.parse import urlparse
+
+STREAM_KEY = 'wg:stats'
+HEARTBEAT_KEY = 'wg:stats:heartbeat'
+STREAM_MAXLEN = 10000
+FULL_SNAPSHOT_EVERY = 60  # тіків між повними знімками для нових споживачів
+
+# --- netlink константи (linux/netlink.h, linux/genetlink.h, linux/wireguard.h) ---
+NETLINK_GENERIC = 16
+NLM_F_REQUEST = 0x01
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLA_TYPE_MASK = 0x3fff
+
+GENL_ID_CTRL = 0x10
+CTRL_CMD_GETFAMILY = 3
+CTRL_ATTR_FAMILY_ID = 1
+CTRL_ATTR_FAMILY_NAME = 2
+
+WG_GENL_NAME = b'wireguard'
+WG_GENL_VERSION = 1
+WG_CMD_GET_DEVICE = 0
+WGDEVICE_A_IFNAME = 2
+WGDEVICE_A_PEERS = 8
+WGPEER_A_PUBLIC_KEY = 1
+WGPEER_A_ENDPOINT = 4
+WGPEER_A_LAST_HANDSHAKE_TIME = 6
+WGPEER_A_RX_BYTES = 7
+WGPEER_A_TX_BYTES = 8
+
+
+def log(message):
+    print(f"[WG-COLLECTOR] {message}", flush=True)
+
+
+def _attrs(data):
+    """Ітерує netlink атрибути: (type, payload)"""
+    offset = 0
+    while offset + 4 <= len(data):
+        length, attr_type = struct.unpack_from('=HH', data, offset)
+        if length < 4:
+            break
+        yield attr_type & NLA_TYPE_MASK, data[offset + 4:offset + length]
+        offset += (length + 3) & ~3
+
+
+def _attr(attr_type, payload):
+    length = 4 + len(payload)
+    return struct.pack('=HH', length, attr_type) + payload + b'\0' * (((length + 3) & ~3) - length)
+
+
+def _format_endpoint(raw):
+    """sockaddr_in / sockaddr_in6 -> 'ip:port'"""
+    family = struct.unpack_from('=H', raw)[0]
+    port = struct.unpack_from('!H', raw, 2)[0]
+    if family == socket.AF_INET:
+        return f"{socket.inet_ntop(socket.AF_INET, raw[4:8])}:{port}"
+    if family == socket.AF_INET6:
+        return f"[{socket.inet_ntop(socket.AF_INET6, raw[8:24])}]:{port}"
+    return None
+
+
+class NetlinkSource:
+    """Читає peer'ів усіх WireGuard інтерфейсів через generic netlink"""
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_GENERIC)
+        self.sock.bind((0, 0))
+        self.seq = 0
+        self.family_id = self._resolve_family()
+
+    def _request(self, msg_type, flags, cmd, version, payload):
+        self.seq += 1
+        body = struct.pack('=BBH', cmd, version, 0) + payload
+        self.sock.send(struct.pack('=IHHII', 16 + len(body), msg_type, flags, self.seq, 0) + body)
+
+        messages = []
+        while True:
+            data = self.sock.recv(65536)
+            offset = 0
+            while offset + 16 <= len(data):
+                length, nl_type, _flags, _seq, _pid = struct.unpack_from('=IHHII', data, offset)
+                if nl_type == NLMSG_DONE:
+                    return messages
+                if nl_type == NLMSG_ERROR:
+                    error = struct.unpack_from('=i', data, offset + 16)[0]
+                    if error:
+                        raise OSError(-error, os.strerror(-error))
+                    return messages
+                # Пропускаємо nlmsghdr (16) та genlmsghdr (4)
+                messages.append(data[offset + 20:offset + length])
+                offset += (length + 3) & ~3
+            if not flags & NLM_F_DUMP:
+                return messages
+
+    def _resolve_family(self):
+        messages = self._request(
+            GENL_ID_CTRL, NLM_F_REQUEST, CTRL_CMD_GETFAMILY, 1,
+            _attr(CTRL_ATTR_FAMILY_NAME, WG_GENL_NAME + b'\0')
+        )
+        for message in messages:
+            for attr_type, payload in _attrs(message):
+                if attr_type == CTRL_ATTR_FAMILY_ID:
+                    return struct.unpack('=H', payload[:2])[0]
+        raise RuntimeError('WireGuard generic netlink family не знайдена')
+
+    @staticmethod
+    def interfaces():
+        names = []
+        for name in sorted(os.listdir('/sys/class/net')):
+            try:
+                with open(f'/sys/class/net/{name}/uevent') as f:
+                    if 'DEVTYPE=wireguard' in f.read():
+                        names.append(name)
+            except OSError:
+                continue
+        return names
+
+    def read(self):
+        """Повертає {interface: {public_key: (handshake, rx, tx, endpoint)}}"""
+        snapshot = {}
+        for interface in self.interfaces():
+            peers = snapshot.setdefault(interface, {})
+            messages = self._request(
+                self.family_id, NLM_F_REQUEST | NLM_F_DUMP, WG_CMD_GET_DEVICE, WG_GENL_VERSION,
+                _attr(WGDEVICE_A_IFNAME, interface.encode() + b'\0')
+            )
+            for message in messages:
+                for attr_type, payload in _attrs(message):
+                    if attr_type != WGDEVICE_A_PEERS:
+                        continue
+                    for _index, peer_payload in _attrs(payload):
+                        self._parse_peer(peer_payload, peers)
+        return snapshot
+
+    @staticmethod
+    def _parse_peer(payload, peers):
+        public_key, handshake, rx, tx, endpoint = None, 0, 0, 0, None
+        for attr_type, value in _attrs(payload):
+            if attr_type == WGPEER_A_PUBLIC_KEY:
+                public_key = base64.b64encode(value).decode()
+            elif attr_type == WGPEER_A_LAST_HANDSHAKE_TIME:
+                handshake = struct.unpack_from('=q', value)[0]
+            elif attr_type == WGPEER_A_RX_BYTES:
+                rx = struct.unpack('=Q', value)[0]
+            elif attr_type == WGPEER_A_TX_BYTES:
+                tx = struct.unpack('=Q', value)[0]
+            elif attr_type == WGPEER_A_ENDPOINT:
+                endpoint = _format_endpoint(value)
+        if public_key is None:
+            return
+        # Великий peer ділиться між кількома повідомленнями - зливаємо частини
+        previous = peers.get(public_key)
+        if previous:
+            handshake = handshake or previous[0]
+            rx = rx or previous[1]
+            tx = tx or previous[2]
+            endpoint = endpoint or previous[3]
+        peers[public_key] = (handshake, rx, tx, endpoint)
+
+
+class DumpSource:
+    """Fallback: локальний `wg show all dump` (без docker exec)"""
+
+    def read(self):
+        output = subprocess.run(
+            ['wg', 'show', 'all', 'dump'], capture_output=True, text=True, timeout=10, check=True
+        ).stdout
+        snapshot = {}
+        for line in output.splitlines():
+            parts = line.split('\t')
+            if len(parts) != 9:
+                continue
+            endpoint = parts[3] if parts[3] != '(none)' else None
+            snapshot.setdefault(parts[0], {})[parts[1]] = (int(parts[5]), int(parts[6]), int(parts[7]), endpoint)
+        return snapshot
+
+
+class RedisStreamSink:
+    """Мінімальний RESP клієнт: XADD у stream та heartbeat ключ"""
+
+    def __init__(self, url):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'redis'
+        self.port = parsed.port or 6379
+        self.db = int((parsed.path or '/0').lstrip('/') or 0)
+        self.password = parsed.password
+        self.sock = None
+        self.reader = None
+
+    def _connect(self):
+        self.sock = socket.create_connection((self.host, self.port), timeout=5)
+        self.reader = self.sock.makefile('rb')
+        if self.password:
+            self._command('AUTH', self.password)
+        if self.db:
+            self._command('SELECT', self.db)
+
+    def _read_reply(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError('Redis закрив з\'єднання')
+        prefix, rest = line[:1], line[1:-2]
+        if prefix == b'-':
+            raise RuntimeError(rest.decode())
+        if prefix == b'$':
+            length = int(rest)
+            return None if length < 0 else self.reader.read(length + 2)[:-2]
+        if prefix == b'*':
+            return [self._read_reply() for _ in range(max(int(rest), 0))]
+        return rest
+
+    def _command(self, *args):
+        parts = [f'*{len(args)}\r\n'.encode()]
+        for arg in args:
+            value = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(value), value))
+        self.sock.sendall(b''.join(parts))
+        return self._read_reply()
+
+    def publish(self, lines, full, interval):
+        if self.sock is None:
+            self._connect()
+        try:
+            if lines or full:
+                self._command(
+                    'XADD', STREAM_KEY, 'MAXLEN', '~', STREAM_MAXLEN, '*',
+                    'full', int(full), 'peers', '\n'.join(lines)
+                )
+            # Портал перевіряє heartbeat, щоб знати, що агент живий
+            self._command('SET', HEARTBEAT_KEY, int(time.time()), 'EX', max(int(interval * 5), 5))
+        except (OSError, ConnectionError):
+            self.sock = None
+            raise
+
+
+class Collector:
+    """Порівнює знімки та віддає в sink тільки змінені peer'и"""
+
+    def __init__(self, source, sink, interval=1.0):
+        self.source = source
+        self.sink = sink
+        self.interval = interval
+        self.previous = {}
+        self.ticks = 0
+
+    def tick(self):
+        snapshot = self.source.read()
+        full = self.ticks % FULL_SNAPSHOT_EVERY == 0
+        current = {}
+        lines = []
+        for interface, peers in snapshot.items():
+            for public_key, state in peers.items():
+                key = (interface, public_key)
+                current[key] = state
+                if full or self.previous.get(key) != state:
+                    handshake, rx, tx, endpoint = state
+                    # Формат рядка peer'а `wg show all dump` - портал парсить його тим самим парсером
+                    lines.append(
+                        f"{interface}\t{public_key}\t(none)\t{endpoint or '(none)'}\t(none)\t"
+                        f"{handshake}\t{rx}\t{tx}\toff"
+                    )
+        self.sink.publish(lines, full, self.interval)
+        self.previous = current
+        self.ticks += 1
+        return lines
+
+    def run_forever(self):
+        while True:
+            started = time.monotonic()
+            try:
+                self.tick()
+            except Exception as e:
+                # Після помилки надсилаємо повний знімок, щоб не втратити зміни
+                self.ticks = 0
+                log(f"Помилка збору статистики: {e}")
+            time.sleep(max(self.interval - (time.monotonic() - started), 0.05))
+
+
+def build_source(name):
+    if name == 'netlink':
+        try:
+            return NetlinkSource()
+        except Exception as e:
+            log(f"Netlink недоступний ({e}), використовую wg show all dump")
+    return DumpSource()
+
+
+def main():
+    interval = float(os.environ.get('WG_COLLECTOR_INTERVAL', '1'))
+    source = build_source(os.environ.get('WG_COLLECTOR_SOURCE', 'netlink'))
+    sink = RedisStreamSink(os.environ.get('WG_COLLECTOR_REDIS', 'redis://redis:6379/0'))
+    log(f"Старт: джерело={type(source).__name__}, інтервал={interval}s")
+    Collector(source, sink, interval).run_forever()
+
+
+if __name__ == '__main__':
+    sys.exit(main())